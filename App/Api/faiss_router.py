@@ -1,5 +1,14 @@
 """Routes for building and managing FAISS indices from markdown files."""
-from App.Services.faiss_converter import build_index
+from App.Services.ingest_jobs import jobs
+from App.Services.index_updates import list_sources
+from App.Core.rag_registry import get_store, registered_stores, story_index_path
+from App.Config.paths import story_dir, STORY_FILE
+from App.Core.answer_cache import answer_cache_stats
+from App.Core.context_packer import packer_stats
+from App.Core.embeddings_local import embedding_batcher_stats, embedding_cache_stats
+from App.Core.llm_cache import llm_cache_stats
+from App.Core.index_generations import current_generation, list_generations
+from App.Config.config import settings
 from pydantic import BaseModel
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import JSONResponse
@@ -8,26 +17,165 @@ from App.Services.utility import logging_function
 router = APIRouter()
 
 class RunFaissRequest(BaseModel):
-    """Schema for FAISS build requests."""
-    story_path: str
-    index_path: str = "App/Data/index.faiss"
-    meta_path: str = "App/Data/index.faiss.meta.jsonl"
+    """Schema for FAISS build requests.
+
+    Metadata is written next to the index inside its generation directory.
+    ``index_spec`` is ``auto``, ``flat``, ``ivf_flat``, ``hnsw``, ``ivf_pq``
+    or a raw ``faiss.index_factory`` string. With ``story`` set, the source
+    file and index default to ``App/Data/<story>/fantasy.md`` and
+    ``App/Data/<story>/index.faiss``.
+    ``story_path`` may also be a directory, in which case every markdown file
+    below it is ingested in parallel.
+    """
+    story: str | None = None
+    story_path: str | None = None
+    index_path: str | None = None
     chunk_words: int = 220
     overlap_words: int = 50
+    index_spec: str = settings.faiss_index_spec
 
 @router.post("/run_faiss")
 async def run_faiss(req: RunFaissRequest):
-    """Trigger a FAISS index build and return basic metadata or an error."""
+    """Queue a background build of a new index generation and return its job id.
+
+    The build runs in a worker process; poll ``/faiss/jobs/{job_id}`` for
+    progress. On success the new generation is published and hot-swapped.
+    """
+    try:
+        story_path = req.story_path or str(story_dir(req.story) / STORY_FILE)
+        index_path = req.index_path or str(story_index_path(req.story))
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    try:
+        logging_function(f"FAISS build requested (story: {req.story or 'default'})", level="info")
+        job = jobs.submit(
+            story_path=story_path,
+            index_path=index_path,
+            chunk_words=req.chunk_words,
+            overlap_words=req.overlap_words,
+            keep=settings.faiss_keep_generations,
+            index_spec=req.index_spec,
+        )
+        return JSONResponse(content=job.to_dict(), status_code=202)
+    except Exception as e:
+        logging_function(f"FAISS build could not be queued: {e}", level="error")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+class UpdateDocumentsRequest(BaseModel):
+    """Schema for incremental index updates.
+
+    ``add_path`` is a markdown file to (re)index under ``source`` (default: its
+    file name); chunks of every source in ``remove_sources`` are deleted.
+    """
+    story: str | None = None
+    index_path: str | None = None
+    add_path: str | None = None
+    source: str | None = None
+    remove_sources: list[str] = []
+    chunk_words: int = 220
+    overlap_words: int = 50
+
+
+@router.post("/documents")
+async def update_documents(req: UpdateDocumentsRequest):
+    """Queue an incremental update: append one document and/or delete others."""
+    if req.add_path is None and not req.remove_sources:
+        return JSONResponse(content={"error": "Nothing to add or remove."}, status_code=400)
     try:
-        logging_function("FAISS build requested", level="info")
-        result = build_index(
-            story_path=req.story_path,
-            out_index_path=req.index_path,
-            out_meta_path=req.meta_path,
+        index_path = req.index_path or str(story_index_path(req.story))
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    try:
+        job = jobs.submit(
+            operation="update",
+            index_path=index_path,
+            add_path=req.add_path,
+            source=req.source,
+            remove_sources=req.remove_sources,
             chunk_words=req.chunk_words,
-            overlap_words=req.overlap_words
+            overlap_words=req.overlap_words,
+            keep=settings.faiss_keep_generations,
         )
-        return JSONResponse(content=result)
+        return JSONResponse(content=job.to_dict(), status_code=202)
     except Exception as e:
-        logging_function(f"FAISS build failed: {e}", level="error")
-        return JSONResponse(content={"error": str(e)}, status_code=500)
\ No newline at end of file
+        logging_function(f"Index update could not be queued: {e}", level="error")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@router.get("/documents")
+def documents(story: str | None = None, index_path: str | None = None):
+    """List the documents (sources) in the live index with their chunk counts."""
+    try:
+        index_path = index_path or str(story_index_path(story))
+        return {"index_path": index_path, "sources": list_sources(index_path)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+
+@router.delete("/documents/{source:path}")
+async def delete_document(source: str, story: str | None = None, index_path: str | None = None):
+    """Queue removal of one document's chunks from the live index."""
+    return await update_documents(
+        UpdateDocumentsRequest(story=story, index_path=index_path, remove_sources=[source])
+    )
+
+
+@router.get("/jobs")
+def list_jobs():
+    """List recent ingest jobs, newest last."""
+    return [job.to_dict() for job in jobs.list()]
+
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Report status, progress (chunks/s, ETA) and the result of an ingest job."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}.")
+    return job.to_dict()
+
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """Cancel a queued job, or stop a running one at its next batch."""
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}.")
+    return job.to_dict()
+
+
+@router.get("/generation")
+def active_generation(story: str | None = None, index_path: str | None = None):
+    """Report the generation served by this worker and the one published on disk."""
+    try:
+        index_path = index_path or str(story_index_path(story))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    store = get_store(index_path)
+    state = store.state
+    return {
+        "index_path": index_path,
+        "active_generation": state.generation if state else None,
+        "published_generation": current_generation(index_path),
+        "chunks": len(state.chunks) if state else 0,
+        "loaded_at": state.loaded_at.isoformat() if state else None,
+        "generations": list_generations(index_path),
+    }
+
+
+@router.get("/stats")
+def retrieval_stats():
+    """Report cache hit rates of the retrieval path, LLM responses and QA answers, and context token savings."""
+    return {
+        "embedding_cache": embedding_cache_stats(),
+        "llm_cache": llm_cache_stats(),
+        "embedding_batcher": embedding_batcher_stats(),
+        "context_packer": packer_stats(),
+        "answer_cache": answer_cache_stats(),
+        "retrieval_cache": {
+            str(path): store.cache_stats() for path, store in registered_stores().items()
+        },
+    }
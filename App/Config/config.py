@@ -1,8 +1,16 @@
 """Settings for application, utilizing pydantic"""
+import os
 from pathlib import Path
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import AnyUrl, Field
 
+
+def default_embedding_threads() -> int:
+    """Split the cores between the server's processes (uvicorn ``WEB_CONCURRENCY``), at least 1 each."""
+    workers = max(1, int(os.environ.get("WEB_CONCURRENCY") or 1))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
 class Settings(BaseSettings):
     app_env: str = Field("local", env="APP_ENV")
     api_host: str = Field("0.0.0.0", env="API_HOST")
@@ -12,6 +20,13 @@ class Settings(BaseSettings):
     groq_api_key: str = Field(..., env="GROQ_API_KEY")
     groq_base_url: AnyUrl = Field("https://api.groq.com", env="GROQ_BASE_URL")
     groq_model: str = Field("openai/gpt-oss-20b", env="GROQ_MODEL")
+    qa_service_url: str = Field("", env="QA_SERVICE_URL")
+    qa_service_timeout_sec: float = Field(15, env="QA_SERVICE_TIMEOUT_SEC")
+    llm_cache_enabled: bool = Field(False, env="LLM_CACHE_ENABLED")
+    llm_cache_path: str = Field("llm_cache.sqlite", env="LLM_CACHE_PATH")
+    llm_cache_ttl_sec: float = Field(24 * 3600, env="LLM_CACHE_TTL_SEC")
+    llm_cache_max_bytes: int = Field(64 * 1024 * 1024, env="LLM_CACHE_MAX_BYTES")
+    llm_cache_max_temperature: float = Field(0.1, env="LLM_CACHE_MAX_TEMPERATURE")
 
     # Mongo
     mongo_uri: str = Field("mongodb://mongo:27017", env="MONGO_URI")
@@ -19,7 +34,47 @@ class Settings(BaseSettings):
 
     # faiss
     faiss_path: str = Field("App/Data/index.faiss", env="FAISS_PATH")
-    faiss_meta_path: str = Field("App/Data/index.faiss.meta.jsonl", env="FAISS_META_PATH")
+    faiss_mmap: bool = Field(False, env="FAISS_MMAP")
+    faiss_generation_poll_sec: float = Field(2.0, env="FAISS_GENERATION_POLL_SEC")
+    faiss_keep_generations: int = Field(2, env="FAISS_KEEP_GENERATIONS")
+    faiss_max_tombstone_ratio: float = Field(0.2, env="FAISS_MAX_TOMBSTONE_RATIO")
+    ingest_batch_size: int = Field(256, env="INGEST_BATCH_SIZE")
+    ingest_workers: int = Field(1, env="INGEST_WORKERS")
+    ingest_threads: int = Field(2, env="INGEST_THREADS")
+    ingest_nice: int = Field(10, env="INGEST_NICE")
+    ingest_chunk_workers: int = Field(0, env="INGEST_CHUNK_WORKERS")
+    ingest_queue_size: int = Field(64, env="INGEST_QUEUE_SIZE")
+    faiss_index_spec: str = Field("auto", env="FAISS_INDEX_SPEC")
+    faiss_nprobe: int = Field(16, env="FAISS_NPROBE")
+    faiss_ef_search: int = Field(64, env="FAISS_EF_SEARCH")
+    rag_top_k: int = Field(4, env="RAG_TOP_K")
+    rag_search_mode: str = Field("hybrid", env="RAG_SEARCH_MODE")
+    rag_hybrid_pool_factor: int = Field(5, env="RAG_HYBRID_POOL_FACTOR")
+    rag_top_sections: int = Field(8, env="RAG_TOP_SECTIONS")
+    context_token_budget: int = Field(1500, env="CONTEXT_TOKEN_BUDGET")
+    context_min_score: float = Field(0.2, env="CONTEXT_MIN_SCORE")
+    context_min_overlap_words: int = Field(5, env="CONTEXT_MIN_OVERLAP_WORDS")
+    qa_semantic_cache_max_entries: int = Field(1000, env="QA_SEMANTIC_CACHE_MAX_ENTRIES")
+    qa_semantic_cache_threshold: float = Field(0.92, env="QA_SEMANTIC_CACHE_THRESHOLD")
+    rag_max_resident_bytes: int = Field(512 * 1024 * 1024, env="RAG_MAX_RESIDENT_BYTES")
+    retrieval_cache_max_bytes: int = Field(16 * 1024 * 1024, env="RETRIEVAL_CACHE_MAX_BYTES")
+    retrieval_cache_ttl_sec: float = Field(0, env="RETRIEVAL_CACHE_TTL_SEC")
+
+    # embeddings
+    embedding_model: str = Field(
+        "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", env="EMBEDDING_MODEL"
+    )
+    embedding_mismatch_policy: str = Field("refuse", env="EMBEDDING_MISMATCH_POLICY")
+    embedding_backend: str = Field("torch", env="EMBEDDING_BACKEND")
+    embedding_onnx_dir: str = Field("", env="EMBEDDING_ONNX_DIR")
+    embedding_max_seq_length: int = Field(128, env="EMBEDDING_MAX_SEQ_LENGTH")
+    # 0 leaves torch / ONNX Runtime at their own default (all cores).
+    embedding_threads: int = Field(default_factory=default_embedding_threads, env="EMBEDDING_THREADS")
+    embedding_batch_wait_ms: float = Field(5.0, env="EMBEDDING_BATCH_WAIT_MS")
+    embedding_batch_max_size: int = Field(64, env="EMBEDDING_BATCH_MAX_SIZE")
+    embedding_cache_max_bytes: int = Field(32 * 1024 * 1024, env="EMBEDDING_CACHE_MAX_BYTES")
+    embedding_cache_ttl_sec: float = Field(3600, env="EMBEDDING_CACHE_TTL_SEC")
+    embedding_store_path: str = Field("embeddings.sqlite", env="EMBEDDING_STORE_PATH")
 
     model_config = SettingsConfigDict(
         env_file=Path(__file__).parent.parent / ".env",  
@@ -1,6 +1,13 @@
-"""MongoDB connection and helpers for NPC storage and chat sessions."""
+"""MongoDB connection and helpers for NPC storage and chat sessions.
+
+The synchronous ``MongoClient`` serves the threadpool code paths. Async code
+uses ``async_db``, which opens one ``AsyncMongoClient`` per event loop (a
+client cannot be shared across loops).
+"""
+import asyncio
+import weakref
 from App.Config.config import settings
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, MongoClient
 from typing import List, Dict, Any
 from pymongo.errors import BulkWriteError
 import os
@@ -59,5 +66,20 @@ def existing_names() -> list[str]:
     return [doc["name"] for doc in npc_collection.find({}, {"_id": 0, "name": 1})]
 
 
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncMongoClient]" = weakref.WeakKeyDictionary()
+
+
+def async_db():
+    """Return the database on the ``AsyncMongoClient`` of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncMongoClient(MONGO_URL)
+        _async_clients[loop] = client
+    return client[MONGO_DB]
 
 
+async def existing_names_async() -> list[str]:
+    """Async variant of ``existing_names``."""
+    cursor = async_db()["npcs"].find({}, {"_id": 0, "name": 1})
+    return [doc["name"] async for doc in cursor]
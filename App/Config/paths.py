@@ -1,4 +1,5 @@
 " Class to keep all file for tests"
+import re
 from pathlib import Path
 
 APP_DIR = Path(__file__).resolve().parents[1]
@@ -12,4 +13,20 @@ def get_app_dir() -> Path:
 
 def get_data_dir() -> Path:
     # funkcja (zamiast stałej) ułatwia monkeypatch w testach, ale bez ENV
-    return DATA_DIR
\ No newline at end of file
+    return DATA_DIR
+
+
+STORY_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+STORY_FILE = "fantasy.md"
+
+
+def story_dir(story: str | None = None) -> Path:
+    """Return the data directory of ``story``; ``None`` is the default story in ``DATA_DIR``.
+
+    Raises ValueError for names that are not a single safe path segment.
+    """
+    if not story:
+        return get_data_dir()
+    if not STORY_NAME_RE.match(story):
+        raise ValueError(f"Invalid story name: {story!r}")
+    return get_data_dir() / story
@@ -1,6 +1,6 @@
 """In-memory cache for recent question/answer snippets and a rolling summary."""
 
-from App.Core.llm import chat_json
+from App.Core.llm import chat_json, chat_json_async
 from App.Services.utility import generate_session_id
 from App.Core.prompts import SUMMARY_SYSTEM
 class ContextCache:
@@ -16,6 +16,12 @@ class ContextCache:
         if len(self._cache) >5:
             self.summary()
 
+    async def aadd(self, question, answer=None):
+        """Async variant of ``add`` (the summary call does not block)."""
+        self._cache["Previous question:" + question] = "Previous answer:" + (answer or "")
+        if len(self._cache) >5:
+            await self.asummary()
+
     def get(self, question):
         """Return the last answer for ``question`` if present."""
         return self._cache.get(question)
@@ -36,5 +42,14 @@ class ContextCache:
         session_id=generate_session_id()
     )
         self._cache = {"summary": resp.get("summary", str(resp))}
+
+    async def asummary(self):
+        """Async variant of ``summary``."""
+        resp = await chat_json_async(
+            system=SUMMARY_SYSTEM,
+            user=f"Summarize the following Q&A pairs:\n{self._cache}",
+            session_id=generate_session_id()
+        )
+        self._cache = {"summary": resp.get("summary", str(resp))}
     
 context_cache = ContextCache()
\ No newline at end of file
@@ -3,11 +3,24 @@ from pydantic import BaseModel
 
 
 class QARequest(BaseModel):
-    """Schema for question-answering requests."""
+    """Schema for question-answering requests (``stream`` answers as Server-Sent Events)."""
     question: str
+    story: str | None = None
+    stream: bool = False
+
+
+class QABatchRequest(BaseModel):
+    """Schema for answering several questions in one request."""
+    questions: list[str]
+    story: str | None = None
 
 
 class QAResponse(BaseModel):
     """Schema for question-answering responses."""
     answer: str
-    sources: list[str]
\ No newline at end of file
+    sources: list[str]
+    sections: list[str] = []
+    context_tokens: int | None = None
+    context_tokens_raw: int | None = None
+    context_tokens_saved: int | None = None
+    cached: bool = False
\ No newline at end of file
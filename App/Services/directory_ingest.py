@@ -0,0 +1,178 @@
+"""Parallel chunking of a directory tree of markdown files.
+
+Large lore sets are spread over hundreds of files (e.g. one file per region
+or faction under ``App/Data/<story>/``). Chunking them one by one on a single
+core leaves the embedder starved, so each file is chunked in its own task on
+a process pool. Workers push record batches onto one bounded shared queue and
+the ingest loop in ``build_index`` pulls from it into embedding batches. The
+bounded queue keeps memory flat when chunking outruns embedding.
+
+Records arrive in completion order rather than file order. Chunk ids are
+content hashes, so they do not depend on that order.
+
+There is no counting pre-pass: the expected chunk total starts as an
+estimate from file sizes and is corrected as each file finishes, so it
+converges to the number of unique chunks by the end of the stream.
+"""
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import queue
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List
+
+from App.Config.config import settings
+from App.Services.faiss_converter import iter_story_records
+from App.Services.utility import logging_function
+
+MARKDOWN_SUFFIXES = (".md", ".markdown")
+RECORDS_PER_MESSAGE = 256
+# Average UTF-8 bytes per word of markdown prose (word plus separator).
+BYTES_PER_WORD = 6
+_QUEUE_POLL_SEC = 1.0
+
+_records_queue = None
+
+
+def iter_markdown_files(root: str | Path) -> List[Path]:
+    """Return all markdown files below ``root`` in a stable (sorted) order."""
+    root = Path(root)
+    return sorted(
+        p for p in root.rglob("*")
+        if p.is_file() and p.suffix.lower() in MARKDOWN_SUFFIXES and not p.name.startswith(".")
+    )
+
+
+def _workers() -> int:
+    return settings.ingest_chunk_workers or os.cpu_count() or 1
+
+
+def _pool(initializer=None, initargs=()) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=_workers(),
+        mp_context=mp.get_context("spawn"),
+        initializer=initializer,
+        initargs=initargs,
+    )
+
+
+def estimate_file_chunks(path: str | Path, chunk_words: int, overlap_words: int) -> int:
+    """Estimate the chunk count of one file from its size, without reading it."""
+    words = Path(path).stat().st_size // BYTES_PER_WORD
+    return max(1, -(-words // max(1, chunk_words - overlap_words)))
+
+
+def estimate_directory_chunks(root: str | Path, chunk_words: int, overlap_words: int) -> int:
+    """Estimate the chunk count of every markdown file below ``root`` (sizing the index)."""
+    return sum(estimate_file_chunks(p, chunk_words, overlap_words) for p in iter_markdown_files(root))
+
+
+def _init_chunk_worker(records_queue) -> None:
+    global _records_queue
+    _records_queue = records_queue
+
+
+def _chunk_file(path: str, root: str, chunk_words: int, overlap_words: int) -> int:
+    """Worker: stream one file's records onto the shared queue, then its source as a done marker."""
+    source = Path(path).relative_to(root).as_posix()
+    batch: List[Dict[str, str]] = []
+    count = 0
+    try:
+        for record in iter_story_records(path, chunk_words, overlap_words, source=source):
+            batch.append(record)
+            if len(batch) >= RECORDS_PER_MESSAGE:
+                _records_queue.put(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            _records_queue.put(batch)
+            count += len(batch)
+    finally:
+        _records_queue.put(source)
+    return count
+
+
+def _raise_failed(futures: List[Future]) -> None:
+    for fut in futures:
+        if fut.done() and fut.exception() is not None:
+            raise RuntimeError(f"Chunking failed: {fut.exception()}") from fut.exception()
+
+
+def iter_directory_records(
+    root: str | Path,
+    chunk_words: int,
+    overlap_words: int,
+    shared: Dict[str, List[str]] | None = None,
+    on_total: Callable[[int], None] | None = None,
+) -> Iterator[Dict[str, str]]:
+    """Stream chunk records of all markdown files below ``root``.
+
+    Records carry ``source`` (path relative to ``root``) and ``heading``.
+    Chunks repeated across files are yielded once; the sources of the
+    repeats are collected in ``shared`` (``{chunk id: [source, ...]}``).
+    ``on_total(n)`` receives the running estimate of unique chunks after
+    every message from a worker: records yielded so far plus the size
+    estimate of what unfinished files have not produced yet.
+    """
+    root = Path(root)
+    files = iter_markdown_files(root)
+    if not files:
+        return
+    expected = {
+        f.relative_to(root).as_posix(): estimate_file_chunks(f, chunk_words, overlap_words) for f in files
+    }
+    produced = dict.fromkeys(expected, 0)
+    outstanding = sum(expected.values())
+    yielded = 0
+    ctx = mp.get_context("spawn")
+    records_queue = ctx.Queue(maxsize=settings.ingest_queue_size)
+    seen = set()
+    pool = _pool(_init_chunk_worker, (records_queue,))
+    futures = [
+        pool.submit(_chunk_file, str(f), str(root), chunk_words, overlap_words) for f in files
+    ]
+    try:
+        remaining = len(files)
+        while remaining:
+            try:
+                batch = records_queue.get(timeout=_QUEUE_POLL_SEC)
+            except queue.Empty:
+                _raise_failed(futures)
+                continue
+            if isinstance(batch, str):
+                # A file finished: drop whatever of its estimate it did not produce.
+                outstanding -= max(0, expected[batch] - produced[batch])
+                remaining -= 1
+                if on_total:
+                    on_total(yielded + outstanding)
+                continue
+            fresh = []
+            for record in batch:
+                source = record["source"]
+                if produced[source] < expected[source]:
+                    outstanding -= 1
+                produced[source] += 1
+                if record["id"] in seen:
+                    if shared is not None:
+                        shared.setdefault(record["id"], []).append(source)
+                    continue
+                seen.add(record["id"])
+                fresh.append(record)
+            yielded += len(fresh)
+            if on_total:
+                on_total(yielded + outstanding)
+            yield from fresh
+        _raise_failed(futures)
+    finally:
+        # If the consumer stops early, workers may be blocked on the full
+        # queue; drain it until they exit so the pool can shut down.
+        pool.shutdown(wait=False, cancel_futures=True)
+        while not all(f.done() for f in futures):
+            try:
+                records_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        pool.shutdown(wait=True)
+    logging_function(f"Chunked {len(files)} markdown files under {root}", level="info")
@@ -1,13 +1,23 @@
 """  Faiss index builder from markdown files. contains chunking and embedding logic."""
 from pathlib import Path
-import re, json, uuid, logging
-from typing import List, Dict
+import re, logging
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
 from App.Services.utility import logging_function
-
-_model = SentenceTransformer("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+from App.Core.chunk_store import PackedChunks, PackedWriter, chunk_label, write_id_map, write_shared_sources
+from App.Config.config import settings
+from App.Core.bm25 import BM25Index, bm25_path
+from App.Core.sections import SectionBuilder, sections_path
+from App.Core.index_generations import (
+    new_generation_id, generation_index_path, publish_generation, prune_generations,
+    write_manifest,
+)
+from App.Core.embeddings_local import embed_batch, model_id
+from App.Core.embedding_store import content_hash, embed_cached
+from App.Core.rag import CHUNK_PREFIX, FaissRAG
+import shutil
 
 _HEADING_RE = re.compile(r"^(#{1,6})\s+.+$", flags=re.MULTILINE)
 
@@ -41,59 +51,374 @@ def _word_chunks(text: str, chunk_words: int, overlap_words: int) -> List[str]:
             break
     return chunks
 
+def chunk_id(text: str, digest: str | None = None) -> str:
+    """Deterministic id of a chunk derived from its text, stable across rebuilds.
+
+    Pass ``digest`` (``content_hash(text)``) when it is already computed.
+    """
+    return CHUNK_PREFIX + (digest or content_hash(text))[:16]
+
+
+_HEADING_LINE_RE = re.compile(r"^#{1,6}\s+\S")
+
+
+def iter_heading_chunks(lines: Iterable[str], chunk_words: int = 220, overlap_words: int = 50) -> Iterator[Tuple[str, str]]:
+    """Stream ``(heading, chunk)`` pairs from markdown ``lines``.
+
+    The word window restarts at each heading, so the chunks are the same as
+    ``_word_chunks`` over ``_split_by_headings``, but at most one window of
+    words is held, so input size does not matter. ``heading`` is the text of
+    the section's heading line ("" before the first heading).
+    """
+    step = max(1, chunk_words - overlap_words)
+    words: List[str] = []
+    heading = ""
+
+    def flush() -> Iterator[Tuple[str, str]]:
+        for chunk in _word_chunks(" ".join(words), chunk_words, overlap_words):
+            yield heading, chunk
+        words.clear()
+
+    for line in lines:
+        if _HEADING_LINE_RE.match(line):
+            yield from flush()
+            heading = line.strip().lstrip("#").strip()
+        words.extend(line.split())
+        while len(words) > chunk_words:
+            yield heading, " ".join(words[:chunk_words])
+            del words[:step]
+    yield from flush()
+
+
+def iter_chunks(lines: Iterable[str], chunk_words: int = 220, overlap_words: int = 50) -> Iterator[str]:
+    """Stream word chunks from markdown ``lines`` (see ``iter_heading_chunks``)."""
+    for _, chunk in iter_heading_chunks(lines, chunk_words, overlap_words):
+        yield chunk
+
+
+def iter_chunk_records(
+    lines: Iterable[str],
+    chunk_words: int = 220,
+    overlap_words: int = 50,
+    source: str | None = None,
+) -> Iterator[Dict[str, str]]:
+    """Stream chunk records with content-hash ids; identical chunks are kept once.
+
+    Records carry the ``heading`` of their section and, when given, the
+    ``source`` file they came from.
+    """
+    seen = set()
+    for heading, chunk in iter_heading_chunks(lines, chunk_words, overlap_words):
+        h = content_hash(chunk)
+        if h[:16] in seen:
+            continue
+        seen.add(h[:16])
+        record = {"id": chunk_id(chunk, h), "text": chunk, "hash": h, "heading": heading}
+        if source is not None:
+            record["source"] = source
+        yield record
+
+
+def iter_story_records(
+    story_path: str | Path,
+    chunk_words: int = 220,
+    overlap_words: int = 50,
+    source: str | None = None,
+) -> Iterator[Dict[str, str]]:
+    """Stream chunk records of a markdown file, reading it line by line."""
+    with Path(story_path).open("r", encoding="utf-8", errors="ignore") as f:
+        yield from iter_chunk_records(f, chunk_words, overlap_words, source=source)
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 def chunk_markdown_local(md: str, chunk_words: int = 220, overlap_words: int = 50) -> List[Dict[str, str]]:
-    """Convert a markdown string into a list of chunk records with UUIDs."""
-    records = []
-    sections = _split_by_headings(md)
-    for sec in sections:
-        norm = re.sub(r"\s+", " ", sec).strip()
-        for chunk in _word_chunks(norm, chunk_words=chunk_words, overlap_words=overlap_words):
-            records.append({"id": str(uuid.uuid4()), "text": chunk})
-    return records
+    """Convert a markdown string into chunk records with content-hash ids.
+
+    Identical chunks (e.g. a repeated boilerplate paragraph) are kept once.
+    """
+    return list(iter_chunk_records(md.splitlines(), chunk_words, overlap_words))
 
 
 def embed_texts(texts: List[str], batch_size: int = 64) -> np.ndarray:
     """Encode ``texts`` into L2-normalized vectors for FAISS storage."""
-    vecs = _model.encode(texts, normalize_embeddings=True, batch_size=batch_size)
-    return np.array(vecs, dtype="float32")
+    return embed_batch(texts, batch_size=batch_size)
+
+
+INDEX_SPECS = {
+    "flat": "Flat",
+    "ivf_flat": "IVF{nlist},Flat",
+    "hnsw": "HNSW32,Flat",
+    "ivf_pq": "IVF{nlist},PQ{pq_m}",
+}
+FLAT_MAX_CHUNKS = 20_000
+IVF_FLAT_MAX_CHUNKS = 1_000_000
+MAX_TRAIN_POINTS = 256 * 256
+
+
+def _nlist_for(n: int) -> int:
+    """Pick an IVF list count (~4*sqrt(n)) that still gets 39 training points per list."""
+    return int(max(1, min(4 * np.sqrt(n), n // 39)))
+
+
+def _pq_m_for(dim: int) -> int:
+    """Pick a PQ sub-quantizer count that divides ``dim`` (8 dims per code byte)."""
+    for m in (dim // 8, 48, 32, 24, 16, 8, 4, 2, 1):
+        if m and dim % m == 0:
+            return m
+    return 1
+
+
+def choose_index_spec(n_chunks: int) -> str:
+    """Return the named spec ``auto`` resolves to for a corpus of ``n_chunks``."""
+    if n_chunks <= FLAT_MAX_CHUNKS:
+        return "flat"
+    if n_chunks <= IVF_FLAT_MAX_CHUNKS:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def resolve_index_spec(spec: str, n_chunks: int, dim: int) -> str:
+    """Turn ``auto``/named specs into a concrete ``faiss.index_factory`` string.
+
+    Anything that is not a known name is passed through as a raw factory
+    string, e.g. ``"IVF1024,PQ32"`` or ``"HNSW64,Flat"``.
+    """
+    spec = (spec or "auto").strip()
+    if spec.lower() == "auto":
+        spec = choose_index_spec(n_chunks)
+    template = INDEX_SPECS.get(spec.lower(), spec)
+    return template.format(nlist=_nlist_for(n_chunks), pq_m=_pq_m_for(dim))
+
+
+def make_index(spec: str, vecs: np.ndarray) -> faiss.Index:
+    """Create an inner-product index for ``spec``, train it if needed and add ``vecs``."""
+    n, dim = vecs.shape
+    factory = resolve_index_spec(spec, n, dim)
+    index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        train = vecs
+        if n > MAX_TRAIN_POINTS:
+            rng = np.random.default_rng(0)
+            train = vecs[rng.choice(n, MAX_TRAIN_POINTS, replace=False)]
+        logging_function(f"Training {factory} on {len(train)} vectors", level="info")
+        index.train(train)
+    index.add(vecs)
+    return index
+
+
+def make_id_index(factory: str, dim: int) -> faiss.Index:
+    """Create an empty inner-product ``factory`` index that stores chunk ids.
+
+    IVF indexes keep ids in their inverted lists natively; every other type is
+    wrapped in ``IndexIDMap2``.
+    """
+    index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+    if faiss.try_extract_index_ivf(index) is not None:
+        return index
+    return faiss.index_factory(dim, f"IDMap2,{factory}", faiss.METRIC_INNER_PRODUCT)
+
+
+def _train_and_add(index: faiss.Index, factory: str, parts: List[Tuple[np.ndarray, np.ndarray]]) -> None:
+    """Train ``index`` on the buffered vectors, then add them with their ids."""
+    vecs = np.concatenate([v for v, _ in parts])
+    ids = np.concatenate([i for _, i in parts])
+    logging_function(f"Training {factory} on {len(vecs)} vectors", level="info")
+    index.train(vecs)
+    index.add_with_ids(vecs, ids)
 
 
 def build_index(
     story_path: str,
     out_index_path: str = "data/index.faiss",
-    out_meta_path: str = "data/index.faiss.meta.jsonl",
+    out_meta_path: str = "data/index.faiss.meta.bin",
     chunk_words: int = 220,
-    overlap_words: int = 50
+    overlap_words: int = 50,
+    index_spec: str = "auto",
+    progress: Callable[[int, int], None] | None = None,
 ) -> dict:
-    """Build a FAISS index from a markdown file and return metadata.
+    """Build a FAISS index from a markdown file (or a directory tree of them) and return metadata.
+
+    The input is streamed: chunks are embedded ``settings.ingest_batch_size``
+    at a time and each batch is added to the index and appended to the meta
+    file right away, so memory does not grow with the size of the story.
+    For a directory, every markdown file below it is chunked in parallel (see
+    ``App.Services.directory_ingest``). The binary meta (``out_meta_path``,
+    see ``App.Core.chunk_store``) records id, text, ``source`` file, section
+    ``heading`` and content hash of every chunk (further files containing
+    the same chunk go to ``.sources.json``); the section index
+    (``App.Core.sections``) averages chunk vectors per heading section.
+
+    ``index_spec`` is ``auto``, one of ``INDEX_SPECS`` or a raw
+    ``faiss.index_factory`` string; ``auto`` picks by chunk count (for a
+    directory, estimated from file sizes). ``progress(done, total)`` is
+    called after every batch; it may raise to abort the build. For a
+    directory ``total`` is a running estimate that ends at the number of
+    unique chunks.
 
     Raises FileNotFoundError or RuntimeError on invalid inputs.
     """
     path = Path(story_path)
     if not path.exists():
         raise FileNotFoundError(f"File {story_path} does not exist.")
-    md = path.read_text(encoding="utf-8", errors="ignore").strip()
-    if not md:
-        raise RuntimeError(f"File {story_path} is empty.")
+    shared: Dict[str, List[str]] = {}
+    if path.is_dir():
+        from App.Services.directory_ingest import estimate_directory_chunks, iter_directory_records
+        # Sized from file sizes; the chunking workers refine the total as they go.
+        n_chunks = estimate_directory_chunks(path, chunk_words, overlap_words)
 
-    records = chunk_markdown_local(md, chunk_words, overlap_words)
-    if not records:
-        raise RuntimeError("No records to index.")
+        def update_total(n: int) -> None:
+            nonlocal n_chunks
+            n_chunks = n
 
-    texts = [r["text"] for r in records]
-    vecs = embed_texts(texts)
-    dim = vecs.shape[1]
+        def open_records() -> Iterator[Dict[str, str]]:
+            return iter_directory_records(path, chunk_words, overlap_words, shared, update_total)
+    else:
+        # Cheap pre-pass (no embedding): ``auto`` and IVF list counts depend on corpus size.
+        n_chunks = sum(1 for _ in iter_story_records(path, chunk_words, overlap_words))
 
-    index = faiss.IndexFlatIP(dim)
-    index.add(vecs)
+        def open_records() -> Iterator[Dict[str, str]]:
+            return iter_story_records(path, chunk_words, overlap_words, source=path.name)
+    if not n_chunks:
+        raise RuntimeError(f"File {story_path} is empty.")
+    if progress:
+        progress(0, n_chunks)
 
     Path(out_index_path).parent.mkdir(parents=True, exist_ok=True)
+    Path(out_meta_path).parent.mkdir(parents=True, exist_ok=True)
+    index = None
+    factory = dim = None
+    train_target = min(n_chunks, MAX_TRAIN_POINTS)
+    pending: List[Tuple[np.ndarray, np.ndarray]] = []
+    all_labels = array("q")
+    embedded = done = 0
+    sections = SectionBuilder()
+    writer = PackedWriter(out_meta_path)
+    try:
+        for batch in _batched(open_records(), settings.ingest_batch_size):
+            vecs, n_new = embed_cached([r["text"] for r in batch], [r["hash"] for r in batch])
+            embedded += n_new
+            if index is None:
+                dim = vecs.shape[1]
+                factory = resolve_index_spec(index_spec, n_chunks, dim)
+                index = make_id_index(factory, dim)
+            labels = np.array([chunk_label(r["id"]) for r in batch], dtype="int64")
+            all_labels.extend(labels.tolist())
+            for r, vec in zip(batch, vecs):
+                writer.add(r)
+                sections.add(r, vec)
+            done += len(batch)
+            if progress:
+                progress(done, n_chunks)
+            if index.is_trained:
+                index.add_with_ids(vecs, labels)
+                continue
+            # Trainable types buffer the first vectors as the training sample.
+            pending.append((vecs, labels))
+            if sum(len(v) for v, _ in pending) >= train_target:
+                _train_and_add(index, factory, pending)
+                pending = []
+        if pending:
+            # The stream ended before the training sample filled (the corpus
+            # was smaller than estimated): size the index by the real count.
+            factory = resolve_index_spec(index_spec, done, dim)
+            index = make_id_index(factory, dim)
+            _train_and_add(index, factory, pending)
+    finally:
+        count = writer.close()
+    if index is None:
+        raise RuntimeError(f"File {story_path} is empty.")
     faiss.write_index(index, out_index_path)
+    write_id_map(out_index_path, np.frombuffer(all_labels, dtype="int64"))
+    write_shared_sources(out_index_path, shared)
+    section_index = sections.build()
+    section_index.save(sections_path(out_index_path))
+    chunks = PackedChunks(out_meta_path)
+    try:
+        BM25Index.build(chunks.get(i)[1] for i in range(count)).save(bm25_path(out_index_path))
+    finally:
+        chunks.close()
 
-    Path(out_meta_path).parent.mkdir(parents=True, exist_ok=True)
-    with open(out_meta_path, "w", encoding="utf-8") as f:
-        for r in records:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    result = {
+        "chunks": count,
+        "embedded": embedded,
+        "index_path": str(out_index_path),
+        "meta_path": str(out_meta_path),
+        "index_spec": factory,
+        "embedding_model": model_id(),
+        "dim": dim,
+        "id_map": True,
+        "sections": len(section_index),
+    }
+    write_manifest(out_index_path, result)
+    logging_function(
+        f"FAISS index finished: {count} chunks in {len(section_index)} sections "
+        f"({embedded} newly embedded), dim={dim}, spec={factory}",
+        level="info",
+    )
+    return result
+
+
+def validate_index(index_path: str | Path, expected_chunks: int) -> None:
+    """Load a freshly built index and check it is complete and searchable.
 
-    logging_function(f"FAISS index finished: {len(records)} chunks, dim={dim}", level="info")
-    return {"chunks": len(records), "index_path": str(out_index_path), "meta_path": str(out_meta_path)}
\ No newline at end of file
+    Raises RuntimeError if the index cannot serve queries.
+    """
+    state = FaissRAG(index_path=index_path, mmap=False)._read()
+    if len(state.chunks) != expected_chunks:
+        raise RuntimeError(
+            f"Index has {len(state.chunks)} chunks, expected {expected_chunks}."
+        )
+    probe = embed_texts([state.chunks.get(0)[1]])
+    _, I = state.index.search(probe, 1)
+    if I[0][0] == -1:
+        raise RuntimeError("Probe search on the new index returned no hits.")
+
+
+def build_generation(
+    story_path: str,
+    index_path: str = "App/Data/index.faiss",
+    chunk_words: int = 220,
+    overlap_words: int = 50,
+    keep: int = 2,
+    index_spec: str = "auto",
+    progress: Callable[[int, int], None] | None = None,
+) -> dict:
+    """Build a new index generation, validate it and publish it as live.
+
+    The build goes into a fresh directory under ``<index_path>.generations``;
+    the live generation is only switched once validation passes, so readers
+    never see a partially written index.
+    """
+    generation = new_generation_id()
+    gen_index = generation_index_path(index_path, generation)
+    try:
+        result = build_index(
+            story_path=story_path,
+            out_index_path=str(gen_index),
+            out_meta_path=str(FaissRAG.meta_path_for(gen_index)),
+            chunk_words=chunk_words,
+            overlap_words=overlap_words,
+            index_spec=index_spec,
+            progress=progress,
+        )
+        validate_index(gen_index, result["chunks"])
+        result.update({"generation": generation, "story_path": str(story_path)})
+        write_manifest(gen_index, result)
+    except Exception:
+        shutil.rmtree(gen_index.parent, ignore_errors=True)
+        raise
+    publish_generation(index_path, generation)
+    pruned = prune_generations(index_path, keep=keep)
+    if pruned:
+        logging_function(f"Pruned old index generations: {pruned}", level="info")
+    return result
@@ -0,0 +1,149 @@
+"""Recall@k and latency report for FAISS index specs against the flat baseline.
+
+Run from the repository root, either on a real story or on a synthetic corpus
+sized like the one you plan to serve:
+
+    python -m App.Services.index_benchmark --story App/Data/fantasy.md
+    python -m App.Services.index_benchmark --synthetic 200000 --specs ivf_flat hnsw ivf_pq
+
+Each row reports build time, recall@k (overlap with exact ``Flat`` results),
+mean and p95 single-query latency and the serialized index size.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import faiss
+import numpy as np
+
+from App.Services.faiss_converter import make_index, resolve_index_spec
+
+DEFAULT_SPECS = ("ivf_flat", "hnsw", "ivf_pq")
+
+
+def synthetic_corpus(n: int, dim: int = 384, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Return ``n`` normalized vectors drawn around random centroids (topic-like structure)."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, size=n)
+    vecs = centroids[labels] + 0.6 * rng.standard_normal((n, dim)).astype("float32")
+    faiss.normalize_L2(vecs)
+    return vecs
+
+
+def make_queries(vecs: np.ndarray, n_queries: int, seed: int = 1) -> np.ndarray:
+    """Return perturbed copies of stored vectors, mimicking paraphrased questions."""
+    rng = np.random.default_rng(seed)
+    picked = vecs[rng.choice(len(vecs), size=min(n_queries, len(vecs)), replace=False)]
+    queries = picked + 0.3 * rng.standard_normal(picked.shape).astype("float32")
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def _timed_search(index: faiss.Index, queries: np.ndarray, k: int):
+    """Search one query at a time (as the API does) and collect per-query latencies."""
+    ids = np.empty((len(queries), k), dtype="int64")
+    lat = np.empty(len(queries))
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        _, I = index.search(q[None, :], k)
+        lat[i] = time.perf_counter() - t0
+        ids[i] = I[0]
+    return ids, lat
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    """Mean fraction of true top-k ids present in the found top-k."""
+    hits = [
+        len(set(f[f >= 0]) & set(t[t >= 0])) / max(1, int((t >= 0).sum()))
+        for f, t in zip(found, truth)
+    ]
+    return float(np.mean(hits))
+
+
+def benchmark_specs(
+    vecs: np.ndarray,
+    queries: np.ndarray,
+    specs: Sequence[str] = DEFAULT_SPECS,
+    k: int = 10,
+    nprobe: Sequence[int] = (8, 32),
+    ef_search: Sequence[int] = (32, 128),
+) -> List[Dict]:
+    """Build every spec over ``vecs`` and compare it with exact search.
+
+    IVF specs are swept over ``nprobe`` and HNSW over ``ef_search``.
+    """
+    n, dim = vecs.shape
+    rows: List[Dict] = []
+    space = faiss.ParameterSpace()
+    for spec in ("flat", *specs):
+        factory = resolve_index_spec(spec, n, dim)
+        t0 = time.perf_counter()
+        try:
+            index = make_index(factory, vecs)
+        except RuntimeError as e:
+            rows.append({"spec": factory, "param": "-", "error": str(e).splitlines()[0]})
+            continue
+        build_sec = time.perf_counter() - t0
+        size = len(faiss.serialize_index(index))
+        if "IVF" in factory:
+            sweep = [("nprobe", v) for v in nprobe]
+        elif "HNSW" in factory:
+            sweep = [("efSearch", v) for v in ef_search]
+        else:
+            sweep = [(None, None)]
+        for param, value in sweep:
+            if param:
+                space.set_index_parameter(index, param, value)
+            ids, lat = _timed_search(index, queries, k)
+            if spec == "flat":
+                truth = ids
+            rows.append({
+                "spec": factory,
+                "param": f"{param}={value}" if param else "-",
+                "build_sec": round(build_sec, 2),
+                f"recall@{k}": round(_recall(ids, truth), 4),
+                "mean_ms": round(float(lat.mean()) * 1000, 3),
+                "p95_ms": round(float(np.percentile(lat, 95)) * 1000, 3),
+                "size_mb": round(size / 2**20, 1),
+            })
+    return rows
+
+
+def format_report(rows: List[Dict]) -> str:
+    """Render benchmark rows as a fixed-width text table."""
+    if not rows:
+        return ""
+    cols = list(dict.fromkeys(c for r in rows for c in r))
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in cols}
+    lines = ["  ".join(c.ljust(widths[c]) for c in cols)]
+    lines += ["  ".join(str(r.get(c, "")).ljust(widths[c]) for c in cols) for r in rows]
+    return "\n".join(lines)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--story", type=Path, help="markdown file to chunk and embed")
+    src.add_argument("--synthetic", type=int, help="number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--specs", nargs="+", default=list(DEFAULT_SPECS))
+    args = parser.parse_args(argv)
+
+    if args.story:
+        from App.Services.faiss_converter import chunk_markdown_local, embed_texts
+        md = args.story.read_text(encoding="utf-8", errors="ignore")
+        vecs = embed_texts([r["text"] for r in chunk_markdown_local(md)])
+    else:
+        vecs = synthetic_corpus(args.synthetic, args.dim)
+    queries = make_queries(vecs, args.queries)
+    print(format_report(benchmark_specs(vecs, queries, args.specs, k=args.k)))
+
+
+if __name__ == "__main__":
+    main()
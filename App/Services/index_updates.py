@@ -0,0 +1,235 @@
+"""Incremental updates of a published FAISS index.
+
+Indexes built by ``build_index`` are keyed by the content-hash chunk ids
+(``IndexIDMap2``, or the native ids of IVF indexes), so documents can be added or removed without
+re-embedding the rest of the corpus. ``update_generation`` derives a new
+generation from the live one:
+
+- chunks whose sources are all removed (or re-added) are deleted by id;
+  index types that cannot delete (HNSW) keep the vectors and record their
+  ids as tombstones, which searches skip until the next compaction. A chunk
+  another file still contains is kept and credited to that file;
+- chunks of the added file are embedded (through the persistent embedding
+  store) and appended with ``add_with_ids``;
+- the binary chunk meta and BM25 postings are rewritten from the kept and
+  added records (no embedding involved); kept heading sections keep their
+  section vectors and the added file's sections are averaged anew.
+
+The new generation is validated and published like a full build, so serving
+processes hot-swap to it.
+"""
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+import faiss
+import numpy as np
+
+from App.Config.config import settings
+from App.Core.bm25 import BM25Index, bm25_path
+from App.Core.chunk_store import (
+    PackedChunks, PackedWriter, chunk_label, iter_meta_records, read_id_map, read_shared_sources,
+    write_id_map, write_shared_sources,
+)
+from App.Core.embedding_store import embed_cached
+from App.Core.index_generations import (
+    current_generation, generation_index_path, new_generation_id, prune_generations,
+    publish_generation, read_manifest, resolve_index, write_manifest,
+)
+from App.Core.rag import FaissRAG
+from App.Core.sections import SectionBuilder, SectionIndex, sections_path
+from App.Services.faiss_converter import (
+    _batched, iter_story_records, make_id_index, validate_index,
+)
+from App.Services.utility import logging_function
+
+
+def list_sources(index_path: str | Path) -> Dict[str, int]:
+    """Return ``{source: chunk count}`` for the live generation of ``index_path``.
+
+    A chunk shared by several files counts for each of them.
+    """
+    live_path, _ = resolve_index(index_path)
+    counts: Dict[str, int] = {}
+    for record in iter_meta_records(live_path):
+        source = record.get("source", "")
+        counts[source] = counts.get(source, 0) + 1
+    for sources in read_shared_sources(live_path).values():
+        for source in sources:
+            counts[source] = counts.get(source, 0) + 1
+    return counts
+
+
+def _compact(index: faiss.Index, tombstones: np.ndarray, factory: str) -> faiss.Index:
+    """Rebuild an ``IndexIDMap2`` without its tombstoned vectors (no re-embedding)."""
+    inner = faiss.downcast_index(index.index)
+    vecs = inner.reconstruct_n(0, inner.ntotal)
+    ids = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(ids, tombstones)
+    fresh = make_id_index(factory, index.d)
+    if not fresh.is_trained:
+        fresh.train(vecs[keep])
+    fresh.add_with_ids(vecs[keep], ids[keep])
+    logging_function(f"Compacted index: dropped {int((~keep).sum())} tombstoned vectors", level="info")
+    return fresh
+
+
+def update_generation(
+    index_path: str | Path,
+    add_path: str | Path | None = None,
+    remove_sources: Sequence[str] = (),
+    source: str | None = None,
+    chunk_words: int = 220,
+    overlap_words: int = 50,
+    keep: int = 2,
+    progress: Callable[[int, int], None] | None = None,
+) -> dict:
+    """Publish a new generation with ``add_path`` added and ``remove_sources`` removed.
+
+    ``source`` names the added document in the meta (default: its file name);
+    an existing document with the same source is replaced. Cost is
+    proportional to the change for embedding; index, meta and BM25 files are
+    rewritten sequentially.
+
+    Raises FileNotFoundError if there is no live index or ``add_path`` is
+    missing, RuntimeError if the live index predates id mapping or another
+    update published first.
+    """
+    index_path = Path(index_path)
+    base_generation = current_generation(index_path)
+    live_path, _ = resolve_index(index_path)
+    if not live_path.exists():
+        raise FileNotFoundError(f"No live index at {index_path}; build it first.")
+    manifest = read_manifest(live_path)
+    labels, tombstones = read_id_map(live_path)
+    if not manifest.get("id_map") or labels is None:
+        raise RuntimeError(f"{index_path} was built without chunk ids; rebuild it once with /faiss/run_faiss.")
+    if add_path is not None:
+        add_path = Path(add_path)
+        if not add_path.exists():
+            raise FileNotFoundError(f"File {add_path} does not exist.")
+        source = source or add_path.name
+    removed_sources = set(remove_sources) | ({source} if add_path is not None else set())
+
+    index = faiss.read_index(str(live_path))
+    live_sections = None
+    if sections_path(live_path).exists():
+        live_sections = SectionIndex.load(sections_path(live_path))
+    sections = SectionBuilder() if live_sections is not None else None
+    shared = read_shared_sources(live_path)
+    new_shared: Dict[str, List[str]] = {}
+    tomb = set(int(t) for t in tombstones)
+    generation = new_generation_id()
+    gen_index = generation_index_path(index_path, generation)
+    gen_index.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        writer = PackedWriter(FaissRAG.meta_path_for(gen_index))
+        new_labels: List[int] = []
+        removed_ids: List[int] = []
+        added = embedded = 0
+
+        def keep_record(r: dict, label: int) -> None:
+            writer.add(r)
+            new_labels.append(label)
+
+        try:
+            # Stream the live meta: kept records go straight to the new generation.
+            for pos, (record, label) in enumerate(zip(iter_meta_records(live_path), labels)):
+                others = [s for s in shared.get(record["id"], ()) if s not in removed_sources]
+                if record.get("source") in removed_sources:
+                    if not others:
+                        removed_ids.append(int(label))
+                        continue
+                    record = {**record, "source": others.pop(0)}
+                if others:
+                    new_shared[record["id"]] = others
+                keep_record(record, int(label))
+                if sections is not None:
+                    sections.keep(live_sections, int(live_sections.chunk_section[pos]))
+            kept_labels = set(new_labels)
+            if removed_ids:
+                try:
+                    index.remove_ids(faiss.IDSelectorBatch(np.array(removed_ids, dtype="int64")))
+                except RuntimeError:
+                    tomb.update(removed_ids)
+
+            if add_path is not None:
+                todo = []
+                for r in iter_story_records(add_path, chunk_words, overlap_words, source=source):
+                    if chunk_label(r["id"]) in kept_labels:
+                        # Already stored for another file: only credit this one too.
+                        new_shared.setdefault(r["id"], []).append(source)
+                    else:
+                        todo.append(r)
+                if progress:
+                    progress(0, len(todo))
+                for batch in _batched(todo, settings.ingest_batch_size):
+                    batch_labels = np.array([chunk_label(r["id"]) for r in batch], dtype="int64")
+                    # Vectors of tombstoned chunks are still in the index: revive instead of re-adding.
+                    fresh = np.array([int(l) not in tomb for l in batch_labels])
+                    tomb.difference_update(int(l) for l in batch_labels)
+                    # Revived vectors are embedded too (store hits) for the section means.
+                    vecs, n_new = embed_cached([r["text"] for r in batch], [r["hash"] for r in batch])
+                    embedded += n_new
+                    if fresh.any():
+                        index.add_with_ids(vecs[fresh], batch_labels[fresh])
+                    for r, label, vec in zip(batch, batch_labels, vecs):
+                        keep_record(r, int(label))
+                        if sections is not None:
+                            sections.add(r, vec)
+                    added += len(batch)
+                    if progress:
+                        progress(added, len(todo))
+        finally:
+            count = writer.close()
+        if not count:
+            raise RuntimeError("Update would leave the index empty.")
+
+        tomb_arr = np.array(sorted(tomb), dtype="int64")
+        if isinstance(index, faiss.IndexIDMap2) and len(tomb_arr) > settings.faiss_max_tombstone_ratio * count:
+            index = _compact(index, tomb_arr, manifest.get("index_spec", "Flat"))
+            tomb_arr = np.empty(0, dtype="int64")
+        faiss.write_index(index, str(gen_index))
+        write_id_map(gen_index, np.array(new_labels, dtype="int64"), tomb_arr)
+        write_shared_sources(gen_index, new_shared)
+        manifest.pop("sections", None)
+        if sections is not None:
+            section_index = sections.build()
+            section_index.save(sections_path(gen_index))
+            manifest["sections"] = len(section_index)
+        chunks = PackedChunks(FaissRAG.meta_path_for(gen_index))
+        try:
+            BM25Index.build(chunks.get(i)[1] for i in range(count)).save(bm25_path(gen_index))
+        finally:
+            chunks.close()
+        result = {
+            **manifest,
+            "chunks": count,
+            "embedded": embedded,
+            "added": added,
+            "removed": len(removed_ids),
+            "tombstones": int(len(tomb_arr)),
+            "index_path": str(gen_index),
+            "meta_path": str(FaissRAG.meta_path_for(gen_index)),
+            "generation": generation,
+            "updated_from": base_generation,
+        }
+        write_manifest(gen_index, result)
+        validate_index(gen_index, count)
+        if current_generation(index_path) != base_generation:
+            raise RuntimeError("Another build published a generation during this update; retry.")
+    except Exception:
+        shutil.rmtree(gen_index.parent, ignore_errors=True)
+        raise
+    publish_generation(index_path, generation)
+    pruned = prune_generations(index_path, keep=keep)
+    if pruned:
+        logging_function(f"Pruned old index generations: {pruned}", level="info")
+    logging_function(
+        f"Updated {index_path}: +{added} / -{len(removed_ids)} chunks "
+        f"({embedded} embedded, {len(tomb_arr)} tombstones)",
+        level="info",
+    )
+    return result
@@ -0,0 +1,266 @@
+"""Background FAISS ingest jobs.
+
+Index builds are CPU-bound (chunking, embedding, training), so running them
+inside a request handler blocks the event loop and steals cores from queries.
+``IngestJobs`` submits each build to a small process pool instead and hands
+back a job id immediately. Worker processes run at lower priority with their
+own thread budget (``INGEST_THREADS``), report progress through a queue that a
+listener thread folds into the job record, and stop at the next batch when a
+cancel marker file appears.
+
+When a job succeeds, the serving store for its index is refreshed, which hot-
+swaps the newly published generation.
+"""
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from App.Config.config import settings
+from App.Services.utility import logging_function
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+_progress_queue = None
+_cancel_dir: Optional[Path] = None
+
+
+class IngestCancelled(RuntimeError):
+    """Raised inside a worker when its job was cancelled."""
+
+
+def _init_worker(progress_queue, cancel_dir: str, threads: int, nice: int) -> None:
+    """Process-pool initializer: wire the progress queue and cap CPU usage."""
+    global _progress_queue, _cancel_dir
+    _progress_queue = progress_queue
+    _cancel_dir = Path(cancel_dir)
+    if threads > 0:
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ[var] = str(threads)
+        settings.embedding_threads = threads
+        import faiss
+        faiss.omp_set_num_threads(threads)
+    if nice and hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def _cancel_marker(cancel_dir: Path, job_id: str) -> Path:
+    return cancel_dir / f"{job_id}.cancel"
+
+
+def run_build(job_id: str, params: dict) -> dict:
+    """Worker entry point: run the job's operation and stream its progress.
+
+    ``params["operation"]`` is ``build`` (default, ``build_generation``) or
+    ``update`` (``update_generation``); the remaining params are passed on.
+    """
+    params = dict(params)
+    if params.pop("operation", "build") == "update":
+        from App.Services.index_updates import update_generation as operation
+    else:
+        from App.Services.faiss_converter import build_generation as operation
+
+    def progress(done: int, total: int) -> None:
+        if _cancel_dir is not None and _cancel_marker(_cancel_dir, job_id).exists():
+            raise IngestCancelled(f"Job {job_id} was cancelled.")
+        if _progress_queue is not None:
+            _progress_queue.put((job_id, done, total))
+
+    return operation(progress=progress, **params)
+
+
+@dataclass
+class IngestJob:
+    """State of one background build as reported by the status endpoints."""
+    job_id: str
+    params: dict
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    chunks_done: int = 0
+    chunks_total: int | None = None
+    result: dict | None = None
+    error: str | None = None
+
+    def to_dict(self) -> dict:
+        """Return a JSON-ready view including throughput and ETA."""
+        elapsed = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        rate = self.chunks_done / elapsed if elapsed and self.chunks_done else None
+        eta = None
+        if rate and self.chunks_total is not None and self.status == RUNNING:
+            eta = max(0.0, (self.chunks_total - self.chunks_done) / rate)
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "operation": self.params.get("operation", "build"),
+            "story_path": self.params.get("story_path") or self.params.get("add_path"),
+            "index_path": self.params.get("index_path"),
+            "chunks_done": self.chunks_done,
+            "chunks_total": self.chunks_total,
+            "chunks_per_sec": round(rate, 2) if rate else None,
+            "elapsed_sec": round(elapsed, 2) if elapsed is not None else None,
+            "eta_sec": round(eta, 1) if eta is not None else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class IngestJobs:
+    """Registry of ingest jobs backed by a lazily started process pool."""
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        executor_factory: Callable[..., Executor] | None = None,
+        build: Callable[[str, dict], dict] = run_build,
+        on_success: Callable[[IngestJob], None] | None = None,
+        max_jobs: int = 100,
+    ):
+        self.workers = workers or settings.ingest_workers
+        self._executor_factory = executor_factory or self._process_pool
+        self._build = build
+        self._on_success = on_success or _refresh_store
+        self._max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor: Executor | None = None
+        self._queue = None
+        self._cancel_dir: Path | None = None
+
+    def _process_pool(self, initializer, initargs) -> Executor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=initializer,
+            initargs=initargs,
+        )
+
+    def _ensure_executor(self) -> Executor:
+        if self._executor is None:
+            if self._queue is None:
+                self._queue = mp.get_context("spawn").Queue()
+                self._cancel_dir = Path(tempfile.mkdtemp(prefix="ingest-jobs-"))
+                threading.Thread(target=self._listen, name="ingest-progress", daemon=True).start()
+            self._executor = self._executor_factory(
+                _init_worker,
+                (self._queue, str(self._cancel_dir), settings.ingest_threads, settings.ingest_nice),
+            )
+        return self._executor
+
+    def _listen(self) -> None:
+        """Fold progress messages from workers into the job records."""
+        while True:
+            try:
+                msg = self._queue.get()
+            except (EOFError, OSError, ValueError):
+                return  # queue closed at interpreter shutdown
+            if msg is None:
+                return
+            job_id, done, total = msg
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.status in FINISHED:
+                    continue
+                if job.status == QUEUED:
+                    job.status, job.started_at = RUNNING, time.time()
+                job.chunks_done, job.chunks_total = done, total
+
+    def submit(self, **params) -> IngestJob:
+        """Queue a build (or ``operation="update"``) with ``params`` and return its job."""
+        job = IngestJob(job_id=uuid.uuid4().hex[:12], params=params)
+        with self._lock:
+            executor = self._ensure_executor()
+            self._jobs[job.job_id] = job
+            self._trim()
+            future = executor.submit(self._build, job.job_id, params)
+            self._futures[job.job_id] = future
+        future.add_done_callback(lambda f, job_id=job.job_id: self._finish(job_id, f))
+        logging_function(
+            f"Ingest job {job.job_id} queued: {params.get('operation', 'build')} "
+            f"{params.get('story_path') or params.get('add_path') or params.get('remove_sources')}",
+            level="info",
+        )
+        return job
+
+    def _finish(self, job_id: str, future: Future) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            self._futures.pop(job_id, None)
+            if job is None:
+                return
+            job.finished_at = time.time()
+            if future.cancelled():
+                job.status = CANCELLED
+            else:
+                exc = future.exception()
+                if isinstance(exc, IngestCancelled):
+                    job.status, job.error = CANCELLED, str(exc)
+                elif exc is not None:
+                    job.status, job.error = FAILED, str(exc)
+                    if isinstance(exc, BrokenExecutor):
+                        # A worker died (e.g. OOM); start a fresh pool for the next job.
+                        self._executor = None
+                else:
+                    job.status, job.result = SUCCEEDED, future.result()
+                    job.chunks_done = job.chunks_total = job.result.get("chunks", job.chunks_done)
+        _cancel_marker(self._cancel_dir, job_id).unlink(missing_ok=True)
+        logging_function(f"Ingest job {job_id} {job.status}" + (f": {job.error}" if job.error else ""),
+                         level="error" if job.status == FAILED else "info")
+        if job.status == SUCCEEDED:
+            try:
+                self._on_success(job)
+            except Exception as e:
+                logging_function(f"Refreshing store after job {job_id} failed: {e}", level="error")
+
+    def _trim(self) -> None:
+        """Forget the oldest finished jobs beyond ``max_jobs``."""
+        for job_id in [j for j, job in self._jobs.items() if job.status in FINISHED]:
+            if len(self._jobs) <= self._max_jobs:
+                break
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> IngestJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> IngestJob | None:
+        """Cancel a queued job outright, or signal a running one to stop."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            future = self._futures.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        if future is not None and future.cancel():
+            return job
+        _cancel_marker(self._cancel_dir, job_id).touch()
+        return job
+
+
+def _refresh_store(job: IngestJob) -> None:
+    """Hot-swap the serving store onto the generation ``job`` just published."""
+    from App.Core.rag_registry import get_store
+    get_store(job.params["index_path"]).refresh()
+
+
+jobs = IngestJobs()
@@ -0,0 +1,106 @@
+""" Tests for Core/answer_cache.py and its use in Services/qa_pipeline.py """
+from types import SimpleNamespace
+
+import numpy as np
+
+from App.Core import answer_cache
+from App.Core.answer_cache import SemanticAnswerCache
+from App.Services import qa_pipeline
+from App.Services.qa_pipeline import QAPipeline
+
+
+class FakeStore:
+    index_path, generation = "idx", "g1"
+
+    def ensure_loaded(self):
+        pass
+
+    def search(self, question, k, with_scores):
+        return [("chunk_1", "The king rules the north.", 0.9)]
+
+    def search_many(self, questions, k, with_scores, vectors):
+        self.searched = (list(questions), vectors)
+        return [self.search(q, k, with_scores) for q in questions]
+
+    def section_titles(self, ctx):
+        return ["North"]
+
+
+def _vec(*values):
+    v = np.array([values], dtype="float32")
+    return v / np.linalg.norm(v)
+
+
+def test_lookup_threshold_generation_and_eviction():
+    """ Ensures only close questions hit, a new generation empties the cache and old entries are evicted. """
+    cache = SemanticAnswerCache(max_entries=2, threshold=0.9)
+    assert cache.lookup(_vec(1, 0, 0), "g1") is None
+    cache.store(_vec(1, 0, 0), "g1", {"answer": "a"})
+    cache.store(_vec(0, 1, 0), "g1", {"answer": "b"})
+    answer, score = cache.lookup(_vec(1, 0.1, 0), "g1")
+    assert answer == {"answer": "a"} and score > 0.9
+    assert cache.lookup(_vec(1, 1, 0), "g1") is None
+
+    cache.store(_vec(0, 0, 1), "g1", {"answer": "c"})
+    assert cache.lookup(_vec(0, 1, 0), "g1") is None
+    assert cache.lookup(_vec(1, 0, 0), "g1")[0] == {"answer": "a"}
+
+    assert cache.lookup(_vec(1, 0, 0), "g2") is None
+    cache.store(_vec(1, 0, 0), "g1", {"answer": "stale"})
+    assert len(cache) == 0
+    assert cache.stats()["invalidated"] == 2
+
+
+def test_paraphrase_is_answered_without_llm(monkeypatch):
+    """ Ensures a paraphrased question reuses the stored answer until the index generation changes. """
+    vectors = {"Who rules the north?": _vec(1, 0), "who rules north": _vec(1, 0.05), "Who is the smith?": _vec(0, 1)}
+    store = FakeStore()
+    calls = []
+
+    def fake_chat_json(system, user, session_id):
+        calls.append(user)
+        return {"answer": f"answer {len(calls)}", "sources": ["chunk_1"]}
+
+    monkeypatch.setattr(qa_pipeline, "question_vector", lambda q: vectors[q])
+    monkeypatch.setattr(qa_pipeline, "chat_json", fake_chat_json)
+    monkeypatch.setattr(qa_pipeline, "context_cache", SimpleNamespace(add=lambda *a: None, all=lambda: {}))
+    monkeypatch.setattr(answer_cache.settings, "qa_semantic_cache_threshold", 0.95)
+    pipeline = QAPipeline(store)
+
+    first = pipeline.answer("Who rules the north?")
+    again = pipeline.answer("who rules north")
+    assert again == {**first, "cached": True} and len(calls) == 1
+    assert pipeline.answer("Who is the smith?")["answer"] == "answer 2"
+
+    store.generation = "g2"
+    assert "cached" not in pipeline.answer("who rules north") and len(calls) == 3
+
+
+
+def test_answer_many_embeds_the_batch_once(monkeypatch):
+    """ Ensures one embedding call serves both the cache lookups and the retrieval of the misses. """
+    vectors = np.concatenate([_vec(1, 0), _vec(0, 1)])
+    batches = []
+
+    def fake_vectors(questions):
+        batches.append(list(questions))
+        return vectors
+
+    def no_single(question):
+        raise AssertionError("question embedded on its own")
+
+    store = FakeStore()
+    monkeypatch.setattr(qa_pipeline, "question_vectors", fake_vectors)
+    monkeypatch.setattr(qa_pipeline, "question_vector", no_single)
+    monkeypatch.setattr(qa_pipeline, "chat_json", lambda system, user, session_id: {"answer": "fresh", "sources": []})
+    monkeypatch.setattr(qa_pipeline, "context_cache", SimpleNamespace(add=lambda *a: None, all=lambda: {}))
+    cache = answer_cache.answer_cache_for(store)
+    cache.lookup(_vec(1, 0), "g1")
+    cache.store(_vec(1, 0), "g1", {"answer": "cached", "sources": []})
+
+    results = QAPipeline(store).answer_many(["Who rules the north?", "Who is the smith?"])
+    assert [r["answer"] for r in results] == ["cached", "fresh"]
+    assert batches == [["Who rules the north?", "Who is the smith?"]]
+    questions, searched = store.searched
+    assert questions == ["Who is the smith?"]
+    np.testing.assert_array_equal(searched, vectors[1:])
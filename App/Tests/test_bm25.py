@@ -0,0 +1,37 @@
+""" Tests for Core/bm25.py """
+from App.Core.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+DOCS = [
+    "The Iron Clan forges blades beneath Karak Dur.",
+    "The Verdant Covenant guards the Whispering Wood.",
+    "Traders of the Glass Sea sail between the shards.",
+]
+
+
+def test_tokenize_lowercases_and_keeps_unicode_words():
+    """ Ensures tokens are lower-cased words including non-ASCII letters. """
+    assert tokenize("Łódź, Karak-Dur!") == ["łódź", "karak", "dur"]
+
+
+def test_search_ranks_proper_noun_match_first():
+    """ Ensures the document containing the queried name ranks first. """
+    index = BM25Index.build(DOCS)
+    hits = index.search("verdant covenant", k=3)
+    assert hits[0][0] == 1
+    assert all(score > 0 for _, score in hits)
+    assert index.search("dragon", k=3) == []
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    """ Ensures a saved index returns identical results after loading. """
+    index = BM25Index.build(DOCS)
+    path = tmp_path / "index.faiss.bm25.npz"
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.search("glass sea", k=2) == index.search("glass sea", k=2)
+
+
+def test_reciprocal_rank_fusion_prefers_documents_in_both_rankings():
+    """ Ensures RRF promotes a document ranked by both retrievers. """
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 4, 1]], k=2) == [1, 3]
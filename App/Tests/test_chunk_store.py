@@ -0,0 +1,44 @@
+""" Tests for Core/chunk_store.py binary chunk metadata """
+import json
+
+import pytest
+
+from App.Core.chunk_store import PackedChunks, pack_meta, write_packed
+
+
+def test_binary_meta_round_trips_all_fields(tmp_path):
+    """ Ensures every stored field reads back exactly, including non-ASCII and empty values. """
+    records = [
+        {"id": "chunk_a", "text": "Smok zieje ogniem 🐉", "source": "north/a.md", "heading": "Smoki", "hash": "ab"},
+        {"id": "chunk_b", "text": "", "source": "b.md", "heading": "", "hash": "cd"},
+    ]
+    path = tmp_path / "i.faiss.meta.bin"
+    assert write_packed(records, path) == 2
+
+    for use_mmap in (True, False):
+        meta = PackedChunks(path, use_mmap=use_mmap)
+        assert len(meta) == 2
+        assert list(meta.records()) == records
+        assert meta.get(0) == ("chunk_a", "Smok zieje ogniem 🐉")
+        meta.close()
+
+
+def test_jsonl_conversion_keeps_only_present_fields(tmp_path):
+    """ Ensures legacy ``{"id", "text"}`` metadata converts without inventing optional fields. """
+    jsonl = tmp_path / "i.faiss.meta.jsonl"
+    jsonl.write_text("\n".join(json.dumps({"id": f"c{i}", "text": f"t{i}"}) for i in range(3)) + "\n", encoding="utf-8")
+    path = tmp_path / "i.faiss.meta.bin"
+
+    assert pack_meta(jsonl, path) == 3
+    meta = PackedChunks(path)
+    assert meta.fields == ("id", "text")
+    assert meta.get(2) == ("c2", "t2")
+    assert meta.field(2, "source") == ""
+
+
+def test_rejects_other_files(tmp_path):
+    """ Ensures a file that is not chunk metadata fails loudly instead of returning garbage. """
+    path = tmp_path / "i.faiss.meta.bin"
+    path.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError):
+        PackedChunks(path)
@@ -0,0 +1,43 @@
+""" Tests for Core/context_packer.py """
+from App.Core.context_packer import estimate_tokens, merge_passages, pack_context
+
+
+def _words(start, end):
+    return " ".join(f"w{i}" for i in range(start, end))
+
+
+def test_overlapping_hits_are_merged_once():
+    """ Ensures sliding-window neighbours are sent as one passage without the repeated words. """
+    hits = [("b", _words(15, 35)), ("a", _words(0, 20)), ("c", _words(100, 110))]
+    passages, merged = merge_passages(hits, min_overlap_words=3)
+    assert merged == 1
+    assert [p.ids for p in passages] == [["b", "a"], ["c"]]
+    assert passages[0].words == _words(0, 35).split()
+
+
+def test_explicit_zero_overlap_is_not_replaced_by_default():
+    """ Ensures min_overlap_words=0 merges short overlaps instead of falling back to the setting. """
+    hits = [("a", _words(0, 10)), ("b", _words(8, 20))]
+    assert merge_passages(hits)[1] == 0
+    passages, merged = merge_passages(hits, min_overlap_words=0)
+    assert merged == 1 and passages[0].words == _words(0, 20).split()
+
+
+def test_low_scores_are_dropped_but_best_hit_kept():
+    """ Ensures weak matches are filtered while the top hit always reaches the prompt. """
+    hits = [("a", "alpha", 0.1), ("b", "beta", 0.05), ("c", "gamma", None)]
+    packed = pack_context(hits, budget=0, min_score=0.5)
+    assert packed.sources == ["a", "c"]
+    assert packed.dropped == 1
+
+
+def test_budget_limits_context_and_reports_savings():
+    """ Ensures the packed context stays within the budget and keeps the newest memory first. """
+    hits = [("a", _words(0, 200)), ("b", _words(500, 700))]
+    memory = {"Previous question: old": "Previous answer: x", "Previous question: new": "Previous answer: y"}
+    budget = estimate_tokens(f"a: {_words(0, 200)}") + 20
+    packed = pack_context(hits, memory, budget=budget, min_score=0.0)
+    assert packed.tokens <= budget
+    assert packed.sources == ["a"]
+    assert "Previous question: new" in packed.text and "old" not in packed.text
+    assert packed.tokens_saved == packed.tokens_raw - packed.tokens > 0
@@ -0,0 +1,110 @@
+""" Tests for Core/embedding_backends.py """
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from App.Core import embedding_backends
+from App.Core.embedding_backends import get_backend, onnx_dir
+
+
+class FakeTokenizer:
+    vocab = {"[PAD]": 0, "a": 1, "b": 2, "c": 3}
+
+    @classmethod
+    def from_file(cls, path):
+        return cls()
+
+    def token_to_id(self, token):
+        return self.vocab.get(token)
+
+    def enable_padding(self, pad_id, pad_token):
+        self.pad_id = pad_id
+
+    def enable_truncation(self, max_length):
+        pass
+
+    def encode_batch(self, texts):
+        width = max(len(t.split()) for t in texts)
+        encoded = []
+        for t in texts:
+            ids = [self.vocab[w] for w in t.split()]
+            pad = width - len(ids)
+            mask = [1] * len(ids) + [0] * pad
+            encoded.append(SimpleNamespace(ids=ids + [self.pad_id] * pad, attention_mask=mask))
+        return encoded
+
+
+class FakeSession:
+    """Returns one hidden vector per token id; padding gets a huge vector that masking must ignore."""
+
+    table = np.array([[100, 100, 100], [1, 0, 0], [0, 2, 0], [3, 0, 4]], dtype="float32")
+
+    def __init__(self, path, opts, providers):
+        self.feeds = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def run(self, outputs, feeds):
+        self.feeds.append(feeds)
+        return [self.table[feeds["input_ids"]]]
+
+
+@pytest.fixture
+def fake_onnx(tmp_path, monkeypatch):
+    (tmp_path / "model.onnx").write_bytes(b"")
+    (tmp_path / "tokenizer.json").write_text("{}")
+    monkeypatch.setattr(embedding_backends.settings, "embedding_onnx_dir", str(tmp_path))
+    ort = SimpleNamespace(SessionOptions=SimpleNamespace, InferenceSession=FakeSession)
+    monkeypatch.setitem(sys.modules, "onnxruntime", ort)
+    monkeypatch.setitem(sys.modules, "tokenizers", SimpleNamespace(Tokenizer=FakeTokenizer))
+    for name in ("torch", "sentence_transformers"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+
+def test_unknown_backend_is_rejected():
+    """ Ensures a misspelled EMBEDDING_BACKEND fails loudly instead of falling back. """
+    with pytest.raises(ValueError):
+        get_backend("tensorrt", "some/model")
+
+
+def test_onnx_dir_is_per_model():
+    """ Ensures each model id gets its own export directory. """
+    assert onnx_dir("org/model-a") != onnx_dir("org/model-b")
+    assert "/" not in onnx_dir("org/model-a").name
+
+
+def test_onnx_backend_does_not_import_torch(fake_onnx):
+    """ Ensures the ONNX backend loads without pulling in torch or sentence-transformers. """
+    backend = get_backend("onnx", "org/model")
+    backend.encode(["a b"])
+    assert backend.name == "onnx"
+    assert "torch" not in sys.modules
+    assert "sentence_transformers" not in sys.modules
+
+
+def test_onnx_pooling_ignores_padding_and_normalizes(fake_onnx):
+    """ Ensures masked mean pooling over token vectors, L2-normalized, across batch boundaries. """
+    backend = get_backend("onnx", "org/model")
+    vecs = backend.encode(["a b", "c", "a b c"], batch_size=2)
+    expected = np.array([[0.5, 1, 0], [3, 0, 4], [4 / 3, 2 / 3, 4 / 3]], dtype="float32")
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    np.testing.assert_allclose(vecs, expected, rtol=1e-6)
+    assert vecs.dtype == np.float32
+    assert backend.session.feeds[0]["attention_mask"].tolist() == [[1, 1], [1, 0]]
+
+
+def test_default_thread_cap_splits_cores_between_server_workers(monkeypatch):
+    """ Ensures EMBEDDING_THREADS defaults to a bounded share of the cores rather than 0 (framework default). """
+    from App.Config import config
+
+    monkeypatch.setattr(config.os, "cpu_count", lambda: 8)
+    monkeypatch.delenv("EMBEDDING_THREADS", raising=False)
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    assert config.Settings(groq_api_key="x").embedding_threads == 8
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert config.Settings(groq_api_key="x").embedding_threads == 2
+    monkeypatch.setenv("WEB_CONCURRENCY", "16")
+    assert config.default_embedding_threads() == 1
@@ -0,0 +1,56 @@
+""" Tests for Core/embedding_batcher.py """
+import threading
+
+import numpy as np
+import pytest
+
+from App.Core.embedding_batcher import EmbeddingBatcher
+
+
+def _fake_encode(calls):
+    def encode(texts):
+        calls.append(len(texts))
+        return np.array([[float(len(t))] for t in texts], dtype="float32")
+    return encode
+
+
+def test_concurrent_submits_share_one_forward_pass():
+    """ Ensures requests queued within the wait window are encoded together and split back per caller. """
+    calls = []
+    batcher = EmbeddingBatcher(_fake_encode(calls), max_wait_ms=200, max_batch=64)
+    futures = [batcher.submit(["x" * n]) for n in range(1, 6)]
+    results = [f.result(timeout=5) for f in futures]
+    assert [r[0, 0] for r in results] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert calls == [5]
+    assert batcher.stats()["requests"] == 5
+
+
+def test_batch_is_capped_at_max_size():
+    """ Ensures the worker does not wait for more texts once the batch is full. """
+    calls = []
+    gate = threading.Event()
+    encode = _fake_encode(calls)
+
+    def slow_encode(texts):
+        gate.wait(5)
+        return encode(texts)
+
+    batcher = EmbeddingBatcher(slow_encode, max_wait_ms=50, max_batch=2)
+    futures = [batcher.submit(["a"]) for _ in range(5)]
+    gate.set()
+    for f in futures:
+        f.result(timeout=5)
+    assert sum(calls) == 5
+    assert max(calls) <= 2
+
+
+def test_encode_errors_reach_every_caller():
+    """ Ensures a failing batch raises in each waiting caller instead of hanging them. """
+    def broken(texts):
+        raise RuntimeError("boom")
+
+    batcher = EmbeddingBatcher(broken, max_wait_ms=50)
+    futures = [batcher.submit(["a"]), batcher.submit(["b"])]
+    for f in futures:
+        with pytest.raises(RuntimeError):
+            f.result(timeout=5)
@@ -0,0 +1,45 @@
+""" Tests for Core/embedding_store.py and content-addressed chunk ids """
+import numpy as np
+
+from App.Core import embedding_store
+from App.Core.embedding_store import EmbeddingStore, embed_cached
+from App.Services.faiss_converter import chunk_markdown_local
+
+
+def test_chunk_ids_are_stable_and_deduplicated():
+    """ Ensures ids depend only on chunk text and repeated chunks are kept once. """
+    md = "# A\nsame text here\n\n# B\nsame text here\n\n# C\nother text"
+    first = chunk_markdown_local(md, chunk_words=10, overlap_words=0)
+    second = chunk_markdown_local(md, chunk_words=10, overlap_words=0)
+    assert [r["id"] for r in first] == [r["id"] for r in second]
+    assert len({r["id"] for r in first}) == len(first)
+    assert all(r["id"].startswith("chunk_") for r in first)
+
+
+def test_store_round_trips_vectors(tmp_path):
+    """ Ensures stored vectors come back per (model, backend) key. """
+    store = EmbeddingStore(tmp_path / "e.sqlite")
+    store.put_many("m", "torch", [("h1", np.array([1.0, 2.0], dtype="float32"))])
+    assert np.allclose(store.get_many("m", "torch", ["h1", "h2"])["h1"], [1.0, 2.0])
+    assert store.get_many("m", "onnx", ["h1"]) == {}
+    assert store.get_many("other", "torch", ["h1"]) == {}
+
+
+def test_embed_cached_encodes_only_new_texts(tmp_path, monkeypatch):
+    """ Ensures a rebuild after editing one chunk encodes just that chunk. """
+    encoded = []
+
+    def fake_embed(texts):
+        encoded.extend(texts)
+        return np.array([[float(len(t)), 1.0] for t in texts], dtype="float32")
+
+    monkeypatch.setattr(embedding_store, "embed_batch", fake_embed)
+    monkeypatch.setattr(embedding_store, "_store", EmbeddingStore(tmp_path / "e.sqlite"))
+    monkeypatch.setattr(embedding_store.settings, "embedding_store_path", str(tmp_path / "e.sqlite"))
+
+    vecs, n = embed_cached(["alpha", "beta"])
+    assert n == 2 and vecs.shape == (2, 2)
+    encoded.clear()
+    vecs, n = embed_cached(["alpha", "beta!"])
+    assert n == 1 and encoded == ["beta!"]
+    assert vecs[1, 0] == 5.0
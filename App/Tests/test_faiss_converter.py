@@ -0,0 +1,94 @@
+""" Tests for Services/faiss_converter.py streaming ingest """
+import re
+
+import faiss
+import numpy as np
+
+from App.Core.chunk_store import PackedChunks
+from App.Services import faiss_converter as fc
+
+
+def test_streaming_chunks_match_section_chunking():
+    """ Ensures line-by-line chunking yields the same chunks as splitting the whole text. """
+    md = "intro words here\n# One\n" + " ".join(f"a{i}" for i in range(57)) + "\n\n## Two\nshort\n"
+    expected = []
+    for sec in fc._split_by_headings(md):
+        expected += fc._word_chunks(re.sub(r"\s+", " ", sec).strip(), 20, 5)
+    assert list(fc.iter_chunks(md.splitlines(), 20, 5)) == expected
+
+
+def test_build_index_adds_in_batches_and_trains_once(tmp_path, monkeypatch):
+    """ Ensures batched ingest of a trainable index keeps vectors, meta and chunk count in sync. """
+    def fake_embed(texts, hashes):
+        rng = np.random.default_rng(len(texts))
+        vecs = rng.standard_normal((len(texts), 8)).astype("float32")
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True), len(texts)
+
+    monkeypatch.setattr(fc, "embed_cached", fake_embed)
+    monkeypatch.setattr(fc.settings, "ingest_batch_size", 7)
+    story = tmp_path / "story.md"
+    story.write_text("\n".join(f"# S{i}\nunique words {i} " + "x " * 30 for i in range(100)), encoding="utf-8")
+
+    result = fc.build_index(
+        str(story), str(tmp_path / "i.faiss"), str(tmp_path / "i.meta.bin"),
+        chunk_words=20, overlap_words=0, index_spec="IVF2,Flat",
+    )
+    index = faiss.read_index(str(tmp_path / "i.faiss"))
+    meta = PackedChunks(tmp_path / "i.meta.bin")
+    assert index.is_trained
+    assert index.ntotal == result["chunks"] == len(meta)
+    assert meta.record(0)["source"] == "story.md"
+
+
+def test_records_carry_section_heading():
+    """ Ensures each chunk record names the heading of the section it came from. """
+    records = list(fc.iter_chunk_records(["intro", "# Dragons", "fire and scales", "## Elves", "tall"], 5, 0))
+    assert [r["heading"] for r in records] == ["", "Dragons", "Elves"]
+
+
+def test_directory_records_record_source_and_skip_repeats(tmp_path, monkeypatch):
+    """ Ensures directory ingest tags records with their file and keeps cross-file duplicates once. """
+    from App.Services import directory_ingest
+
+    monkeypatch.setattr(directory_ingest.settings, "ingest_chunk_workers", 2)
+    (tmp_path / "north").mkdir()
+    (tmp_path / "north" / "a.md").write_text("# A\nalpha words\n# Footer\nshared footer", encoding="utf-8")
+    (tmp_path / "b.md").write_text("# B\nbeta words\n# Footer\nshared footer", encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("not markdown", encoding="utf-8")
+
+    records = list(directory_ingest.iter_directory_records(tmp_path, 20, 0))
+    assert sorted(r["text"] for r in records) == [
+        "# A alpha words", "# B beta words", "# Footer shared footer",
+    ]
+    sources = {r["text"]: r["source"] for r in records}
+    assert sources["# A alpha words"] == "north/a.md"
+    assert sources["# B beta words"] == "b.md"
+
+
+def test_directory_build_reports_a_running_total_of_unique_chunks(tmp_path, monkeypatch):
+    """ Ensures a directory build sizes from an estimate and its progress total ends at the unique chunk count. """
+    from App.Services import directory_ingest
+
+    def fake_embed(texts, hashes):
+        vecs = np.random.default_rng(len(texts)).standard_normal((len(texts), 8)).astype("float32")
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True), len(texts)
+
+    monkeypatch.setattr(fc, "embed_cached", fake_embed)
+    monkeypatch.setattr(fc.settings, "ingest_batch_size", 4)
+    monkeypatch.setattr(directory_ingest.settings, "ingest_chunk_workers", 2)
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for name in ("a", "b", "c"):
+        body = "\n".join(f"# {name}{i}\n{name} words {i}" for i in range(6))
+        (docs / f"{name}.md").write_text(body + "\n# Footer\nshared footer", encoding="utf-8")
+    (docs / "empty.md").write_text("", encoding="utf-8")
+
+    calls = []
+    result = fc.build_index(
+        str(docs), str(tmp_path / "i.faiss"), str(tmp_path / "i.meta.bin"),
+        chunk_words=20, overlap_words=0, index_spec="IVF2,Flat", progress=lambda d, t: calls.append((d, t)),
+    )
+    assert result["chunks"] == 19
+    assert calls[0] == (0, directory_ingest.estimate_directory_chunks(docs, 20, 0))
+    assert all(done <= total for done, total in calls)
+    assert calls[-1] == (19, 19)
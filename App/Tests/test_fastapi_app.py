@@ -80,47 +80,118 @@ def test_upload_story_saves_file(client):
     assert dest.read_bytes() == file_content
 
 def test_run_faiss_success(monkeypatch):
-    """ Test the /faiss/run_faiss endpoint with a successful build_index call."""
-    result = {"chunks": 10, "index_path": "data/index.faiss", "meta_path": "data/index.faiss.meta.jsonl"}
-    monkeypatch.setattr("Api.faiss_router.build_index", lambda **kwargs: result)
+    """ Test the /faiss/run_faiss endpoint queuing a background build job."""
+    submitted = {}
+
+    class FakeJob:
+        def to_dict(self):
+            return {"job_id": "j1", "status": "queued"}
+
+    class FakeJobs:
+        def submit(self, **kwargs):
+            submitted.update(kwargs)
+            return FakeJob()
+
+    monkeypatch.setattr("App.Api.faiss_router.jobs", FakeJobs())
     r = client.post("/api/v1/faiss/run_faiss", json={"story_path": "Data/fantasy.md"})
-    assert r.status_code == 200
-    assert r.json() == result
+    assert r.status_code == 202
+    assert r.json() == {"job_id": "j1", "status": "queued"}
+    assert submitted["story_path"] == "Data/fantasy.md"
 
 def test_run_faiss_failure(monkeypatch):
-    """ Test the /faiss/run_faiss endpoint handling a build_index exception."""
-    def raise_err(**kwargs):
-        raise RuntimeError("boom")
+    """ Test the /faiss/run_faiss endpoint handling a job submission exception."""
+    class FailingJobs:
+        def submit(self, **kwargs):
+            raise RuntimeError("boom")
 
-    monkeypatch.setattr("Api.faiss_router.build_index", raise_err)
+    monkeypatch.setattr("App.Api.faiss_router.jobs", FailingJobs())
     r = client.post("/api/v1/faiss/run_faiss", json={"story_path": "App/Data/fantasy.md"})
     assert r.status_code == 500
     assert r.json()["error"] == "boom"
 
 
-def test_chat_posts_to_local_qa(monkeypatch):
-    """ Test the /chat endpoint posting to the local QA service."""
-    class DummyResponse:
-        def __init__(self, payload):
-            self._payload = payload
+def test_unknown_job_is_404():
+    """ Test the /faiss/jobs/{job_id} endpoint for a job id that was never issued."""
+    r = client.get("/api/v1/faiss/jobs/nope")
+    assert r.status_code == 404
 
-        def json(self):
-            return self._payload
 
-    class DummyAsyncClient:
-        async def __aenter__(self):
-            return self
+def test_qa_batch_answers_every_question_in_one_call(monkeypatch):
+    """ Test the /qa/qa_batch endpoint passing all sanitized questions to one answer_many call."""
+    calls = []
 
-        async def __aexit__(self, exc_type, exc, tb):
-            return False
+    def fake_answer_many(questions, story=None):
+        calls.append((questions, story))
+        return [{"answer": q.upper(), "sources": []} for q in questions]
 
-        async def post(self, url, json=None, timeout=None):
-            assert url.endswith("/api/v1/qa/qa")
-            return DummyResponse({"answer": "ok"})
+    pipeline = SimpleNamespace(
+        sanitize_query=str.strip,
+        qa_pipeline=SimpleNamespace(answer_many=fake_answer_many),
+    )
+    monkeypatch.setattr("App.Api.routes_general._pipeline", pipeline)
 
-    monkeypatch.setattr(appmod, "httpx", appmod.httpx) 
-    monkeypatch.setattr(appmod, "httpx", SimpleNamespace(AsyncClient=DummyAsyncClient))
+    r = client.post("/api/v1/qa/qa_batch", json={"questions": [" who? ", "where?"]})
+    assert r.status_code == 200
+    assert r.json() == {"answers": [{"answer": "WHO?", "sources": []}, {"answer": "WHERE?", "sources": []}]}
+    assert calls == [(["who?", "where?"], None)]
+
+    r = client.post("/api/v1/qa/qa_batch", json={"questions": ["who?", "  "]})
+    assert r.status_code == 400
+    assert len(calls) == 1
+
+
+def test_chat_dispatches_in_process(monkeypatch):
+    """ Test the /chat endpoint calling the general pipeline without an HTTP hop."""
+    seen = {}
+
+    async def fake_aprocess(question, story=None):
+        seen.update(question=question, story=story)
+        return {"answer": "ok"}
+
+    monkeypatch.setattr(appmod.settings, "qa_service_url", "")
+    monkeypatch.setattr("App.Api.routes_general._pipeline", SimpleNamespace(aprocess=fake_aprocess))
 
     r = client.post("/api/v1/chat", data={"prompt": "Hello"})
     assert r.status_code == 200
     assert r.json() == {"answer": "ok"}
+    assert seen == {"question": "Hello", "story": None}
+
+
+def test_chat_posts_to_remote_qa_with_pooled_client(monkeypatch):
+    """ Test the /chat endpoint forwarding to QA_SERVICE_URL through the shared client."""
+    class DummyResponse:
+        status_code = 200
+
+        def json(self):
+            return {"answer": "remote"}
+
+    class DummyClient:
+        async def post(self, url, json=None):
+            assert url == "http://qa.internal/api/v1/qa/qa"
+            assert json == {"question": "Hello", "story": None, "stream": False}
+            return DummyResponse()
+
+    monkeypatch.setattr(appmod.settings, "qa_service_url", "http://qa.internal/api/v1/qa/qa")
+    monkeypatch.setattr(appmod, "qa_client", lambda: DummyClient())
+
+    r = client.post("/api/v1/chat", data={"prompt": "Hello"})
+    assert r.status_code == 200
+    assert r.json() == {"answer": "remote"}
+
+
+def test_qa_stream_sends_tokens_then_sources(monkeypatch):
+    """ Test the /qa/qa endpoint streaming Server-Sent Events when ``stream`` is set."""
+    async def fake_stream(question, story=None):
+        yield "token", {"text": "Hel"}
+        yield "token", {"text": "lo"}
+        yield "sources", {"sources": ["chunk_1"]}
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr("App.Api.routes_general._pipeline", SimpleNamespace(astream=fake_stream))
+    r = client.post("/api/v1/qa/qa", json={"question": "hi", "stream": True})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = [frame.split("\n") for frame in r.text.strip().split("\n\n")]
+    assert [e[0] for e in events] == ["event: token", "event: token", "event: sources", "event: error"]
+    assert events[1][1] == 'data: {"text": "lo"}'
+    assert events[3][1] == 'data: {"detail": "boom"}'
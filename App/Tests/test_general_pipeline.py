@@ -23,8 +23,8 @@ def make_gp_with_pipelines(npc_ret=None, qa_ret=None, classifier_resp=None, monk
         monkeypatch.setattr("Services.general_pipeline.chat_json", lambda **kwargs: classifier_resp)
 
     gp = GeneralPipeline.__new__(GeneralPipeline)
-    gp.npc_pipeline = SimpleNamespace(generate=lambda prompt, amount=None: npc_ret)
-    gp.qa_pipeline = SimpleNamespace(answer=lambda question: qa_ret)
+    gp.npc_pipeline = SimpleNamespace(generate=lambda prompt, amount=None, story=None: npc_ret)
+    gp.qa_pipeline = SimpleNamespace(answer=lambda question, story=None: qa_ret)
     return gp
 
 def test_process_routes_to_npc_when_classifier_returns_type(monkeypatch):
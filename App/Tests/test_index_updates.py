@@ -0,0 +1,100 @@
+""" Tests for Services/index_updates.py incremental add/remove """
+import hashlib
+
+import numpy as np
+import pytest
+
+from App.Core.chunk_store import read_id_map
+from App.Core.index_generations import resolve_index
+from App.Core.rag import FaissRAG
+from App.Services import faiss_converter as fc
+from App.Services import index_updates
+
+
+def _fake_embed(texts, hashes=None):
+    vecs = np.stack([
+        np.random.default_rng(int(hashlib.sha256(t.encode()).hexdigest()[:8], 16)).standard_normal(8)
+        for t in texts
+    ]).astype("float32")
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True), len(texts)
+
+
+@pytest.fixture
+def live_index(tmp_path, monkeypatch):
+    for module in (fc, index_updates):
+        monkeypatch.setattr(module, "embed_cached", _fake_embed)
+        monkeypatch.setattr(module, "validate_index", lambda *a, **k: None)
+
+    def build(spec):
+        story = tmp_path / "a.md"
+        story.write_text("\n".join(f"# A{i}\nalpha {i} " + "x " * 10 for i in range(6)), encoding="utf-8")
+        index_path = tmp_path / "index.faiss"
+        fc.build_generation(str(story), str(index_path), chunk_words=20, overlap_words=0, index_spec=spec)
+        return index_path
+
+    return build
+
+
+def _texts(index_path):
+    state = FaissRAG(index_path=index_path, mmap=False)._read()
+    return state, [state.chunks.get(i)[1] for i in range(len(state.chunks))]
+
+
+@pytest.mark.parametrize("spec", ["Flat", "HNSW8,Flat"])
+def test_add_then_remove_documents(tmp_path, live_index, monkeypatch, spec):
+    """ Ensures added chunks are searchable by id and removed sources disappear from results. """
+    monkeypatch.setattr(index_updates.settings, "faiss_max_tombstone_ratio", 10.0)
+    index_path = live_index(spec)
+    new = tmp_path / "b.md"
+    new.write_text("# B\nbeta dragons", encoding="utf-8")
+
+    result = index_updates.update_generation(index_path, add_path=new)
+    assert result["added"] == 1 and result["embedded"] == 1
+    assert index_updates.list_sources(index_path) == {"a.md": 6, "b.md": 1}
+
+    state, texts = _texts(resolve_index(index_path)[0])
+    query, _ = _fake_embed(["# B beta dragons"])
+    _, labels = state.index.search(query, 1)
+    assert texts[state.positions(labels[0])[0]] == "# B beta dragons"
+
+    result = index_updates.update_generation(index_path, remove_sources=["a.md"])
+    assert result["removed"] == 6 and result["chunks"] == 1
+    state, texts = _texts(resolve_index(index_path)[0])
+    assert texts == ["# B beta dragons"]
+    _, tombstones = read_id_map(resolve_index(index_path)[0])
+    assert len(tombstones) == (6 if spec.startswith("HNSW") else 0)
+
+
+def test_update_requires_live_index(tmp_path):
+    """ Ensures updating an index that was never built fails instead of creating an empty one. """
+    with pytest.raises(FileNotFoundError):
+        index_updates.update_generation(tmp_path / "missing.faiss", remove_sources=["a.md"])
+
+
+def test_chunk_shared_by_two_files_survives_removing_one(tmp_path, monkeypatch):
+    """ Ensures a chunk two files contain is only deleted with its last source and re-adding credits it again. """
+    for module in (fc, index_updates):
+        monkeypatch.setattr(module, "embed_cached", _fake_embed)
+        monkeypatch.setattr(module, "validate_index", lambda *a, **k: None)
+    monkeypatch.setattr(index_updates.settings, "faiss_max_tombstone_ratio", 10.0)
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.md").write_text("# A\nalpha text\n\n# Footer\nshared footer\n", encoding="utf-8")
+    (docs / "b.md").write_text("# B\nbeta text\n\n# Footer\nshared footer\n", encoding="utf-8")
+    index_path = tmp_path / "index.faiss"
+    fc.build_generation(str(docs), str(index_path), chunk_words=20, overlap_words=0, index_spec="Flat")
+    assert index_updates.list_sources(index_path) == {"a.md": 2, "b.md": 2}
+
+    index_updates.update_generation(index_path, remove_sources=["a.md"])
+    _, texts = _texts(resolve_index(index_path)[0])
+    assert sorted(texts) == ["# B beta text", "# Footer shared footer"]
+    assert index_updates.list_sources(index_path) == {"b.md": 2}
+
+    result = index_updates.update_generation(index_path, add_path=docs / "a.md")
+    assert result["added"] == 1
+    assert index_updates.list_sources(index_path) == {"a.md": 2, "b.md": 2}
+
+    index_updates.update_generation(index_path, remove_sources=["b.md"])
+    _, texts = _texts(resolve_index(index_path)[0])
+    assert sorted(texts) == ["# A alpha text", "# Footer shared footer"]
+    assert index_updates.list_sources(index_path) == {"a.md": 2}
@@ -0,0 +1,71 @@
+""" Tests for Services/ingest_jobs.py """
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from App.Services import ingest_jobs
+from App.Services.ingest_jobs import IngestCancelled, IngestJobs
+
+
+def _thread_pool(init, initargs):
+    """ Run jobs on a thread, wiring the progress queue but skipping renice/thread caps. """
+    queue, cancel_dir, _, _ = initargs
+    return ThreadPoolExecutor(1, initializer=init, initargs=(queue, cancel_dir, 0, 0))
+
+
+def _wait(manager, job_id, statuses=("succeeded", "failed", "cancelled")):
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job.status in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job stuck in {manager.get(job_id).status}")
+
+
+def test_successful_job_reports_result_and_refreshes_store():
+    """ Ensures a finished job carries the build result and triggers the store refresh. """
+    refreshed = []
+
+    def build(job_id, params):
+        return {"chunks": 3, "index_path": params["index_path"]}
+
+    manager = IngestJobs(executor_factory=_thread_pool, build=build, on_success=refreshed.append)
+    job = manager.submit(story_path="s.md", index_path="i.faiss")
+    done = _wait(manager, job.job_id)
+    assert done.status == "succeeded"
+    assert done.to_dict()["result"]["chunks"] == 3
+    assert refreshed == [done]
+
+
+def test_failed_job_keeps_error_message():
+    """ Ensures build errors end up in the job status instead of being lost. """
+    def build(job_id, params):
+        raise RuntimeError("File s.md does not exist.")
+
+    manager = IngestJobs(executor_factory=_thread_pool, build=build, on_success=lambda job: None)
+    job = _wait(manager, manager.submit(story_path="s.md", index_path="i.faiss").job_id)
+    assert job.status == "failed"
+    assert "does not exist" in job.error
+
+
+def test_running_job_reports_progress_and_can_be_cancelled():
+    """ Ensures progress reaches the job record and cancel stops the build at its next batch. """
+    started = threading.Event()
+
+    def build(job_id, params):
+        for done in range(0, 1000, 10):
+            if ingest_jobs._cancel_marker(ingest_jobs._cancel_dir, job_id).exists():
+                raise IngestCancelled("cancelled")
+            ingest_jobs._progress_queue.put((job_id, done, 1000))
+            started.set()
+            time.sleep(0.01)
+        return {"chunks": 1000}
+
+    manager = IngestJobs(executor_factory=_thread_pool, build=build, on_success=lambda job: None)
+    job = manager.submit(story_path="s.md", index_path="i.faiss")
+    started.wait(5)
+    _wait(manager, job.job_id, statuses=("running",))
+    assert manager.get(job.job_id).chunks_total == 1000
+    manager.cancel(job.job_id)
+    assert _wait(manager, job.job_id).status == "cancelled"
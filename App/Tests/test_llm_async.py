@@ -0,0 +1,92 @@
+""" Tests for the async LLM path in Core/llm.py """
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from groq import APITimeoutError
+
+from App.Core import llm
+
+
+class FakeCompletions:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append([dict(m) for m in kwargs["messages"]])
+        content = self.replies.pop(0)
+        if isinstance(content, Exception):
+            raise content
+        if kwargs.get("stream"):
+            return self._stream(content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def _stream(self, parts):
+        for part in parts:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    saved, sleeps = [], []
+
+    async def fake_session(session_id):
+        return {"session_id": session_id, "messages": [{"role": "user", "content": "earlier"}]}
+
+    async def fake_save(session_id, user, content):
+        saved.append((session_id, user, content))
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(llm, "aget_session", fake_session)
+    monkeypatch.setattr(llm, "asave_exchange", fake_save)
+    monkeypatch.setattr(llm.asyncio, "sleep", fake_sleep)
+
+    def install(replies):
+        completions = FakeCompletions(replies)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        monkeypatch.setattr(llm, "_get_async_client", lambda: client)
+        return completions
+
+    return install, saved, sleeps
+
+
+def test_chat_json_async_retries_invalid_json(fake_llm):
+    """ Ensures invalid JSON is retried with a hint and backoff, and only the final exchange is saved. """
+    install, saved, sleeps = fake_llm
+    completions = install(["not json", json.dumps({"answer": "ok"})])
+    result = asyncio.run(llm.chat_json_async("sys", "question", "s1"))
+    assert result == {"answer": "ok"}
+    assert sleeps == [1]
+    assert completions.calls[0][1] == {"role": "user", "content": "earlier"}
+    assert completions.calls[1][-1]["content"].startswith("Return ONLY valid JSON")
+    assert saved == [("s1", "question", json.dumps({"answer": "ok"}))]
+
+
+def test_chat_json_async_raises_after_last_attempt(fake_llm):
+    """ Ensures exhausted retries surface as LLMError without saving anything. """
+    install, saved, sleeps = fake_llm
+    install(["nope"] * 3)
+    with pytest.raises(llm.LLMError):
+        asyncio.run(llm.chat_json_async("sys", "question", "s1", max_retries=2))
+    assert sleeps == [1, 2, 4]
+    assert saved == []
+
+
+
+def test_chat_stream_async_yields_deltas_after_retry(fake_llm):
+    """ Ensures a failed request is retried before streaming and the joined reply is saved. """
+    install, saved, sleeps = fake_llm
+    timeout = APITimeoutError(request=httpx.Request("POST", "https://api.groq.test"))
+    install([timeout, ["The ", None, "king."]])
+
+    async def collect():
+        return [part async for part in llm.chat_stream_async("sys", "question", "s1")]
+
+    assert asyncio.run(collect()) == ["The ", "king."]
+    assert sleeps == [1]
+    assert saved == [("s1", "question", "The king.")]
@@ -0,0 +1,73 @@
+""" Tests for Core/llm_cache.py """
+import asyncio
+import json
+from types import SimpleNamespace
+
+from App.Core import llm, llm_cache
+from App.Core.llm_cache import LLMCache, cache_key
+
+
+def test_entries_expire_and_evict_least_recently_used(tmp_path, monkeypatch):
+    """ Ensures old entries expire and the size budget drops the least recently used reply. """
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = LLMCache(tmp_path / "c.sqlite", max_bytes=10, ttl_sec=60)
+    cache.put("a", "aaaa")
+    now[0] += 1
+    cache.put("b", "bbbb")
+    now[0] += 1
+    assert cache.get("a") == "aaaa"
+    now[0] += 1
+    cache.put("c", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cccc"
+    now[0] += 120
+    assert cache.get("c") is None
+    stats = cache.stats()
+    assert stats["evicted"] == 1 and stats["expired"] == 1 and stats["hits"] == 3
+
+
+def test_key_covers_the_whole_request():
+    """ Ensures any change to messages, temperature or format produces a different key. """
+    msgs = [{"role": "system", "content": "s"}, {"role": "user", "content": "u"}]
+    base = cache_key("m", msgs, 0.1, 100, {"type": "json_object"})
+    assert base == cache_key("m", [dict(m) for m in msgs], 0.1, 100, {"type": "json_object"})
+    assert base != cache_key("m", msgs + [{"role": "user", "content": "x"}], 0.1, 100, {"type": "json_object"})
+    assert base != cache_key("m", msgs, 0.2, 100, {"type": "json_object"})
+    assert base != cache_key("m", msgs, 0.1, 100, {"type": "text"})
+
+
+def test_chat_json_async_serves_repeats_from_cache(tmp_path, monkeypatch):
+    """ Ensures a repeated low-temperature call skips Groq, while bypassed and creative calls do not. """
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs["temperature"])
+        content = json.dumps({"answer": len(calls)})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def fake_session(session_id):
+        return {"session_id": session_id, "messages": []}
+
+    async def fake_save(*args):
+        pass
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm, "_get_async_client", lambda: client)
+    monkeypatch.setattr(llm, "aget_session", fake_session)
+    monkeypatch.setattr(llm, "asave_exchange", fake_save)
+    monkeypatch.setattr(llm_cache.settings, "llm_cache_enabled", True)
+    monkeypatch.setattr(llm_cache, "_cache", LLMCache(tmp_path / "c.sqlite", max_bytes=1 << 20))
+
+    async def run():
+        return [
+            await llm.chat_json_async("sys", "q", "s1"),
+            await llm.chat_json_async("sys", "q", "s2"),
+            await llm.chat_json_async("sys", "q", "s3", use_cache=False),
+            await llm.chat_json_async("sys", "q", "s4", temperature=0.7),
+        ]
+
+    assert asyncio.run(run()) == [{"answer": 1}, {"answer": 1}, {"answer": 2}, {"answer": 3}]
+    assert calls == [0.1, 0.1, 0.7]
+    stats = llm_cache.llm_cache_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["bypassed"] == 2
@@ -0,0 +1,38 @@
+""" Tests for Core/lru.py """
+from App.Core.lru import LRUCache
+
+
+def test_get_put_counts_hits_and_misses():
+    """ Ensures hits and misses are counted and reported in stats. """
+    cache = LRUCache(max_bytes=100, sizeof=lambda v: 10)
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_evicts_least_recently_used_over_byte_budget():
+    """ Ensures the oldest untouched entry is evicted when the byte budget is exceeded. """
+    cache = LRUCache(max_bytes=20, sizeof=lambda v: 10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["bytes"] == 20
+
+
+def test_ttl_expires_entries(monkeypatch):
+    """ Ensures entries older than the TTL are treated as misses. """
+    now = {"t": 100.0}
+    monkeypatch.setattr("App.Core.lru.time.monotonic", lambda: now["t"])
+    cache = LRUCache(max_bytes=100, ttl_sec=5, sizeof=lambda v: 1)
+    cache.put("a", 1)
+    now["t"] += 10
+    assert cache.get("a") is None
+    assert len(cache) == 0
@@ -28,6 +28,16 @@ class DummyStore:
         """ Returns fixed fake context tuples. """
         return [("ctx1", "lore1"), ("ctx2", "lore2")]
 
+    def search_many(self, seeds, k: int = 4, with_scores: bool = False):
+        """ Returns fixed fake context tuples (with scores if asked) for every seed. """
+        if with_scores:
+            return [[("ctx1", "lore1", 0.9), ("ctx2", "lore2", 0.05)] for _ in seeds]
+        return [self.search(s, k) for s in seeds]
+
+    def section_titles(self, hits):
+        """ Returns a fake section title per hit. """
+        return ["Forge"] * len(hits)
+
 
 class DummyCache:
     def __init__(self):
@@ -74,6 +84,16 @@ def test_normalize_to_list_variants():
     assert p._normalize_to_list("oops") == []
 
 
+def test_npc_context_drops_weak_hits_and_names_sections():
+    """ Ensures NPC retrieval keeps scores for the score filter and labels passages with section titles. """
+    store = DummyStore()
+    p = NPCPipeline(store=store)
+    ctx = p._retrieve(["smith"], store)[0]
+    context = p._npc_context(ctx, store)
+    assert "Forge" in context and "lore1" in context
+    assert "lore2" not in context
+
+
 def test_coerce_minimal_defaults_fills_fields():
     """ Ensures minimal defaults are populated to meet schema requirements.  """
     p = NPCPipeline(store=DummyStore())
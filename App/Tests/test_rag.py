@@ -0,0 +1,95 @@
+""" Tests for batched retrieval in Core/rag.py """
+import hashlib
+
+import numpy as np
+import pytest
+
+from App.Core import rag as rag_module
+from App.Core.rag import FaissRAG
+from App.Services import faiss_converter as fc
+
+
+def _fake_embed(texts, hashes=None):
+    vecs = np.stack([
+        np.random.default_rng(int(hashlib.sha256(t.encode()).hexdigest()[:8], 16)).standard_normal(8)
+        for t in texts
+    ]).astype("float32")
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True), len(texts)
+
+
+@pytest.fixture
+def build(tmp_path, monkeypatch):
+    monkeypatch.setattr(fc, "embed_cached", _fake_embed)
+    monkeypatch.setattr(fc, "validate_index", lambda *a, **k: None)
+    monkeypatch.setattr(rag_module, "embed_texts", lambda texts: _fake_embed(texts)[0])
+
+    def build_spec(spec):
+        story = tmp_path / "a.md"
+        story.write_text(
+            "".join(f"# Rozdział {i}\n" + "".join(f"słowo{i} zdanie{j}\n\n" for j in range(4)) for i in range(8)),
+            encoding="utf-8",
+        )
+        path = tmp_path / "index.faiss"
+        fc.build_generation(str(story), str(path), chunk_words=3, overlap_words=0, index_spec=spec)
+        return path
+
+    return build_spec
+
+
+@pytest.fixture
+def index_path(build):
+    return build("Flat")
+
+
+@pytest.mark.parametrize("top_sections", [0, 3])
+@pytest.mark.parametrize("mode", ["vector", "hybrid"])
+def test_search_many_matches_single_searches(index_path, monkeypatch, mode, top_sections):
+    """ Ensures one batched search returns the same ids, in the same order, as one search per query. """
+    monkeypatch.setattr(rag_module.settings, "rag_top_sections", top_sections)
+    queries = ["słowo1 zdanie2", "słowo5", "zdanie0 słowo7", "nothing alike"]
+    batched = FaissRAG(index_path=index_path, mmap=False).search_many(queries, k=3, mode=mode, with_scores=True)
+    single = FaissRAG(index_path=index_path, mmap=False)
+    expected = [single.search(q, k=3, mode=mode, with_scores=True) for q in queries]
+    assert all(len(hits) == 3 for hits in batched)
+    assert [[h[0] for h in hits] for hits in batched] == [[h[0] for h in hits] for hits in expected]
+    embedded = FaissRAG(index_path=index_path, mmap=False).search_many(
+        queries, k=3, mode=mode, with_scores=True, vectors=_fake_embed(queries)[0]
+    )
+    assert embedded == batched
+    for hits, want in zip(batched, expected):
+        np.testing.assert_allclose(
+            [h[2] or 0.0 for h in hits], [h[2] or 0.0 for h in want], rtol=1e-5
+        )
+
+
+def test_new_generation_invalidates_result_cache(index_path, monkeypatch):
+    """ Ensures a search after a new generation is published misses the cache and sees the new chunks. """
+    monkeypatch.setattr(rag_module.settings, "faiss_generation_poll_sec", 1e-9)
+    monkeypatch.setattr(rag_module.settings, "rag_top_sections", 0)
+    store = FaissRAG(index_path=index_path, mmap=False)
+    first = store.search("smoki", k=1, mode="vector")
+    assert store.search("smoki", k=1, mode="vector") == first
+    before = store.cache_stats()
+    assert before["hits"] == 1
+
+    story = index_path.parent / "b.md"
+    story.write_text("# Smoki\nsmoki\n", encoding="utf-8")
+    fc.build_generation(str(story), str(index_path), chunk_words=3, overlap_words=0, index_spec="Flat")
+
+    assert store.search("smoki", k=1, mode="vector")[0][1] == "# Smoki smoki"
+    stats = store.cache_stats()
+    assert stats["generation"] != before["generation"]
+    assert stats["hits"] == before["hits"] and stats["misses"] == before["misses"] + 1
+
+
+@pytest.mark.parametrize("spec", ["Flat", "HNSW8,Flat", "IVF2,Flat"])
+def test_mmap_store_matches_in_memory_and_counts_the_index(build, monkeypatch, spec):
+    """ Ensures a memory-mapped index answers like a loaded one and its file size counts as resident. """
+    monkeypatch.setattr(rag_module.settings, "rag_top_sections", 0)
+    path = build(spec)
+    queries = ["słowo1 zdanie2", "słowo5"]
+    mapped = FaissRAG(index_path=path, mmap=True)
+    loaded = FaissRAG(index_path=path, mmap=False)
+    assert mapped.search_many(queries, k=3, mode="vector") == loaded.search_many(queries, k=3, mode="vector")
+    state = mapped.state
+    assert state.nbytes >= state.index_path.stat().st_size
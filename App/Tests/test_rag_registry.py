@@ -0,0 +1,59 @@
+""" Tests for Core/rag_registry.py """
+import pytest
+
+from App.Core import rag_registry
+
+
+class FakeStore:
+    sizes = {}
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.state = None
+
+    def ensure_loaded(self):
+        self.state = object()
+
+    def resident_bytes(self):
+        return self.sizes.get(self.index_path.name, 100)
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_registry, "FaissRAG", FakeStore)
+    monkeypatch.setattr(rag_registry.settings, "faiss_path", str(tmp_path / "default.faiss"))
+    monkeypatch.setattr(rag_registry.settings, "rag_max_resident_bytes", 250)
+    FakeStore.sizes = {}
+    rag_registry.clear_stores()
+    yield lambda name: rag_registry.get_store(tmp_path / name)
+    rag_registry.clear_stores()
+
+
+def _names():
+    return [path.name for path in rag_registry.registered_stores()]
+
+
+def test_same_path_returns_same_instance(registry, tmp_path):
+    """ Ensures every caller shares one store per resolved index path. """
+    store = registry("a.faiss")
+    assert registry("a.faiss") is store
+    assert rag_registry.get_store(tmp_path / "x" / ".." / "a.faiss") is store
+    assert registry("b.faiss") is not store
+
+
+def test_least_recently_used_store_is_evicted(registry):
+    """ Ensures the store used longest ago is dropped once the resident cap is exceeded. """
+    registry("a.faiss")
+    registry("b.faiss")
+    registry("a.faiss")
+    registry("c.faiss")
+    assert _names() == ["a.faiss", "c.faiss"]
+
+
+def test_eviction_runs_when_a_loaded_store_grows(registry):
+    """ Ensures the cap is enforced on later calls, not only when a store is first loaded. """
+    registry("a.faiss")
+    registry("b.faiss")
+    FakeStore.sizes["b.faiss"] = 200
+    registry("b.faiss")
+    assert _names() == ["b.faiss"]
@@ -0,0 +1,125 @@
+""" Tests for Core/sections.py and two-stage retrieval in Core/rag.py """
+import dataclasses
+import hashlib
+import tracemalloc
+
+import numpy as np
+
+from App.Core import rag as rag_module
+from App.Core.rag import FaissRAG
+from App.Core.sections import SectionBuilder, SectionIndex
+from App.Services import faiss_converter as fc
+
+
+def _fake_embed(texts, hashes=None):
+    vecs = np.stack([
+        np.random.default_rng(int(hashlib.sha256(t.encode()).hexdigest()[:8], 16)).standard_normal(8)
+        for t in texts
+    ]).astype("float32")
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True), len(texts)
+
+
+def test_section_index_round_trips_and_lists_members(tmp_path):
+    """ Ensures section vectors are chunk means and membership survives save/load. """
+    builder = SectionBuilder()
+    vecs = np.eye(3, dtype="float32")
+    builder.add({"source": "a.md", "heading": "Smoki"}, vecs[0])
+    builder.add({"source": "a.md", "heading": ""}, vecs[1])
+    builder.add({"source": "a.md", "heading": "Smoki"}, vecs[2])
+    builder.build().save(tmp_path / "s.npz")
+
+    sections = SectionIndex.load(tmp_path / "s.npz")
+    assert len(sections) == 2
+    assert [sections.title(s) for s in range(2)] == ["Smoki", "a.md"]
+    assert sorted(sections.positions(np.array([0]))) == [0, 2]
+    np.testing.assert_allclose(sections.vectors[0], [2 ** -0.5, 0, 2 ** -0.5], rtol=1e-6)
+
+
+def test_two_stage_search_returns_hit_with_section_title(tmp_path, monkeypatch):
+    """ Ensures searching only the top sections still finds the best chunk and names its section. """
+    monkeypatch.setattr(fc, "embed_cached", _fake_embed)
+    monkeypatch.setattr(fc, "validate_index", lambda *a, **k: None)
+    monkeypatch.setattr(rag_module, "embed_texts", lambda texts: _fake_embed(texts)[0])
+    monkeypatch.setattr(rag_module.settings, "rag_top_sections", 2)
+    story = tmp_path / "a.md"
+    story.write_text("".join(f"# Rozdział {i}\nslowa {i}\n" for i in range(6)), encoding="utf-8")
+    index_path = tmp_path / "index.faiss"
+    fc.build_generation(str(story), str(index_path), chunk_words=20, overlap_words=0, index_spec="Flat")
+
+    store = FaissRAG(index_path=index_path, mmap=False)
+    hits = store.search("# Rozdział 3 slowa 3", k=1, mode="vector")
+    assert hits[0][1] == "# Rozdział 3 slowa 3"
+    assert store.section_titles(hits) == ["Rozdział 3"]
+
+
+
+def test_builder_keeps_no_vector_per_chunk():
+    """ Ensures ingest memory for sections grows with the section count, not one vector per chunk. """
+    vecs = np.random.default_rng(0).standard_normal((5000, 64)).astype("float32")
+    builder = SectionBuilder()
+    tracemalloc.start()
+    try:
+        for i, vec in enumerate(vecs):
+            builder.add({"source": "a.md", "heading": f"S{i % 4}"}, vec)
+        held, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert held < vecs.nbytes / 10
+    assert builder.build().nbytes < vecs.nbytes / 10
+
+
+def test_fine_stage_scores_only_the_chosen_sections():
+    """ Ensures the fine stage matches a brute-force search of the chosen sections and fetches only them. """
+    rng = np.random.default_rng(0)
+    vecs = rng.standard_normal((200, 8)).astype("float32")
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    builder = SectionBuilder()
+    for i, vec in enumerate(vecs):
+        builder.add({"source": "a.md", "heading": f"S{i % 10}"}, vec)
+    sections = builder.build()
+    queries = vecs[[3, 17, 42]]
+    fetched = []
+
+    def vectors_of(positions):
+        fetched.extend(positions.tolist())
+        return vecs[positions]
+
+    chosen = sections.top(queries, 2)
+    D, P, n = sections.search(queries, chosen, 5, vectors_of)
+    assert n == len(fetched) == len(set(fetched)) == len(np.unique(chosen)) * 20 < len(vecs)
+    for q, row, scores, positions in zip(queries, chosen, D, P):
+        allowed = sections.positions(row)
+        expected = allowed[np.argsort(-(vecs[allowed] @ q), kind="stable")[:5]]
+        assert positions.tolist() == expected.tolist()
+        np.testing.assert_allclose(scores, vecs[positions] @ q, rtol=1e-5)
+
+
+def test_two_stage_search_reconstructs_only_chosen_chunks(tmp_path, monkeypatch):
+    """ Ensures two-stage queries read only the chosen sections' vectors and never run a full index search. """
+    monkeypatch.setattr(fc, "embed_cached", _fake_embed)
+    monkeypatch.setattr(fc, "validate_index", lambda *a, **k: None)
+    monkeypatch.setattr(rag_module, "embed_texts", lambda texts: _fake_embed(texts)[0])
+    monkeypatch.setattr(rag_module.settings, "rag_top_sections", 2)
+    story = tmp_path / "a.md"
+    story.write_text("".join(f"# Rozdział {i}\nslowa {i}\n" for i in range(6)), encoding="utf-8")
+    index_path = tmp_path / "index.faiss"
+    fc.build_generation(str(story), str(index_path), chunk_words=20, overlap_words=0, index_spec="Flat")
+
+    class CountingIndex:
+        def __init__(self, index):
+            self.index, self.ntotal, self.reconstructed = index, index.ntotal, 0
+
+        def reconstruct_batch(self, labels):
+            self.reconstructed += len(labels)
+            return self.index.reconstruct_batch(labels)
+
+        def search(self, *args, **kwargs):
+            raise AssertionError("fine stage searched the whole index")
+
+    store = FaissRAG(index_path=index_path, mmap=False)
+    store.ensure_loaded()
+    counting = CountingIndex(store.state.index)
+    store._state = dataclasses.replace(store._state, index=counting)
+    hits = store.search_many(["# Rozdział 1 slowa 1", "# Rozdział 4 slowa 4"], k=1, mode="vector")
+    assert [h[0][1] for h in hits] == ["# Rozdział 1 slowa 1", "# Rozdział 4 slowa 4"]
+    assert 0 < counting.reconstructed <= 4 < counting.ntotal
@@ -1,19 +1,71 @@
 """Routes for the general pipeline (QA endpoint)."""
+import asyncio
+import json
+from typing import Any, AsyncIterator
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from App.Services.general_pipeline import GeneralPipeline
 from App.Core.rag import FaissRAG
+from App.Core.rag_registry import get_story_store
 from App.Config.config import settings
-from App.Models.queries import QARequest
+from App.Models.queries import QARequest, QABatchRequest
 from App.Services.utility import logging_function
 
 router = APIRouter()
 _pipeline = GeneralPipeline()
 
 
+def _check_story(story: str | None) -> None:
+    """Reject invalid or unknown story namespaces before any LLM work is done."""
+    if not story:
+        return
+    try:
+        get_story_store(story)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+
+async def _sse(events: AsyncIterator[tuple[str, Any]]) -> AsyncIterator[str]:
+    """Format ``(event, data)`` pairs as Server-Sent Events; failures become an ``error`` event."""
+    try:
+        async for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    except Exception as e:
+        logging_function(f"QA stream failed: {e}", level="error")
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        yield f"event: error\ndata: {json.dumps({'detail': detail}, ensure_ascii=False)}\n\n"
+
 
 @router.post("/qa")
-def story_qa(req: QARequest):
-    """Answer a question using the general pipeline (RAG + LLM)."""
+async def story_qa(req: QARequest):
+    """Answer a question using the general pipeline (RAG + LLM).
+
+    Async so a request waiting on the LLM holds no threadpool thread; only
+    index loading and retrieval are offloaded to threads. With ``stream``
+    the answer is sent as Server-Sent Events (``token`` events, then
+    ``sources``; NPC results as one ``result`` event; ``error`` on failure).
+    """
     logging_function("Received QA request", level="info")
-    return _pipeline.process(req.question)
+    await asyncio.to_thread(_check_story, req.story)
+    if req.stream:
+        return StreamingResponse(
+            _sse(_pipeline.astream(req.question, story=req.story)),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    return await _pipeline.aprocess(req.question, story=req.story)
+
+
+@router.post("/qa_batch")
+def story_qa_batch(req: QABatchRequest):
+    """Answer several questions at once, sharing one retrieval pass."""
+    logging_function(f"Received QA batch request ({len(req.questions)} questions)", level="info")
+    questions = [_pipeline.sanitize_query(q) for q in req.questions]
+    if not questions or not all(q.strip() for q in questions):
+        raise HTTPException(status_code=400, detail="Every question must be a non-empty string.")
+    _check_story(req.story)
+    return {"answers": _pipeline.qa_pipeline.answer_many(questions, story=req.story)}
@@ -0,0 +1,127 @@
+"""Semantic cache of QA answers.
+
+Players ask the same lore question in many phrasings. Each answered question
+is embedded with the query model (``embed_texts``, so its vector is shared
+with retrieval through the query LRU) and added to a small in-memory FAISS
+inner-product index next to the answer. A later question whose normalized
+embedding scores at least ``QA_SEMANTIC_CACHE_THRESHOLD`` against a stored
+one gets the stored answer and sources without retrieval or an LLM call.
+
+There is one cache per ``FaissRAG`` store. Answers are only valid for the
+index generation they were retrieved from: a lookup on a store that serves
+another generation empties the cache first. The least recently hit entries
+are dropped beyond ``QA_SEMANTIC_CACHE_MAX_ENTRIES`` (``0`` disables the
+cache).
+"""
+from __future__ import annotations
+
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import faiss
+import numpy as np
+
+from App.Config.config import settings
+from App.Core.embeddings_local import embed_texts
+
+
+def question_vectors(questions: List[str]) -> np.ndarray:
+    """Normalized query embeddings of ``questions`` as ``(n, dim)`` float32 rows, in one call."""
+    return np.asarray(embed_texts(list(questions)), dtype="float32").reshape(len(questions), -1)
+
+
+def question_vector(question: str) -> np.ndarray:
+    """Normalized query embedding of ``question`` as a ``(1, dim)`` float32 row."""
+    return question_vectors([question])
+
+
+class SemanticAnswerCache:
+    """Past question vectors in an ``IndexIDMap2`` flat index, mapped to their answers."""
+
+    def __init__(self, max_entries: int, threshold: float):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._generation: str | None = None
+        self._index: faiss.Index | None = None
+        self._answers: "OrderedDict[int, dict]" = OrderedDict()
+        self._next_id = 0
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0, "invalidated": 0}
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    def _reset(self, generation: str | None) -> None:
+        if self._answers:
+            self._stats["invalidated"] += len(self._answers)
+        self._generation = generation
+        self._index = None
+        self._answers.clear()
+
+    def lookup(self, vector: np.ndarray, generation: str | None) -> Tuple[dict, float] | None:
+        """Return ``(answer, similarity)`` of the closest past question above the threshold."""
+        with self._lock:
+            if generation != self._generation:
+                self._reset(generation)
+            if not self._answers:
+                self._stats["misses"] += 1
+                return None
+            D, I = self._index.search(vector, 1)
+            entry_id, score = int(I[0, 0]), float(D[0, 0])
+            if entry_id < 0 or score < self.threshold:
+                self._stats["misses"] += 1
+                return None
+            self._answers.move_to_end(entry_id)
+            self._stats["hits"] += 1
+            return dict(self._answers[entry_id]), score
+
+    def store(self, vector: np.ndarray, generation: str | None, answer: dict) -> None:
+        """Remember ``answer``, unless the store has moved on from ``generation`` meanwhile."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            while len(self._answers) >= self.max_entries:
+                old_id, _ = self._answers.popitem(last=False)
+                self._index.remove_ids(np.array([old_id], dtype="int64"))
+                self._stats["evicted"] += 1
+            self._index.add_with_ids(vector, np.array([self._next_id], dtype="int64"))
+            self._answers[self._next_id] = dict(answer)
+            self._next_id += 1
+            self._stats["stored"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(entries=len(self._answers), generation=self._generation)
+        looked_up = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / looked_up, 4) if looked_up else None
+        return stats
+
+
+_caches: "weakref.WeakKeyDictionary[object, SemanticAnswerCache]" = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def answer_cache_for(store) -> SemanticAnswerCache | None:
+    """Return the answer cache of ``store``, or None when the cache is disabled."""
+    if settings.qa_semantic_cache_max_entries <= 0:
+        return None
+    with _caches_lock:
+        cache = _caches.get(store)
+        if cache is None:
+            cache = SemanticAnswerCache(
+                settings.qa_semantic_cache_max_entries, settings.qa_semantic_cache_threshold
+            )
+            _caches[store] = cache
+    return cache
+
+
+def answer_cache_stats() -> Dict[str, dict]:
+    """Return the stats of every live answer cache, keyed by index path."""
+    with _caches_lock:
+        items = list(_caches.items())
+    return {str(store.index_path): cache.stats() for store, cache in items}
@@ -0,0 +1,147 @@
+"""Compact BM25 inverted index over chunk texts.
+
+Built at ingest time next to the FAISS index (``index.faiss.bm25.npz``) and
+used by ``FaissRAG`` for lexical and hybrid retrieval. Postings are stored in
+CSR form: for term ``t`` the documents are ``doc_ids[offsets[t]:offsets[t + 1]]``
+with matching term frequencies in ``tfs``. Document numbers are the chunk
+positions in the FAISS index, so both rankings can be fused directly.
+"""
+from __future__ import annotations
+
+import re
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens; keeps digits and non-ASCII letters (names, places)."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def bm25_path(index_path: str | Path) -> Path:
+    """Return where the BM25 index of ``index_path`` is stored."""
+    index_path = Path(index_path)
+    return index_path.with_suffix(index_path.suffix + ".bm25.npz")
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed corpus, stored as CSR postings."""
+
+    def __init__(
+        self,
+        terms: List[str],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.vocab: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        n_docs = len(doc_len)
+        df = np.diff(offsets).astype("float32")
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype("float32")
+        self.avgdl = float(doc_len.mean()) if n_docs else 0.0
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "BM25Index":
+        """Tokenize ``texts`` (in chunk order) and build the postings.
+
+        Postings are accumulated in flat typed arrays (10 bytes each) rather
+        than per-term Python lists, so large corpora can be indexed from a
+        stream of texts.
+        """
+        vocab: Dict[str, int] = {}
+        term_ids = array("i")
+        docs = array("i")
+        freqs = array("H")
+        doc_len = array("i")
+        tf_max = np.iinfo("uint16").max
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                docs.append(doc)
+                freqs.append(min(tf, tf_max))
+        terms = sorted(vocab)
+        rank = np.empty(len(terms), dtype="int32")
+        rank[[vocab[t] for t in terms]] = np.arange(len(terms), dtype="int32")
+        sorted_terms = rank[np.frombuffer(term_ids, dtype="int32")] if len(term_ids) else np.empty(0, "int32")
+        order = np.argsort(sorted_terms, kind="stable")
+        offsets = np.zeros(len(terms) + 1, dtype="int64")
+        np.cumsum(np.bincount(sorted_terms, minlength=len(terms)), out=offsets[1:])
+        doc_ids = np.frombuffer(docs, dtype="int32")[order] if len(docs) else np.empty(0, "int32")
+        tfs = np.frombuffer(freqs, dtype="uint16")[order] if len(freqs) else np.empty(0, "uint16")
+        return cls(terms, offsets, doc_ids, tfs, np.array(doc_len, dtype="int32"))
+
+    def save(self, path: str | Path) -> None:
+        """Write the index as an uncompressed ``.npz``."""
+        with Path(path).open("wb") as f:
+            np.savez(
+                f,
+                terms=np.frombuffer("\n".join(self.terms).encode("utf-8"), dtype="uint8"),
+                offsets=self.offsets,
+                doc_ids=self.doc_ids,
+                tfs=self.tfs,
+                doc_len=self.doc_len,
+            )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "BM25Index":
+        """Read an index written by ``save``."""
+        with np.load(str(path)) as z:
+            raw = z["terms"].tobytes().decode("utf-8")
+            return cls(
+                raw.split("\n") if raw else [],
+                z["offsets"], z["doc_ids"], z["tfs"], z["doc_len"],
+            )
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the postings and per-document arrays."""
+        return sum(a.nbytes for a in (self.offsets, self.doc_ids, self.tfs, self.doc_len, self.idf))
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to ``k`` ``(doc, score)`` pairs with a positive BM25 score."""
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids or not len(self):
+            return []
+        scores = np.zeros(len(self), dtype="float32")
+        for t in term_ids:
+            lo, hi = self.offsets[t], self.offsets[t + 1]
+            docs = self.doc_ids[lo:hi]
+            tf = self.tfs[lo:hi].astype("float32")
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+            scores[docs] += self.idf[t] * tf * (self.k1 + 1) / (tf + norm)
+        k = min(k, int((scores > 0).sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(d), float(scores[d])) for d in top]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], k: int, rrf_k: int = 60) -> List[int]:
+    """Fuse ranked lists of document numbers with RRF and return the top ``k``."""
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            scores[doc] += 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
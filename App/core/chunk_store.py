@@ -0,0 +1,317 @@
+"""Chunk metadata storage backing the FAISS index.
+
+Chunk metadata lives in one versioned binary file next to the index,
+``index.faiss.meta.bin``, read through ``PackedChunks``. The file is
+memory-mapped (or read into one ``bytes`` object) and sliced in place: loading
+parses a fixed header only, and a lookup decodes just the fields it asks for.
+Indexes written before this format only have ``index.faiss.meta.jsonl``; those
+are parsed into ``MemoryChunks`` and can be converted with::
+
+    python -m App.Core.chunk_store convert App/Data/index.faiss
+
+Layout of ``.meta.bin`` (little endian):
+
+- header (32 bytes): magic ``PDCMETA`` + NUL, ``u32`` version, ``u32`` field mask
+  over ``META_FIELDS``, ``u64`` chunk count, ``u64`` position of the offsets;
+- blob: for each chunk, the UTF-8 bytes of its present fields in
+  ``META_FIELDS`` order;
+- offsets (8-byte aligned): ``int64`` array of shape ``(count + 1, n_fields)``;
+  row ``i`` holds the start of each field of chunk ``i``, the last row is a
+  sentinel with the blob end. A field ends where the next one starts.
+
+Indexes built with content-hash ids are wrapped in ``IndexIDMap2``; the FAISS
+id of chunk ``i`` is in ``index.faiss.labels.npy`` and ids removed from the
+meta but still present in the index (index types that cannot delete, e.g.
+HNSW) are listed in ``index.faiss.tombstones.npy``.
+
+A chunk that several files contain is stored once, under the ``source`` of
+the first file. The other files are listed in ``index.faiss.sources.json``
+(``{chunk id: [source, ...]}``), so removing one of them keeps the chunk
+until its last source goes.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+META_MAGIC = b"PDCMETA\0"
+META_VERSION = 1
+META_FIELDS = ("id", "text", "source", "heading", "hash")
+_HEADER = struct.Struct("<8sIIQQ")
+
+
+def meta_path(index_path: str | Path) -> Path:
+    """Return the binary ``.meta.bin`` path that belongs to ``index_path``."""
+    index_path = Path(index_path)
+    return index_path.with_suffix(index_path.suffix + ".meta.bin")
+
+
+def jsonl_meta_path(index_path: str | Path) -> Path:
+    """Return the legacy ``.meta.jsonl`` path that belongs to ``index_path``."""
+    index_path = Path(index_path)
+    return index_path.with_suffix(index_path.suffix + ".meta.jsonl")
+
+
+LABEL_MASK = (1 << 63) - 1
+
+
+def chunk_label(chunk_id: str) -> int:
+    """FAISS id (non-negative int64) of a content-hash chunk id ``chunk_<16 hex>``."""
+    return int(chunk_id.rsplit("_", 1)[-1], 16) & LABEL_MASK
+
+
+def labels_path(index_path: str | Path) -> Path:
+    """Return where the FAISS ids of the chunks (in chunk order) are stored."""
+    index_path = Path(index_path)
+    return index_path.with_suffix(index_path.suffix + ".labels.npy")
+
+
+def tombstones_path(index_path: str | Path) -> Path:
+    """Return where ids deleted from the meta but still in the index are stored."""
+    index_path = Path(index_path)
+    return index_path.with_suffix(index_path.suffix + ".tombstones.npy")
+
+
+def read_id_map(index_path: str | Path) -> Tuple[np.ndarray | None, np.ndarray]:
+    """Return ``(labels, tombstones)`` of an id-mapped index; labels is None for positional ones."""
+    lp, tp = labels_path(index_path), tombstones_path(index_path)
+    labels = np.load(lp) if lp.exists() else None
+    tombstones = np.load(tp) if tp.exists() else np.empty(0, dtype="int64")
+    return labels, tombstones
+
+
+def write_id_map(index_path: str | Path, labels: np.ndarray, tombstones: np.ndarray | None = None) -> None:
+    """Store chunk ids (and tombstones, if any) next to ``index_path``."""
+    np.save(labels_path(index_path), np.asarray(labels, dtype="int64"))
+    tp = tombstones_path(index_path)
+    if tombstones is not None and len(tombstones):
+        np.save(tp, np.asarray(tombstones, dtype="int64"))
+    elif tp.exists():
+        tp.unlink()
+
+
+def shared_sources_path(index_path: str | Path) -> Path:
+    """Return where the further sources of chunks shared by several files are stored."""
+    index_path = Path(index_path)
+    return index_path.with_suffix(index_path.suffix + ".sources.json")
+
+
+def read_shared_sources(index_path: str | Path) -> Dict[str, List[str]]:
+    """Return ``{chunk id: [source, ...]}`` of sources beyond the one in the meta."""
+    path = shared_sources_path(index_path)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def write_shared_sources(index_path: str | Path, shared: Dict[str, List[str]]) -> None:
+    """Store the further sources of shared chunks next to ``index_path`` (nothing if empty)."""
+    path = shared_sources_path(index_path)
+    shared = {cid: sources for cid, sources in shared.items() if sources}
+    if shared:
+        path.write_text(json.dumps(shared, ensure_ascii=False), encoding="utf-8")
+    elif path.exists():
+        path.unlink()
+
+
+class MemoryChunks:
+    """Chunk ids and texts held fully in memory."""
+
+    def __init__(self, ids: List[str], texts: List[str]):
+        self.ids = ids
+        self.texts = texts
+
+    @classmethod
+    def from_jsonl(cls, meta_path: str | Path) -> "MemoryChunks":
+        """Parse a ``.meta.jsonl`` file with one ``{"id", "text"}`` object per line."""
+        ids, texts = [], []
+        with Path(meta_path).open("r", encoding="utf-8") as f:
+            for line in f:
+                o = json.loads(line)
+                ids.append(o["id"])
+                texts.append(o["text"])
+        return cls(ids, texts)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, idx: int) -> Tuple[str, str]:
+        """Return ``(id, text)`` of chunk ``idx``."""
+        return self.ids[idx], self.texts[idx]
+
+
+class PackedChunks:
+    """Read-only view over a ``.meta.bin`` file; nothing is parsed up front.
+
+    With ``use_mmap`` the file is memory-mapped, so only the pages holding the
+    requested hits are touched and the OS shares them between worker
+    processes; otherwise it is read into a single ``bytes`` object.
+
+    Raises ValueError if the file is not chunk metadata or has an unknown version.
+    """
+
+    def __init__(self, path: str | Path, use_mmap: bool = True):
+        self.path = Path(path)
+        self.nbytes = self.path.stat().st_size
+        with self.path.open("rb") as f:
+            if use_mmap and self.nbytes:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._blob = f.read()
+        if self.nbytes < _HEADER.size:
+            raise ValueError(f"{path} is too short to be chunk metadata.")
+        magic, version, mask, count, offsets_pos = _HEADER.unpack_from(self._blob, 0)
+        if magic != META_MAGIC:
+            raise ValueError(f"{path} is not a chunk metadata file.")
+        if version != META_VERSION:
+            raise ValueError(f"{path} has metadata version {version}, expected {META_VERSION}; rebuild or convert it.")
+        self.fields = tuple(f for i, f in enumerate(META_FIELDS) if mask & (1 << i))
+        self._column = {f: i for i, f in enumerate(self.fields)}
+        self._offsets = np.frombuffer(
+            self._blob, dtype="<i8", count=(count + 1) * len(self.fields), offset=offsets_pos,
+        ).reshape(count + 1, len(self.fields))
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _slice(self, idx: int, col: int) -> str:
+        row = self._offsets[idx]
+        start = int(row[col])
+        end = int(row[col + 1]) if col + 1 < len(row) else int(self._offsets[idx + 1, 0])
+        return self._blob[start:end].decode("utf-8")
+
+    def get(self, idx: int) -> Tuple[str, str]:
+        """Return ``(id, text)`` of chunk ``idx``, decoding only its bytes."""
+        return self._slice(idx, 0), self._slice(idx, 1)
+
+    def field(self, idx: int, name: str) -> str:
+        """Return one field of chunk ``idx`` (``""`` if the file does not store it)."""
+        col = self._column.get(name)
+        return "" if col is None else self._slice(idx, col)
+
+    def record(self, idx: int) -> Dict[str, str]:
+        """Return every stored field of chunk ``idx`` as a dict."""
+        return {f: self._slice(idx, c) for f, c in self._column.items()}
+
+    def records(self) -> Iterator[Dict[str, str]]:
+        """Iterate over all chunks as dicts, in index order."""
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def close(self) -> None:
+        """Release the mapping (views handed out by this object become invalid)."""
+        self._offsets = None
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+
+
+class PackedWriter:
+    """Append chunk records to a ``.meta.bin`` file one at a time.
+
+    Only the offsets (one int64 per field and record) are kept in memory;
+    field bytes go straight to disk, so arbitrarily large corpora can be
+    written. Records missing one of ``fields`` store it as ``""``.
+    """
+
+    def __init__(self, path: str | Path, fields: Sequence[str] = META_FIELDS):
+        unknown = set(fields) - set(META_FIELDS)
+        if unknown or tuple(fields[:2]) != ("id", "text"):
+            raise ValueError(f"Fields must start with id, text and be among {META_FIELDS}.")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fields = tuple(f for f in META_FIELDS if f in fields)
+        self._f = self.path.open("wb")
+        self._f.write(b"\0" * _HEADER.size)
+        self._pos = _HEADER.size
+        self._offsets = array("q")
+
+    def add(self, record: dict) -> None:
+        for f in self.fields:
+            data = (record.get(f) or "").encode("utf-8")
+            self._offsets.append(self._pos)
+            self._f.write(data)
+            self._pos += len(data)
+
+    def close(self) -> int:
+        """Write the offsets table and header, and return the record count."""
+        count = len(self._offsets) // len(self.fields)
+        pad = -self._pos % 8
+        self._f.write(b"\0" * pad)
+        offsets_pos = self._pos + pad
+        self._offsets.extend([self._pos] * len(self.fields))
+        if sys.byteorder != "little":
+            self._offsets.byteswap()
+        self._f.write(self._offsets.tobytes())
+        mask = sum(1 << i for i, f in enumerate(META_FIELDS) if f in self.fields)
+        self._f.seek(0)
+        self._f.write(_HEADER.pack(META_MAGIC, META_VERSION, mask, count, offsets_pos))
+        self._f.close()
+        return count
+
+
+def write_packed(records: Iterable[dict], path: str | Path, fields: Sequence[str] = META_FIELDS) -> int:
+    """Write chunk records to the ``.meta.bin`` file at ``path``."""
+    writer = PackedWriter(path, fields)
+    for r in records:
+        writer.add(r)
+    return writer.close()
+
+
+def pack_meta(jsonl_path: str | Path, path: str | Path) -> int:
+    """Convert an existing ``.meta.jsonl`` file into a ``.meta.bin`` file.
+
+    Optional fields are stored only if the first record has them.
+    """
+    with Path(jsonl_path).open("r", encoding="utf-8") as f:
+        first = f.readline()
+    fields = [k for k in META_FIELDS if k in (json.loads(first) if first.strip() else {})]
+
+    def _records():
+        with Path(jsonl_path).open("r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    return write_packed(_records(), path, fields or ("id", "text"))
+
+
+def iter_meta_records(index_path: str | Path) -> Iterator[Dict[str, str]]:
+    """Iterate over the chunk records of ``index_path`` (binary meta, else legacy jsonl)."""
+    path = meta_path(index_path)
+    if path.exists():
+        chunks = PackedChunks(path)
+        try:
+            yield from chunks.records()
+        finally:
+            chunks.close()
+        return
+    with jsonl_meta_path(index_path).open("r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def main(argv: List[str] | None = None) -> None:
+    """CLI: ``convert <index_path>...`` writes ``.meta.bin`` from ``.meta.jsonl``."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m App.Core.chunk_store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="convert .meta.jsonl sidecars to .meta.bin")
+    convert.add_argument("index_paths", nargs="+")
+    convert.add_argument("--remove-jsonl", action="store_true", help="delete the jsonl file afterwards")
+    args = parser.parse_args(argv)
+    for index_path in args.index_paths:
+        src, dst = jsonl_meta_path(index_path), meta_path(index_path)
+        n = pack_meta(src, dst)
+        print(f"{src} -> {dst}: {n} chunks")
+        if args.remove_jsonl:
+            src.unlink()
+
+
+if __name__ == "__main__":
+    main()
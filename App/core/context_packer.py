@@ -0,0 +1,215 @@
+"""Token-budgeted assembly of the RAG context sent to the LLM.
+
+Retrieved chunks overlap by ``overlap_words`` words (see ``_word_chunks``), so
+neighbouring hits repeat text, and the conversation memory in
+``context_cache`` grows without bound. ``pack_context`` turns ranked hits and
+the memory into one prompt block:
+
+- hits whose vector score is below ``settings.context_min_score`` are dropped
+  (the best hit is always kept);
+- hits that overlap (the end of one is the start of another) are merged into
+  one passage, and hits fully contained in another are dropped;
+- passages (best first), then memory entries (newest first) are added while
+  they fit ``settings.context_token_budget``.
+
+Tokens are estimated at four characters each, which is close to what the
+Groq-hosted models' tokenizers produce for English and Polish prose.
+``PackedContext`` reports how many tokens the plain concatenation would have
+cost, and ``packer_stats`` keeps process-wide totals.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+from App.Config.config import settings
+
+CHARS_PER_TOKEN = 4
+SEPARATOR = "\n---\n"
+
+_stats = {"requests": 0, "tokens_raw": 0, "tokens_sent": 0}
+_stats_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of LLM tokens in ``text``."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+@dataclass
+class Passage:
+    """One or more merged chunks, ranked by their best member."""
+    ids: List[str]
+    words: List[str]
+    section: str = ""
+
+    def render(self) -> str:
+        label = ", ".join(self.ids) + (f" [{self.section}]" if self.section else "")
+        return f"{label}: {' '.join(self.words)}"
+
+
+@dataclass
+class PackedContext:
+    """Prompt context and the bookkeeping of how it was packed."""
+    text: str
+    sources: List[str] = field(default_factory=list)
+    sections: List[str] = field(default_factory=list)
+    tokens: int = 0
+    tokens_raw: int = 0
+    dropped: int = 0
+    merged: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_raw - self.tokens)
+
+    def report(self) -> dict:
+        """Return the token accounting as a JSON-ready dict."""
+        return {
+            "context_tokens": self.tokens,
+            "context_tokens_raw": self.tokens_raw,
+            "context_tokens_saved": self.tokens_saved,
+        }
+
+
+def _overlap(a: List[str], b: List[str], min_words: int) -> int:
+    """Length of the longest suffix of ``a`` that is a prefix of ``b`` (0 if below ``min_words``)."""
+    for n in range(min(len(a), len(b)), min_words - 1, -1):
+        if a[-n:] == b[:n]:
+            return n
+    return 0
+
+
+def _contains(a: List[str], b: List[str]) -> bool:
+    """True if ``b`` occurs as a contiguous word run inside ``a``."""
+    n = len(b)
+    return n <= len(a) and any(a[i:i + n] == b for i in range(len(a) - n + 1))
+
+
+def merge_passages(hits: Sequence[Tuple[str, str]], sections: Sequence[str] | None = None,
+                   min_overlap_words: int | None = None) -> Tuple[List[Passage], int]:
+    """Merge overlapping ``(id, text)`` hits into passages, keeping rank order.
+
+    Returns the passages and the number of hits folded into another one.
+    """
+    min_words = settings.context_min_overlap_words if min_overlap_words is None else min_overlap_words
+    sections = sections or [""] * len(hits)
+    passages: List[Passage] = []
+    merged = 0
+    for (cid, text), section in zip(hits, sections):
+        words = text.split()
+        target = None
+        for p in passages:
+            if _contains(p.words, words):
+                p.ids.append(cid)
+                target = p
+                break
+            n = _overlap(p.words, words, min_words)
+            if n:
+                p.words.extend(words[n:])
+                p.ids.append(cid)
+                target = p
+                break
+            n = _overlap(words, p.words, min_words)
+            if n:
+                p.words[:0] = words[:-n]
+                p.ids.append(cid)
+                target = p
+                break
+        if target is None:
+            passages.append(Passage([cid], words, section))
+            continue
+        merged += 1
+        # The grown passage may now bridge to a later one.
+        for other in [p for p in passages if p is not target]:
+            n = _overlap(target.words, other.words, min_words)
+            if n:
+                target.words.extend(other.words[n:])
+            elif _overlap(other.words, target.words, min_words):
+                target.words[:0] = other.words[:-_overlap(other.words, target.words, min_words)]
+            else:
+                continue
+            target.ids.extend(other.ids)
+            passages.remove(other)
+    return passages, merged
+
+
+def pack_context(
+    hits: Sequence[Tuple],
+    memory: Dict[str, str] | None = None,
+    sections: Sequence[str] | None = None,
+    budget: int | None = None,
+    min_score: float | None = None,
+) -> PackedContext:
+    """Build the prompt context from ranked ``hits`` and conversation ``memory``.
+
+    ``hits`` are ``(id, text)`` or ``(id, text, score)`` tuples as returned by
+    ``FaissRAG.search``; ``sections`` holds the section title of each hit.
+    ``budget`` (default: ``settings.context_token_budget``, ``0`` = unlimited)
+    caps the estimated tokens of the result.
+    """
+    budget = settings.context_token_budget if budget is None else budget
+    min_score = settings.context_min_score if min_score is None else min_score
+    memory = memory or {}
+    sections = list(sections) if sections else [""] * len(hits)
+    memory_lines = [f"{q}: {a}" for q, a in memory.items()]
+
+    raw_parts = [f"{h[0]}: {h[1]}" for h in hits]
+    if memory_lines:
+        raw_parts.append("\n".join(memory_lines))
+    tokens_raw = estimate_tokens(SEPARATOR.join(raw_parts))
+
+    kept = [
+        i for i, h in enumerate(hits)
+        if i == 0 or len(h) < 3 or h[2] is None or h[2] >= min_score
+    ]
+    passages, merged = merge_passages([hits[i][:2] for i in kept], [sections[i] for i in kept])
+
+    parts: List[str] = []
+    recent: List[str] = []
+    used = 0
+    sources: List[str] = []
+
+    def cost(text: str) -> int:
+        return estimate_tokens(text) + (estimate_tokens(SEPARATOR) if parts or recent else 0)
+
+    for p in passages:
+        text = p.render()
+        if budget and used + cost(text) > budget:
+            if parts:
+                continue
+            # Even the best passage is too long: keep as many words as fit.
+            text = text[: budget * CHARS_PER_TOKEN].rsplit(" ", 1)[0]
+        used += cost(text)
+        parts.append(text)
+        sources.extend(p.ids)
+    for line in reversed(memory_lines):
+        if budget and used + cost(line) > budget:
+            break
+        used += cost(line)
+        recent.append(line)
+    parts.extend(reversed(recent))
+
+    packed = PackedContext(
+        text=SEPARATOR.join(parts),
+        sources=sources,
+        sections=list(dict.fromkeys(p.section for p in passages if p.section and p.ids[0] in sources)),
+        tokens_raw=tokens_raw,
+        dropped=len(hits) - len(kept),
+        merged=merged,
+    )
+    packed.tokens = estimate_tokens(packed.text)
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["tokens_raw"] += packed.tokens_raw
+        _stats["tokens_sent"] += packed.tokens
+    return packed
+
+
+def packer_stats() -> dict:
+    """Return process-wide totals of estimated context tokens before and after packing."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["tokens_saved"] = max(0, stats["tokens_raw"] - stats["tokens_sent"])
+    return stats
@@ -0,0 +1,211 @@
+"""Pluggable CPU backends for sentence embeddings.
+
+``settings.embedding_backend`` selects one of:
+
+- ``torch`` – the SentenceTransformer model (PyTorch forward pass).
+- ``onnx`` – the same transformer exported to ONNX, run by ONNX Runtime.
+- ``onnx-int8`` – the ONNX model with dynamically quantized int8 weights.
+
+The ONNX backends import neither torch nor sentence-transformers; they need
+``onnxruntime`` and ``tokenizers`` plus an exported model directory
+(``model.onnx`` and ``tokenizer.json``), created once with:
+
+    python -m App.Core.embedding_backends export
+
+Before switching backends, compare them with:
+
+    python -m App.Core.embedding_backends parity --backend onnx-int8
+"""
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from App.Config.config import settings
+from App.Config.paths import get_data_dir
+from App.Services.utility import logging_function
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_MODEL = "model.onnx"
+ONNX_INT8_MODEL = "model_int8.onnx"
+
+
+def onnx_dir(model_id: str) -> Path:
+    """Return where the ONNX export of ``model_id`` lives."""
+    if settings.embedding_onnx_dir:
+        return Path(settings.embedding_onnx_dir)
+    return get_data_dir() / "onnx" / model_id.replace("/", "__")
+
+
+def _normalize(vecs: np.ndarray) -> np.ndarray:
+    """L2-normalize rows of ``vecs`` in place and return them as float32."""
+    vecs = np.asarray(vecs, dtype="float32")
+    vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+    return vecs
+
+
+class TorchBackend:
+    """SentenceTransformer forward pass on PyTorch."""
+
+    name = "torch"
+
+    def __init__(self, model_id: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_id)
+        if settings.embedding_threads > 0:
+            import torch
+            torch.set_num_threads(settings.embedding_threads)
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Return L2-normalized float32 vectors for ``texts``."""
+        vecs = self.model.encode(texts, normalize_embeddings=True, batch_size=batch_size)
+        return np.asarray(vecs, dtype="float32")
+
+
+class OnnxBackend:
+    """Transformer exported to ONNX, with mean pooling done in NumPy."""
+
+    def __init__(self, model_id: str, quantized: bool = False):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError(
+                f"Embedding backend {'onnx-int8' if quantized else 'onnx'!r} needs "
+                "`pip install onnxruntime tokenizers`."
+            ) from e
+
+        self.name = "onnx-int8" if quantized else "onnx"
+        model_dir = onnx_dir(model_id)
+        fp32_path = model_dir / ONNX_MODEL
+        if not fp32_path.exists():
+            raise FileNotFoundError(
+                f"{fp32_path} not found; run `python -m App.Core.embedding_backends export`."
+            )
+        path = fp32_path
+        if quantized:
+            path = model_dir / ONNX_INT8_MODEL
+            if not path.exists():
+                quantize_onnx(fp32_path, path)
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        pad_token = next(
+            (t for t in ("<pad>", "[PAD]") if self.tokenizer.token_to_id(t) is not None), None
+        )
+        if pad_token is not None:
+            self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token), pad_token=pad_token)
+        self.tokenizer.enable_truncation(max_length=settings.embedding_max_seq_length)
+
+        opts = ort.SessionOptions()
+        if settings.embedding_threads > 0:
+            opts.intra_op_num_threads = settings.embedding_threads
+        self.session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Return L2-normalized float32 vectors for ``texts``."""
+        out = []
+        for start in range(0, len(texts), batch_size):
+            enc = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            ids = np.array([e.ids for e in enc], dtype="int64")
+            mask = np.array([e.attention_mask for e in enc], dtype="int64")
+            feeds = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(ids)
+            hidden = self.session.run(None, feeds)[0]
+            m = mask[..., None].astype("float32")
+            out.append((hidden * m).sum(axis=1) / np.maximum(m.sum(axis=1), 1e-9))
+        if not out:
+            return np.zeros((0, 0), dtype="float32")
+        return _normalize(np.concatenate(out))
+
+
+def get_backend(name: str, model_id: str):
+    """Instantiate the backend called ``name`` for ``model_id``."""
+    if name == "torch":
+        return TorchBackend(model_id)
+    if name in ("onnx", "onnx-int8"):
+        return OnnxBackend(model_id, quantized=name == "onnx-int8")
+    raise ValueError(f"Unknown embedding backend {name!r}; choose one of {BACKENDS}.")
+
+
+def quantize_onnx(src: Path, dst: Path) -> None:
+    """Write a copy of ``src`` with dynamically quantized int8 weights."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    logging_function(f"Quantizing {src} to int8 → {dst}", level="info")
+    quantize_dynamic(str(src), str(dst), weight_type=QuantType.QInt8)
+
+
+def export_onnx(model_id: str, out_dir: Path | None = None) -> Path:
+    """Export the transformer of ``model_id`` and its tokenizer to ONNX (needs torch)."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = Path(out_dir or onnx_dir(model_id))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    st = SentenceTransformer(model_id, device="cpu")
+    transformer = st[0].auto_model.eval()
+    st.tokenizer.save_pretrained(str(out_dir))
+    sample = st.tokenizer(["export sample"], return_tensors="pt")
+    axes = {0: "batch", 1: "seq"}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (sample["input_ids"], sample["attention_mask"]),
+            str(out_dir / ONNX_MODEL),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={"input_ids": axes, "attention_mask": axes, "last_hidden_state": axes},
+            opset_version=17,
+            dynamo=False,
+        )
+    logging_function(f"Exported {model_id} to {out_dir / ONNX_MODEL}", level="info")
+    return out_dir / ONNX_MODEL
+
+
+def check_parity(texts: Sequence[str], backend: str, reference: str = "torch") -> Dict[str, float]:
+    """Compare ``backend`` with ``reference`` on ``texts``.
+
+    Reports how far each vector moved (cosine to its reference twin) and how
+    much the pairwise cosine similarities, which drive retrieval, differ.
+    """
+    model_id = settings.embedding_model
+    ref = get_backend(reference, model_id).encode(list(texts))
+    cand = get_backend(backend, model_id).encode(list(texts))
+    self_cos = (ref * cand).sum(axis=1)
+    sim_diff = np.abs(ref @ ref.T - cand @ cand.T)
+    return {
+        "texts": len(texts),
+        "min_self_cosine": float(self_cos.min()),
+        "mean_self_cosine": float(self_cos.mean()),
+        "max_pairwise_sim_diff": float(sim_diff.max()),
+        "mean_pairwise_sim_diff": float(sim_diff.mean()),
+    }
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Export or check embedding backends.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    exp = sub.add_parser("export", help="export the configured model to ONNX (+ int8)")
+    exp.add_argument("--no-int8", action="store_true")
+    par = sub.add_parser("parity", help="compare a backend against torch")
+    par.add_argument("--backend", choices=BACKENDS, default="onnx-int8")
+    par.add_argument("--story", type=Path, default=get_data_dir() / "fantasy.md")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "export":
+        path = export_onnx(settings.embedding_model)
+        if not args.no_int8:
+            quantize_onnx(path, path.with_name(ONNX_INT8_MODEL))
+        return
+    from App.Services.faiss_converter import chunk_markdown_local
+    md = args.story.read_text(encoding="utf-8", errors="ignore")
+    texts = [r["text"] for r in chunk_markdown_local(md)]
+    print(check_parity(texts, args.backend))
+
+
+if __name__ == "__main__":
+    main()
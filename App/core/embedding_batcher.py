@@ -0,0 +1,115 @@
+"""Cross-request micro-batching of query embeddings.
+
+Concurrent requests each embed one or two short queries. Running those as
+separate forward passes on FastAPI's threadpool makes them compete for the
+same intra-op threads. ``EmbeddingBatcher`` instead queues them, waits up to
+``max_wait_ms`` for more to arrive, and encodes everything queued as one batch
+on a single dedicated worker thread. Each caller gets a ``Future`` resolving to
+its own rows.
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+import numpy as np
+
+from App.Services.utility import logging_function
+
+
+class EmbeddingBatcher:
+    """Coalesce concurrent ``submit`` calls into batched ``encode`` calls."""
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        max_wait_ms: float = 5.0,
+        max_batch: int = 64,
+    ):
+        self.encode = encode
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue[tuple[List[str], Future]]" = queue.Queue()
+        self._worker: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._texts = 0
+        self._requests = 0
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(
+                        target=self._run, name="embedding-batcher", daemon=True
+                    )
+                    self._worker.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue ``texts``; the future resolves to their ``(len(texts), dim)`` vectors."""
+        fut: Future = Future()
+        if not texts:
+            fut.set_result(np.zeros((0, 0), dtype="float32"))
+            return fut
+        self._ensure_worker()
+        self._queue.put((list(texts), fut))
+        return fut
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Blocking convenience wrapper around ``submit``."""
+        return self.submit(texts).result()
+
+    def _collect(self) -> List[tuple[List[str], Future]]:
+        """Block for the first request, then gather more until full or the wait expires."""
+        items = [self._queue.get()]
+        size = len(items[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            size += len(item[0])
+        return items
+
+    def _run(self) -> None:
+        while True:
+            items = self._collect()
+            live = [(texts, fut) for texts, fut in items if fut.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            flat = [t for texts, _ in live for t in texts]
+            try:
+                vecs = self.encode(flat)
+            except Exception as e:
+                logging_function(f"Embedding batch of {len(flat)} texts failed: {e}", level="error")
+                for _, fut in live:
+                    fut.set_exception(e)
+                continue
+            start = 0
+            for texts, fut in live:
+                fut.set_result(vecs[start:start + len(texts)])
+                start += len(texts)
+            with self._stats_lock:
+                self._batches += 1
+                self._texts += len(flat)
+                self._requests += len(live)
+
+    def stats(self) -> dict:
+        """Return batch counts and the average number of texts per forward pass."""
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "requests": self._requests,
+                "texts": self._texts,
+                "avg_batch_size": self._texts / self._batches if self._batches else 0.0,
+                "queued": self._queue.qsize(),
+            }
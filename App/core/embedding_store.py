@@ -0,0 +1,130 @@
+"""Persistent on-disk cache of chunk embeddings.
+
+Vectors are stored in SQLite keyed by ``(model, backend, content hash)`` of the
+chunk text. Rebuilding an index after editing one paragraph therefore only
+encodes the chunks whose text actually changed.
+"""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from App.Config.config import settings
+from App.Config.paths import get_data_dir
+from App.Core.embeddings_local import embed_batch, model_id
+from App.Services.utility import logging_function
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model   TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    hash    TEXT NOT NULL,
+    dim     INTEGER NOT NULL,
+    vec     BLOB NOT NULL,
+    PRIMARY KEY (model, backend, hash)
+)
+"""
+_MAX_VARS = 500
+
+
+def content_hash(text: str) -> str:
+    """Hex SHA-256 of ``text``; the identity of a chunk across rebuilds."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """SQLite table of float32 vectors keyed by model, backend and chunk hash."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+
+    def get_many(self, model: str, backend: str, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Return the stored vectors for whichever of ``hashes`` are present."""
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for start in range(0, len(unique), _MAX_VARS):
+                part = unique[start:start + _MAX_VARS]
+                rows = self._conn.execute(
+                    "SELECT hash, vec FROM embeddings WHERE model = ? AND backend = ? "
+                    f"AND hash IN ({','.join('?' * len(part))})",
+                    (model, backend, *part),
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype="float32")
+        return found
+
+    def put_many(self, model: str, backend: str, items: Sequence[Tuple[str, np.ndarray]]) -> None:
+        """Insert or replace ``(hash, vector)`` pairs."""
+        rows = [
+            (model, backend, h, int(v.shape[0]), np.asarray(v, dtype="float32").tobytes())
+            for h, v in items
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, backend, hash, dim, vec) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: EmbeddingStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store() -> EmbeddingStore | None:
+    """Return the shared store, or None when ``EMBEDDING_STORE_PATH`` is empty."""
+    global _store
+    if not settings.embedding_store_path:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = Path(settings.embedding_store_path)
+                if not path.is_absolute():
+                    path = get_data_dir() / path
+                _store = EmbeddingStore(path)
+    return _store
+
+
+def embed_cached(texts: List[str], hashes: List[str] | None = None) -> Tuple[np.ndarray, int]:
+    """Embed ``texts``, encoding only those missing from the persistent store.
+
+    Returns the ``(len(texts), dim)`` float32 matrix and how many texts were
+    actually encoded.
+    """
+    hashes = hashes or [content_hash(t) for t in texts]
+    store = get_embedding_store()
+    if store is None:
+        return embed_batch(texts), len(texts)
+    model, backend = model_id(), settings.embedding_backend
+    known = store.get_many(model, backend, hashes)
+    missing = [i for i, h in enumerate(hashes) if h not in known]
+    if missing:
+        fresh = embed_batch([texts[i] for i in missing])
+        new_items = list(zip((hashes[i] for i in missing), fresh))
+        store.put_many(model, backend, new_items)
+        known.update(new_items)
+    logging_function(
+        f"Embedding store: {len(texts) - len(missing)} reused, {len(missing)} encoded",
+        level="info",
+    )
+    return np.stack([known[h] for h in hashes]).astype("float32", copy=False), len(missing)
@@ -1,6 +1,90 @@
-"""Local embeddings using SentenceTransformers."""
-from sentence_transformers import SentenceTransformer
-_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")  # 384D
+"""Local embeddings using SentenceTransformers.
+
+One model (``settings.embedding_model``) serves both ingest and queries, so
+stored and query vectors always come from the same space. It is loaded on
+first use, not at import time, on the backend named by
+``settings.embedding_backend`` (see ``App.Core.embedding_backends``).
+
+Query vectors are memoized in a bounded LRU keyed by ``(model id, backend,
+normalized text)``, so repeated prompts skip the forward pass. Misses from
+concurrent requests are coalesced by an ``EmbeddingBatcher`` into one forward
+pass on a dedicated worker thread (``EMBEDDING_BATCH_WAIT_MS`` = 0 disables it).
+"""
+import threading
+import unicodedata
+import numpy as np
+from App.Config.config import settings
+from App.Core.lru import LRUCache
+from App.Core.embedding_backends import get_backend
+from App.Core.embedding_batcher import EmbeddingBatcher
+from App.Services.utility import logging_function
+
+_model = None
+_model_lock = threading.Lock()
+_cache = LRUCache(
+    max_bytes=settings.embedding_cache_max_bytes,
+    ttl_sec=settings.embedding_cache_ttl_sec,
+    sizeof=lambda v: v.nbytes,
+)
+
+
+def model_id() -> str:
+    """Identifier of the embedding model, recorded in every index manifest."""
+    return settings.embedding_model
+
+
+def get_model():
+    """Return the shared embedding backend, loading it on first call."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = get_backend(settings.embedding_backend, model_id())
+                logging_function(f"Loaded embedding model {model_id()} ({_model.name})", level="info")
+    return _model
+
+
+def normalize_query(text: str) -> str:
+    """Canonical cache form of a query: NFC, trimmed, inner whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def embed_batch(texts: list[str], batch_size: int = 64) -> np.ndarray:
+    """Encode ``texts`` into L2-normalized float32 vectors without caching (ingest path)."""
+    return get_model().encode(texts, batch_size=batch_size)
+
+
+_batcher = EmbeddingBatcher(
+    embed_batch,
+    max_wait_ms=settings.embedding_batch_wait_ms,
+    max_batch=settings.embedding_batch_max_size,
+)
+
+
 def embed_texts(texts: list[str]) -> list[list[float]]:
-    vecs = _model.encode(texts, normalize_embeddings=True)
-    return vecs.tolist()
\ No newline at end of file
+    """Embed ``texts``, encoding only the ones missing from the cache in one batch."""
+    keys = [(model_id(), settings.embedding_backend, normalize_query(t)) for t in texts]
+    vecs: list[np.ndarray | None] = [_cache.get(k) for k in keys]
+    missing = [i for i, v in enumerate(vecs) if v is None]
+    if missing:
+        pending = [keys[i][-1] for i in missing]
+        if settings.embedding_batch_wait_ms > 0:
+            encoded = _batcher.embed(pending)
+        else:
+            encoded = embed_batch(pending)
+        for i, v in zip(missing, encoded):
+            v = v.copy()
+            v.setflags(write=False)
+            vecs[i] = v
+            _cache.put(keys[i], v)
+    return [v.tolist() for v in vecs]
+
+
+def embedding_cache_stats() -> dict:
+    """Return hit/miss counters and size of the query embedding cache."""
+    return {"model": model_id(), "backend": settings.embedding_backend, **_cache.stats()}
+
+
+def embedding_batcher_stats() -> dict:
+    """Return how many requests were coalesced into how many forward passes."""
+    return _batcher.stats()
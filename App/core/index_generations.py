@@ -0,0 +1,112 @@
+"""Versioned on-disk generations of a FAISS index.
+
+Each build goes into its own directory, and a small ``CURRENT`` pointer file
+names the live one:
+
+    App/Data/index.faiss.generations/
+        CURRENT                      -> "20260101T120000000000-a1b2c3"
+        20260101T120000000000-a1b2c3/index.faiss, index.faiss.meta.bin, ...
+
+The pointer is replaced with ``os.replace``, so readers always see either the
+old or the new generation, never a half-written one. Without a pointer the
+legacy flat files next to the logical index path are used.
+"""
+from __future__ import annotations
+
+import json
+import os
+import secrets
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Tuple
+
+from App.Services.utility import logging_function
+
+LEGACY_GENERATION = "legacy"
+POINTER_NAME = "CURRENT"
+
+
+def generations_dir(index_path: str | Path) -> Path:
+    """Return the directory holding all generations of ``index_path``."""
+    index_path = Path(index_path)
+    return index_path.with_name(index_path.name + ".generations")
+
+
+def new_generation_id() -> str:
+    """Return a sortable, unique generation id."""
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{secrets.token_hex(3)}"
+
+
+def generation_index_path(index_path: str | Path, generation: str) -> Path:
+    """Return where ``generation`` keeps its copy of the index file."""
+    return generations_dir(index_path) / generation / Path(index_path).name
+
+
+def current_generation(index_path: str | Path) -> str | None:
+    """Return the published generation id, or ``None`` if there is none."""
+    pointer = generations_dir(index_path) / POINTER_NAME
+    try:
+        gen = pointer.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return gen or None
+
+
+def resolve_index(index_path: str | Path) -> Tuple[Path, str]:
+    """Return ``(physical_index_path, generation)`` currently live for ``index_path``."""
+    gen = current_generation(index_path)
+    if gen is None:
+        return Path(index_path), LEGACY_GENERATION
+    return generation_index_path(index_path, gen), gen
+
+
+def publish_generation(index_path: str | Path, generation: str) -> None:
+    """Atomically point ``index_path`` at ``generation``."""
+    root = generations_dir(index_path)
+    if not (root / generation).is_dir():
+        raise FileNotFoundError(f"Generation {generation} does not exist in {root}.")
+    tmp = root / f".{POINTER_NAME}.{secrets.token_hex(4)}"
+    tmp.write_text(generation, encoding="utf-8")
+    os.replace(tmp, root / POINTER_NAME)
+    logging_function(f"Published index generation {generation} for {index_path}", level="info")
+
+
+def list_generations(index_path: str | Path) -> List[str]:
+    """Return existing generation ids, oldest first."""
+    root = generations_dir(index_path)
+    if not root.is_dir():
+        return []
+    return sorted(p.name for p in root.iterdir() if p.is_dir())
+
+
+def prune_generations(index_path: str | Path, keep: int = 2) -> List[str]:
+    """Delete all but the newest ``keep`` generations, never the live one."""
+    live = current_generation(index_path)
+    gens = list_generations(index_path)
+    stale = [g for g in gens[:-keep] if g != live] if keep > 0 else [g for g in gens if g != live]
+    for gen in stale:
+        # Old files may still be memory-mapped by readers; on Windows the delete can fail.
+        shutil.rmtree(generations_dir(index_path) / gen, ignore_errors=True)
+    return stale
+
+
+def manifest_path(index_path: str | Path) -> Path:
+    """Return the JSON manifest describing how ``index_path`` was built."""
+    index_path = Path(index_path)
+    return index_path.with_suffix(index_path.suffix + ".manifest.json")
+
+
+def read_manifest(index_path: str | Path) -> dict:
+    """Return the manifest of ``index_path`` or ``{}`` for indexes built without one."""
+    try:
+        return json.loads(manifest_path(index_path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(index_path: str | Path, manifest: dict) -> None:
+    """Write ``manifest`` next to ``index_path``."""
+    manifest_path(index_path).write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
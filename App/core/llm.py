@@ -3,15 +3,23 @@
 This module wraps API-key discovery, a lazily initialized Groq client, basic
 session persistence in MongoDB, and a helper ``chat_json`` that requests a
 JSON-formatted response with retries.
+
+``chat_json_async`` is the same call on ``AsyncGroq`` with async session I/O
+and ``asyncio.sleep`` backoff, so a waiting LLM call holds no thread.
+``chat_stream_async`` yields a plain-text reply as the model produces it.
+All three consult the opt-in response cache (``App.Core.llm_cache``) first;
+pass ``use_cache=False`` to bypass it for one call.
 """
 from __future__ import annotations
+import asyncio
 import  json, time
-from typing import Optional
-from groq import Groq
+from typing import AsyncIterator, Optional
+from groq import AsyncGroq, Groq
 from datetime import datetime
 import json, time
-from App.Config.database import sessions
+from App.Config.database import async_db, sessions
 from App.Config.config import settings
+from App.Core.llm_cache import cache_for, cache_key
 
 
 
@@ -20,40 +28,67 @@ CHAT_MODEL = settings.groq_model
 class LLMError(RuntimeError):
     pass
 _client: Optional[Groq] = None
+_async_client: Optional[AsyncGroq] = None
 _api_key_cache: Optional[str] = None
 
-def _get_client() -> Groq:
-    """Return a cached Groq client, initializing it on first use."""
-    global _client, _api_key_cache
-    if _client is not None:
-        return _client
+def _api_key() -> str:
+    global _api_key_cache
     api_key = settings.groq_api_key
     if not api_key:
         raise LLMError(
             f"Missing Groq API key"
         )
     _api_key_cache = api_key
-    _client = Groq(api_key=api_key)
+    return api_key
+
+
+def _get_client() -> Groq:
+    """Return a cached Groq client, initializing it on first use."""
+    global _client
+    if _client is None:
+        _client = Groq(api_key=_api_key())
     return _client
 
 
+def _get_async_client() -> AsyncGroq:
+    """Return a cached AsyncGroq client, initializing it on first use."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncGroq(api_key=_api_key())
+    return _async_client
+
+
+_SESSION_PROJECTION = {"messages": {"$slice": -10}, "session_id": 1, "created_at": 1, "updated_at": 1}
+
+
+def _new_session(session_id: str) -> dict:
+    return {
+        "session_id": session_id,
+        "messages": [],
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    }
+
+
 def get_session(session_id: str) -> dict:
     """Fetch or create a session document for the given ``session_id``."""
-    session = sessions.find_one(
-    {"session_id": session_id},
-    {"messages": {"$slice": -10}, "session_id": 1, "created_at": 1, "updated_at": 1}
-    )
+    session = sessions.find_one({"session_id": session_id}, _SESSION_PROJECTION)
     if not session:
-        session = {
-            "session_id": session_id,
-            "messages": [],
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-        }
+        session = _new_session(session_id)
         sessions.insert_one(session)
     return session
 
 
+async def aget_session(session_id: str) -> dict:
+    """Async variant of ``get_session``."""
+    collection = async_db()["chat_sessions"]
+    session = await collection.find_one({"session_id": session_id}, _SESSION_PROJECTION)
+    if not session:
+        session = _new_session(session_id)
+        await collection.insert_one(session)
+    return session
+
+
 def save_message(session_id: str, role: str, content: str):
     """Append a chat message to the session and bump ``updated_at``."""
     sessions.update_one(
@@ -65,9 +100,37 @@ def save_message(session_id: str, role: str, content: str):
     )
 
 
+async def asave_exchange(session_id: str, user: str, content: str):
+    """Append a user prompt and the assistant reply to the session in one update."""
+    await async_db()["chat_sessions"].update_one(
+        {"session_id": session_id},
+        {
+            "$push": {"messages": {"$each": [
+                {"role": "user", "content": user},
+                {"role": "assistant", "content": content},
+            ]}},
+            "$set": {"updated_at": datetime.utcnow()},
+        },
+    )
+
+
 from groq import BadRequestError, APIStatusError, APITimeoutError
 import logging
 
+_RETRY_HINT = {"role": "user", "content": "Return ONLY valid JSON. No prose, no code fences."}
+
+
+def _messages(system: str, session: dict, user: str) -> list[dict]:
+    messages = [{"role": "system", "content": system}]
+    messages.extend(session["messages"])
+    messages.append({"role": "user", "content": user})
+    return messages
+
+
+def _response_format(force_object: bool) -> dict:
+    return {"type": "json_object"} if force_object else {"type": "text"}
+
+
 def chat_json(
     system: str,
     user: str,
@@ -76,18 +139,23 @@ def chat_json(
     temperature: float = 0.1,
     max_tokens: int = 2000,
     max_retries: int = 2,
-    force_object: bool = True
+    force_object: bool = True,
+    use_cache: bool | None = None,
 ):
     client = _get_client()
     session = get_session(session_id)
-    messages = [{"role": "system", "content": system}]
-    messages.extend(session["messages"])
-    messages.append({"role": "user", "content": user})
+    messages = _messages(system, session, user)
     last_err = None
-    if(force_object == True):
-        json_type = {"type": "json_object"}
-    else: 
-        json_type =  {"type": "text"}
+    json_type = _response_format(force_object)
+    cache = cache_for(temperature, use_cache)
+    key = content = None
+    if cache is not None:
+        key = cache_key(CHAT_MODEL, messages, temperature, max_tokens, json_type)
+        content = cache.get(key)
+    if content is not None:
+        save_message(session_id, "user", user)
+        save_message(session_id, "assistant", content)
+        return json.loads(content)
     for attempt in range(max_retries + 1):
         try:
             resp = client.chat.completions.create(
@@ -103,6 +171,8 @@ def chat_json(
             logging.debug("Content: %s", content)
             save_message(session_id, "user", user)
             save_message(session_id, "assistant", content)
+            if cache is not None:
+                cache.put(key, content)
             return parsed
 
         except (BadRequestError, APIStatusError, APITimeoutError) as e:
@@ -112,10 +182,126 @@ def chat_json(
         except json.JSONDecodeError as e:
             last_err = e
             logging.warning(f"Invalid JSON on attempt {attempt+1}, retrying...")
-            messages.append({
-                "role": "user",
-                "content": "Return ONLY valid JSON. No prose, no code fences."
-            })
+            messages.append(dict(_RETRY_HINT))
             time.sleep(2 ** attempt)
 
     raise LLMError(f"Groq API failed after {max_retries+1} attempts: {last_err}")
+
+
+async def chat_json_async(
+    system: str,
+    user: str,
+    session_id: str,
+    *,
+    temperature: float = 0.1,
+    max_tokens: int = 2000,
+    max_retries: int = 2,
+    force_object: bool = True,
+    use_cache: bool | None = None,
+):
+    """Async variant of ``chat_json``: same retries and parsing, no blocking I/O."""
+    client = _get_async_client()
+    session = await aget_session(session_id)
+    messages = _messages(system, session, user)
+    last_err = None
+    json_type = _response_format(force_object)
+    cache = cache_for(temperature, use_cache)
+    key = content = None
+    if cache is not None:
+        key = cache_key(CHAT_MODEL, messages, temperature, max_tokens, json_type)
+        content = await asyncio.to_thread(cache.get, key)
+    if content is not None:
+        await asave_exchange(session_id, user, content)
+        return json.loads(content)
+    for attempt in range(max_retries + 1):
+        try:
+            resp = await client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                response_format=json_type,
+            )
+            content = (resp.choices[0].message.content or "").strip()
+            parsed = json.loads(content)
+            logging.debug("Prompt: %s", user)
+            logging.debug("Content: %s", content)
+            await asave_exchange(session_id, user, content)
+            if cache is not None:
+                await asyncio.to_thread(cache.put, key, content)
+            return parsed
+
+        except (BadRequestError, APIStatusError, APITimeoutError) as e:
+            last_err = e
+            logging.warning(f"Groq API error on attempt {attempt+1}: {e}")
+            await asyncio.sleep(2 ** attempt)
+        except json.JSONDecodeError as e:
+            last_err = e
+            logging.warning(f"Invalid JSON on attempt {attempt+1}, retrying...")
+            messages.append(dict(_RETRY_HINT))
+            await asyncio.sleep(2 ** attempt)
+
+    raise LLMError(f"Groq API failed after {max_retries+1} attempts: {last_err}")
+
+
+async def chat_stream_async(
+    system: str,
+    user: str,
+    session_id: str,
+    *,
+    temperature: float = 0.1,
+    max_tokens: int = 2000,
+    max_retries: int = 2,
+    use_cache: bool | None = None,
+) -> AsyncIterator[str]:
+    """Stream a plain-text reply (Groq ``stream=True``), yielding text deltas.
+
+    API errors before the first delta are retried like ``chat_json_async``;
+    after that they are raised, since the partial reply is already out. The
+    whole exchange is saved to the session once the stream completes. A
+    cached reply is yielded as a single delta.
+    """
+    client = _get_async_client()
+    session = await aget_session(session_id)
+    messages = _messages(system, session, user)
+    last_err = None
+    cache = cache_for(temperature, use_cache)
+    key = content = None
+    if cache is not None:
+        key = cache_key(CHAT_MODEL, messages, temperature, max_tokens, _response_format(False))
+        content = await asyncio.to_thread(cache.get, key)
+    if content is not None:
+        yield content
+        await asave_exchange(session_id, user, content)
+        return
+    for attempt in range(max_retries + 1):
+        parts: list[str] = []
+        try:
+            stream = await client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except (BadRequestError, APIStatusError, APITimeoutError) as e:
+            if parts:
+                raise
+            last_err = e
+            logging.warning(f"Groq API error on attempt {attempt+1}: {e}")
+            await asyncio.sleep(2 ** attempt)
+            continue
+        content = "".join(parts).strip()
+        logging.debug("Prompt: %s", user)
+        logging.debug("Content: %s", content)
+        await asave_exchange(session_id, user, content)
+        if cache is not None and content:
+            await asyncio.to_thread(cache.put, key, content)
+        return
+
+    raise LLMError(f"Groq API failed after {max_retries+1} attempts: {last_err}")
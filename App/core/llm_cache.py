@@ -0,0 +1,165 @@
+"""Persistent cache of LLM responses for deterministic calls.
+
+Classification, summaries and QA run at low temperature, so the same prompt
+gets the same answer; resending it only costs latency and Groq rate-limit
+budget. Responses are stored in SQLite keyed by a hash of everything that
+determines the reply: model, the full message list (system prompt, session
+history, user prompt), temperature, ``max_tokens`` and response format.
+
+The cache is opt-in (``LLM_CACHE_ENABLED``) and only used for calls at or
+below ``LLM_CACHE_MAX_TEMPERATURE``; callers can bypass it per call. Entries
+expire after ``LLM_CACHE_TTL_SEC`` and the least recently used ones are
+evicted once the stored responses exceed ``LLM_CACHE_MAX_BYTES``.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Sequence
+
+from App.Config.config import settings
+from App.Config.paths import get_data_dir
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key       TEXT PRIMARY KEY,
+    content   TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    created   REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+
+
+def cache_key(
+    model: str, messages: Sequence[dict], temperature: float, max_tokens: int, response_format: dict
+) -> str:
+    """Hex SHA-256 identifying one request."""
+    payload = json.dumps(
+        [model, list(messages), float(temperature), int(max_tokens), response_format],
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite table of raw LLM reply texts with TTL and LRU size eviction."""
+
+    def __init__(self, path: str | Path, max_bytes: int, ttl_sec: float = 0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+            self._conn.execute(_INDEX)
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "bypassed": 0, "stored": 0, "evicted": 0}
+
+    def get(self, key: str) -> str | None:
+        """Return the cached reply for ``key``, or None if missing or expired."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT content, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_sec and now - row[1] > self.ttl_sec:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._stats["expired"] += 1
+                row = None
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._stats["hits"] += 1
+            return row[0]
+
+    def put(self, key: str, content: str) -> None:
+        """Store ``content`` under ``key``, then evict least recently used entries over budget."""
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, content, size, now, now),
+            )
+            self._stats["stored"] += 1
+            evicted = self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS total FROM responses)"
+                " WHERE total > ?)",
+                (self.max_bytes,),
+            ).rowcount
+            self._stats["evicted"] += evicted
+
+    def bypass(self) -> None:
+        """Count a call that skipped the cache."""
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        """Return hit/miss counters of this process and the size of the store."""
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            stats = dict(self._stats)
+        looked_up = stats["hits"] + stats["misses"]
+        stats.update(
+            entries=entries,
+            bytes=total,
+            max_bytes=self.max_bytes,
+            hit_rate=round(stats["hits"] / looked_up, 4) if looked_up else None,
+        )
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: LLMCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache | None:
+    """Return the shared cache, or None when ``LLM_CACHE_ENABLED`` is off."""
+    global _cache
+    if not settings.llm_cache_enabled:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = Path(settings.llm_cache_path)
+                if not path.is_absolute():
+                    path = get_data_dir() / path
+                _cache = LLMCache(path, settings.llm_cache_max_bytes, settings.llm_cache_ttl_sec)
+    return _cache
+
+
+def cache_for(temperature: float, use_cache: bool | None) -> LLMCache | None:
+    """Return the cache to use for one call, or None to go straight to the API.
+
+    ``use_cache=None`` caches calls at or below ``LLM_CACHE_MAX_TEMPERATURE``;
+    ``False`` bypasses the cache, ``True`` uses it regardless of temperature.
+    """
+    cache = get_llm_cache()
+    if cache is None:
+        return None
+    if use_cache is False or (use_cache is None and temperature > settings.llm_cache_max_temperature):
+        cache.bypass()
+        return None
+    return cache
+
+
+def llm_cache_stats() -> dict:
+    """Return cache metrics (``{"enabled": False}`` when the cache is off)."""
+    cache = get_llm_cache()
+    return {"enabled": False} if cache is None else {"enabled": True, **cache.stats()}
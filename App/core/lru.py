@@ -0,0 +1,86 @@
+"""Small thread-safe LRU cache with a byte budget, optional TTL and hit counters."""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class LRUCache:
+    """Bounded mapping that evicts least recently used entries.
+
+    Entries are evicted once their total ``sizeof`` exceeds ``max_bytes`` or,
+    with ``ttl_sec`` > 0, once they are older than the TTL.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_sec: float = 0,
+        sizeof: Callable[[Any], int] = sys.getsizeof,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Hashable, tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        """Return the cached value for ``key`` or ``None`` (counted as a miss)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl_sec > 0 and time.monotonic() - entry[2] > self.ttl_sec:
+                self._pop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store ``value`` under ``key``, evicting old entries to stay within budget."""
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+
+    def _pop(self, key: Hashable) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current occupancy."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
@@ -10,6 +10,16 @@ QA_USER_TEMPLATE = (
     "Return JSON strictly as: {{\"answer\": \"...\", \"sources\": [\"chunk_..\"]}}"
 )
 
+QA_STREAM_SYSTEM = (
+    "You are a lore expert. Answer ONLY from CONTEXT or previous conversation. "
+    "If unknown, say 'I don't know, can you specify?'. Answer in plain prose, without JSON or chunk_ids."
+)
+
+QA_STREAM_USER_TEMPLATE = (
+    "QUESTION: {question}\n\nCONTEXT:\n{context}\n\n"
+    "Return only the answer text."
+)
+
 NPC_SYSTEM = (
     "You generate unique, lore-appropriate NPCs based on story CONTEXT and USER_REQUEST with specified amount. "
     "Only output VALID JSON array of NPC objects matching schema: "
@@ -4,51 +4,470 @@
 The ``FaissRAG`` class loads a vector index and its metadata, performs search
 over normalized embeddings, and returns identified chunk IDs with their text.
 """
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Tuple
-import json, faiss, numpy as np
-from App.Core.embeddings_local import embed_texts
+from typing import Dict, List, Tuple
+import threading, time
+import faiss, numpy as np
+from App.Core.embeddings_local import embed_texts, embed_batch, model_id, normalize_query
+from App.Core.lru import LRUCache
+from App.Core.bm25 import BM25Index, bm25_path, reciprocal_rank_fusion
+from App.Core.chunk_store import MemoryChunks, PackedChunks, chunk_label, jsonl_meta_path, meta_path, read_id_map
+from App.Core.sections import SectionIndex, sections_path
+from App.Core.index_generations import (
+    current_generation, resolve_index, read_manifest, LEGACY_GENERATION,
+)
+from App.Config.config import settings
+from App.Services.utility import logging_function
 
 CHUNK_PREFIX = "chunk_"
 BASE_DIR = Path(__file__).resolve().parents[2]  
 print("BASE_DIR", BASE_DIR)
 DEFAULT_INDEX = BASE_DIR / "App" / "Data" / "index.faiss"
 
+
+class EmbeddingModelMismatch(RuntimeError):
+    """The index was built with a different embedding model than queries use."""
+
+
+@dataclass(frozen=True)
+class LoadedIndex:
+    """One immutable, fully loaded generation of the index and its chunks."""
+    index: faiss.Index
+    chunks: MemoryChunks | PackedChunks
+    generation: str
+    index_path: Path
+    loaded_at: datetime
+    bm25: BM25Index | None = None
+    nbytes: int = 0
+    sorted_labels: np.ndarray | None = None
+    label_order: np.ndarray | None = None
+    tombstones: np.ndarray | None = None
+    labels: np.ndarray | None = None
+    sections: SectionIndex | None = None
+
+    def positions(self, labels: np.ndarray) -> List[int]:
+        """Map FAISS result ids to chunk positions, dropping ``-1`` and tombstoned ids."""
+        if self.sorted_labels is None:
+            return [int(i) for i in labels if i != -1]
+        pos = self.lookup(labels)
+        return [int(p) for p in pos[pos >= 0]]
+
+    def lookup(self, labels: np.ndarray) -> np.ndarray:
+        """Return the chunk position of each FAISS id in ``labels`` (``-1`` if absent)."""
+        labels = np.asarray(labels, dtype="int64")
+        if not len(self.sorted_labels):
+            return np.full(len(labels), -1, dtype="int64")
+        pos = np.searchsorted(self.sorted_labels, labels)
+        pos = np.minimum(pos, len(self.sorted_labels) - 1)
+        hit = self.sorted_labels[pos] == labels
+        return np.where(hit, self.label_order[pos], -1)
+
+
 class FaissRAG:
-    """Lightweight wrapper around a FAISS index and its metadata."""
+    """Lightweight wrapper around a FAISS index and its metadata.
 
-    def __init__(self, index_path: str | Path = DEFAULT_INDEX):
-        """Initialize with the path to the index (and inferred meta path)."""
+    ``index_path`` is the logical path; the file actually read is the live
+    generation published under it (see ``App.Core.index_generations``). The
+    loaded data sits in a single ``LoadedIndex`` snapshot that ``refresh``
+    replaces in one assignment, so in-flight searches finish on the snapshot
+    they started with.
+
+    Top-k results are cached per ``(query, k, mode, generation)``; the cache is
+    cleared whenever a new generation is swapped in.
+    """
+
+    def __init__(self, index_path: str | Path = DEFAULT_INDEX, mmap: bool | None = None):
+        """Initialize with the path to the index (and inferred meta path).
+
+        With ``mmap`` (default: ``settings.faiss_mmap``) the index and the
+        binary chunk metadata are memory-mapped instead of read into memory,
+        so worker processes share their pages through the page cache. Flat
+        and HNSW codes are mapped in place with ``IO_FLAG_MMAP_IFC`` (plain
+        ``IO_FLAG_MMAP`` still copies them into private memory); IVF inverted
+        lists use ``IO_FLAG_MMAP``.
+        """
         self.index_path = Path(index_path)
-        self.meta_path = self.index_path.with_suffix(self.index_path.suffix + ".meta.jsonl")
-        self.index = None
-        self.texts: list[str] = []
-        self.ids: list[str] = []
+        self.mmap = settings.faiss_mmap if mmap is None else mmap
+        self._state: LoadedIndex | None = None
+        self._load_lock = threading.Lock()
+        self._last_check = 0.0
+        self.search_params: dict[str, int] = {
+            "nprobe": settings.faiss_nprobe,
+            "efSearch": settings.faiss_ef_search,
+        }
+        self._results = LRUCache(
+            max_bytes=settings.retrieval_cache_max_bytes,
+            ttl_sec=settings.retrieval_cache_ttl_sec,
+            sizeof=_hits_size,
+        )
 
-    def load(self):
-        """Load FAISS index and metadata lines into memory."""
-        if not self.index_path.exists() or not self.meta_path.exists():
+    @property
+    def index(self):
+        """The live FAISS index, or ``None`` before the first load."""
+        return self._state.index if self._state else None
+
+    @property
+    def chunks(self):
+        """The live chunk store, or ``None`` before the first load."""
+        return self._state.chunks if self._state else None
+
+    @property
+    def generation(self) -> str | None:
+        """Id of the generation currently served, or ``None`` before the first load."""
+        return self._state.generation if self._state else None
+
+    @property
+    def state(self) -> LoadedIndex | None:
+        """Snapshot of the loaded generation (index, chunks and bookkeeping)."""
+        return self._state
+
+    def resident_bytes(self) -> int:
+        """Approximate memory held by this store; a mapped index counts at its file size."""
+        state = self._state
+        base = state.nbytes if state else 0
+        return base + self._results.stats()["bytes"]
+
+    @staticmethod
+    def meta_path_for(index_path: Path) -> Path:
+        """Return the binary ``.meta.bin`` path that belongs to ``index_path``."""
+        return meta_path(index_path)
+
+    def set_search_params(self, nprobe: int | None = None, ef_search: int | None = None):
+        """Set query-time knobs (IVF ``nprobe``, HNSW ``efSearch``) on the live and future indexes."""
+        if nprobe is not None:
+            self.search_params["nprobe"] = nprobe
+        if ef_search is not None:
+            self.search_params["efSearch"] = ef_search
+        if self._state is not None:
+            self._apply_search_params(self._state.index)
+        self._results.clear()
+
+    def _apply_search_params(self, index):
+        """Apply ``search_params`` that the index type supports; others are skipped."""
+        space = faiss.ParameterSpace()
+        for name, value in self.search_params.items():
+            try:
+                space.set_index_parameter(index, name, value)
+            except RuntimeError:
+                continue
+
+    def _read(self) -> LoadedIndex:
+        """Read the live generation from disk without touching ``self``."""
+        index_path, generation = resolve_index(self.index_path)
+        bin_path, jsonl_path = meta_path(index_path), jsonl_meta_path(index_path)
+        if not index_path.exists() or not (bin_path.exists() or jsonl_path.exists()):
             raise FileNotFoundError("Missing index/metadata files — run ingest first.")
-        self.index = faiss.read_index(str(self.index_path))
-        self.ids, self.texts = [], []
-        with self.meta_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                o = json.loads(line)
-                self.ids.append(o["id"])
-                self.texts.append(o["text"])
-        if self.index.ntotal != len(self.ids):
+        if self.mmap:
+            index = faiss.read_index(str(index_path), _mmap_flags(index_path) | faiss.IO_FLAG_READ_ONLY)
+        else:
+            index = faiss.read_index(str(index_path))
+        if bin_path.exists():
+            chunks = PackedChunks(bin_path, use_mmap=self.mmap)
+        else:
+            logging_function(
+                f"{index_path} only has legacy JSON metadata; convert it with "
+                f"`python -m App.Core.chunk_store convert {index_path}`",
+                level="warning",
+            )
+            chunks = MemoryChunks.from_jsonl(jsonl_path)
+        labels, tombstones = read_id_map(index_path)
+        if index.ntotal != len(chunks) + len(tombstones):
             raise RuntimeError("Index and metadata size mismatch.")
+        if labels is not None and len(labels) != len(chunks):
+            raise RuntimeError("Chunk ids and metadata size mismatch.")
+        stored = index
+        index = self._check_model(index, chunks, index_path)
+        self._apply_search_params(index)
+        sorted_labels = label_order = sections = None
+        if labels is not None and index is stored:
+            label_order = np.argsort(labels, kind="stable")
+            sorted_labels = labels[label_order]
+            if sections_path(index_path).exists():
+                sections = SectionIndex.load(sections_path(index_path))
+                if len(sections.chunk_section) != len(chunks):
+                    raise RuntimeError("Section index and metadata size mismatch.")
+        else:
+            labels = tombstones = None
+        bm25 = None
+        if bm25_path(index_path).exists():
+            bm25 = BM25Index.load(bm25_path(index_path))
+            if len(bm25) != len(chunks):
+                raise RuntimeError("BM25 index and metadata size mismatch.")
+        # A mapped index is file-backed but its pages become resident as it is
+        # searched, so the registry's resident-size cap counts it in full.
+        nbytes = index_path.stat().st_size
+        if not isinstance(chunks, PackedChunks):
+            nbytes += jsonl_path.stat().st_size
+        elif not self.mmap:
+            nbytes += chunks.nbytes
+        if bm25 is not None:
+            nbytes += bm25.nbytes
+        if sorted_labels is not None:
+            nbytes += labels.nbytes + sorted_labels.nbytes + label_order.nbytes
+        if sections is not None:
+            nbytes += sections.nbytes
+        return LoadedIndex(
+            index, chunks, generation, index_path, datetime.now(timezone.utc), bm25, nbytes,
+            sorted_labels, label_order, tombstones if tombstones is not None and len(tombstones) else None,
+            labels, sections,
+        )
+
+    def _check_model(self, index, chunks, index_path: Path):
+        """Make sure stored vectors come from the query model.
+
+        On mismatch ``settings.embedding_mismatch_policy`` decides: ``refuse``
+        raises ``EmbeddingModelMismatch``, ``reembed`` rebuilds an in-memory
+        flat index from the stored chunk texts with the current model.
+        """
+        built_with = read_manifest(index_path).get("embedding_model")
+        if built_with is None:
+            logging_function(
+                f"{index_path} has no manifest; assuming it was built with {model_id()}",
+                level="warning",
+            )
+            return index
+        if built_with == model_id():
+            return index
+        msg = f"{index_path} was built with {built_with}, queries use {model_id()}"
+        if settings.embedding_mismatch_policy != "reembed":
+            raise EmbeddingModelMismatch(msg + "; rebuild the index or set EMBEDDING_MISMATCH_POLICY=reembed.")
+        logging_function(msg + "; re-embedding stored chunks in memory.", level="warning")
+        vecs = embed_batch([chunks.get(i)[1] for i in range(len(chunks))])
+        rebuilt = faiss.IndexFlatIP(vecs.shape[1])
+        rebuilt.add(vecs)
+        return rebuilt
+
+    def load(self):
+        """Load the FAISS index and chunk metadata (eagerly or memory-mapped)."""
+        self._state = self._read()
+        self._results.clear()
+        self._last_check = time.monotonic()
+
+    def ensure_loaded(self):
+        """Load the index once, even when several threads race on first use."""
+        if self._state is not None:
+            return
+        with self._load_lock:
+            if self._state is None:
+                self.load()
 
-    def search(self, query: str, k: int = 4) -> List[Tuple[str, str]]:
+    def refresh(self) -> bool:
+        """Swap in the published generation if it differs from the served one.
+
+        Returns ``True`` when a new generation was loaded. The old snapshot is
+        kept if the new one fails to load.
+        """
+        with self._load_lock:
+            self._last_check = time.monotonic()
+            published = current_generation(self.index_path) or LEGACY_GENERATION
+            if self._state is not None and self._state.generation == published:
+                return False
+            try:
+                new_state = self._read()
+            except Exception as e:
+                if self._state is None:
+                    raise
+                logging_function(f"Keeping generation {self._state.generation}: {e}", level="error")
+                return False
+            old = self._state
+            self._state = new_state
+            self._results.clear()
+        logging_function(
+            f"Swapped {self.index_path} to generation {new_state.generation}"
+            + (f" (was {old.generation})" if old else ""),
+            level="info",
+        )
+        return True
+
+    def _maybe_refresh(self):
+        """Pick up generations published by other processes, at most every poll interval."""
+        interval = settings.faiss_generation_poll_sec
+        if interval <= 0 or time.monotonic() - self._last_check < interval:
+            return
+        if self._load_lock.locked():
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            logging_function(f"Generation check failed for {self.index_path}: {e}", level="warning")
+
+    def search(
+        self, query: str, k: int = 4, mode: str | None = None, with_scores: bool = False
+    ) -> List[Tuple[str, str]]:
         """Return up to ``k`` best-matching chunks for the ``query`` string."""
-        if self.index is None:
-            self.load()
-        q = np.array([embed_texts([query])[0]], dtype="float32")
-        faiss.normalize_L2(q)
-        D, I = self.index.search(q, k)
-        out: List[Tuple[str, str]] = []
-        for idx in I[0]:
-            if idx == -1:
-                continue
-            out.append((self.ids[idx], self.texts[idx]))
-        return out
+        return self.search_many([query], k=k, mode=mode, with_scores=with_scores)[0]
+
+    def search_many(
+        self,
+        queries: List[str],
+        k: int = 4,
+        mode: str | None = None,
+        with_scores: bool = False,
+        vectors: np.ndarray | None = None,
+    ) -> List[List[Tuple[str, str]]]:
+        """Return up to ``k`` chunks per query, embedding and searching in one batch.
+
+        ``mode`` (default: ``settings.rag_search_mode``) is ``vector``,
+        ``lexical`` (BM25 only) or ``hybrid`` (both rankings fused with RRF).
+        Without a BM25 index every mode falls back to ``vector``.
+        When the index has more heading sections than
+        ``settings.rag_top_sections``, the vector ranking is two-stage: the
+        best sections are picked first and only their chunks are searched.
+
+        Hits are ``(id, text)``; with ``with_scores`` they are
+        ``(id, text, score)`` where ``score`` is the cosine similarity to the
+        query, or ``None`` for chunks found by BM25 only.
+
+        Queries already answered for the live generation are served from the
+        result cache; only the rest are embedded and searched. Callers that
+        already embedded the queries pass the rows as ``vectors`` (one per
+        query) to skip the embedding step.
+        """
+        self.ensure_loaded()
+        self._maybe_refresh()
+        state = self._state
+        if not queries:
+            return []
+        mode = (mode or settings.rag_search_mode).lower()
+        if state.bm25 is None:
+            mode = "vector"
+        keys = [(normalize_query(q), k, mode, state.generation) for q in queries]
+        cached = [self._results.get(key) for key in keys]
+        missing = [i for i, hits in enumerate(cached) if hits is None]
+        if missing:
+            rankings = self._rank(
+                state, [queries[i] for i in missing], k, mode, None if vectors is None else vectors[missing]
+            )
+            for i, ranking in zip(missing, rankings):
+                hits = tuple((*state.chunks.get(pos), score) for pos, score in ranking)
+                cached[i] = hits
+                self._results.put(keys[i], hits)
+        if with_scores:
+            return [list(hits) for hits in cached]
+        return [[(cid, txt) for cid, txt, _ in hits] for hits in cached]
+
+    def _rank(
+        self, state: LoadedIndex, queries: List[str], k: int, mode: str, vectors: np.ndarray | None = None
+    ) -> List[List[Tuple[int, float | None]]]:
+        """Return ``(chunk position, vector score)`` per query, best first, for the given ``mode``.
+
+        ``vectors`` are the query embeddings if already computed.
+        """
+        pool = k if mode == "vector" else max(k * settings.rag_hybrid_pool_factor, k)
+        vector: List[Dict[int, float]] = [{} for _ in queries]
+        if mode != "lexical":
+            q = np.array(embed_texts(list(queries)) if vectors is None else vectors, dtype="float32")
+            faiss.normalize_L2(q)
+            top_sections = settings.rag_top_sections
+            if state.sections is not None and 0 < top_sections < len(state.sections):
+                vector = self._rank_in_sections(state, q, pool, k, top_sections)
+            else:
+                vector = self._vector_search(state, q, pool)
+        if mode == "vector":
+            return [list(scores.items()) for scores in vector]
+        lexical = [[doc for doc, _ in state.bm25.search(q, pool)] for q in queries]
+        if mode == "lexical":
+            return [[(doc, None) for doc in ranking[:k]] for ranking in lexical]
+        return [
+            [(doc, v.get(doc)) for doc in reciprocal_rank_fusion([list(v), l], k)]
+            for v, l in zip(vector, lexical)
+        ]
+
+    def _vector_search(self, state: LoadedIndex, q: np.ndarray, pool: int) -> List[Dict[int, float]]:
+        """Flat (single-stage) search of the whole index; ``{position: score}`` per query, best first."""
+        if state.tombstones is not None:
+            batch = faiss.IDSelectorBatch(state.tombstones)
+            sel = faiss.IDSelectorNot(batch)
+            D, I = state.index.search(q, pool, params=self._selector_params(state, sel))
+        else:
+            D, I = state.index.search(q, pool)
+        return [self._scored(state, d, row) for d, row in zip(D, I)]
+
+    @staticmethod
+    def _scored(state: LoadedIndex, distances: np.ndarray, labels: np.ndarray) -> Dict[int, float]:
+        """Map one result row to ``{chunk position: score}``, dropping misses."""
+        positions = labels if state.sorted_labels is None else state.lookup(labels)
+        return {int(p): float(d) for p, d in zip(positions, distances) if p >= 0}
+
+    def _rank_in_sections(
+        self, state: LoadedIndex, q: np.ndarray, pool: int, k: int, top_sections: int
+    ) -> List[Dict[int, float]]:
+        """Two-stage search: pick the best sections, then score only their chunks.
+
+        On Flat and HNSW indexes the chosen sections' vectors are fetched from
+        the FAISS index with ``reconstruct_batch`` and scored exactly, each
+        section once for all queries that picked it. IVF indexes already scan
+        only ``nprobe`` lists, so they are searched per query with an id
+        selector instead. Tombstoned chunks belong to no section. Queries whose
+        sections hold fewer than ``k`` chunks fall back to the flat search.
+        """
+        sections = state.sections
+        chosen = sections.top(q, top_sections)
+        if isinstance(_base_index(state.index), faiss.IndexIVF):
+            rankings = []
+            for row, picked in zip(q, chosen):
+                sel = faiss.IDSelectorBatch(state.labels[sections.positions(picked)])
+                D, I = state.index.search(row[None, :], pool, params=self._selector_params(state, sel))
+                rankings.append(self._scored(state, D[0], I[0]))
+        else:
+            D, P, _ = sections.search(q, chosen, pool, lambda pos: state.index.reconstruct_batch(state.labels[pos]))
+            rankings = [{int(p): float(d) for p, d in zip(row, scores) if p >= 0} for scores, row in zip(D, P)]
+        short = [i for i, r in enumerate(rankings) if len(r) < min(k, len(state.chunks))]
+        if short:
+            for i, ranking in zip(short, self._vector_search(state, q[short], pool)):
+                rankings[i] = ranking
+        return rankings
+
+    def _selector_params(self, state: LoadedIndex, sel: faiss.IDSelector):
+        """Search parameters restricted to ``sel`` while keeping ``search_params``.
+
+        The caller must keep ``sel`` (and selectors it wraps) alive for the
+        duration of the search.
+        """
+        inner = _base_index(state.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(sel=sel, efSearch=self.search_params["efSearch"])
+        elif isinstance(inner, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(sel=sel, nprobe=self.search_params["nprobe"])
+        else:
+            params = faiss.SearchParameters(sel=sel)
+        return params
+
+    def section_titles(self, hits: List[Tuple[str, str]]) -> List[str]:
+        """Return the section title of each ``(id, text[, score])`` hit (``""`` if unknown)."""
+        state = self._state
+        if state is None or state.sections is None or not hits:
+            return [""] * len(hits)
+        try:
+            labels = np.array([chunk_label(hit[0]) for hit in hits], dtype="int64")
+        except ValueError:
+            return [""] * len(hits)
+        return [
+            state.sections.title(int(state.sections.chunk_section[pos])) if pos >= 0 else ""
+            for pos in state.lookup(labels)
+        ]
+
+    def cache_stats(self) -> dict:
+        """Return hit/miss counters of the top-k result cache."""
+        return {"generation": self.generation, **self._results.stats()}
+
+
+def _mmap_flags(index_path: Path) -> int:
+    """``read_index`` flags that map ``index_path`` without copying its vectors."""
+    if read_manifest(index_path).get("index_spec", "").upper().startswith("IVF"):
+        return faiss.IO_FLAG_MMAP
+    return faiss.IO_FLAG_MMAP_IFC
+
+
+def _base_index(index: faiss.Index) -> faiss.Index:
+    """Return the index wrapped by an ``IndexIDMap2`` (or ``index`` itself)."""
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def _hits_size(hits: Tuple[Tuple[str, str, float | None], ...]) -> int:
+    """Approximate memory held by one cached result list."""
+    return 64 + sum(len(cid) + len(txt) + 8 for cid, txt, _ in hits)
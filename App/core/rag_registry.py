@@ -0,0 +1,96 @@
+"""Process-wide registry of loaded ``FaissRAG`` stores.
+
+Every pipeline and router asks the registry for its store instead of building
+its own, so each index is read from disk once and held in memory once per
+worker process.
+
+Stores are namespaced per story (``App/Data/<story>/index.faiss``) and opened
+on first use. When their combined resident size exceeds
+``settings.rag_max_resident_bytes`` the least recently used ones are dropped;
+the default store is never evicted.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict
+
+from App.Config.config import settings
+from App.Config.paths import story_dir
+from App.Core.rag import FaissRAG, EmbeddingModelMismatch
+from App.Services.utility import logging_function
+
+_stores: "OrderedDict[Path, FaissRAG]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def story_index_path(story: str | None = None) -> Path:
+    """Return the logical index path of ``story`` (``None``: ``settings.faiss_path``)."""
+    if not story:
+        return Path(settings.faiss_path)
+    return story_dir(story) / "index.faiss"
+
+
+def get_store(index_path: str | Path | None = None) -> FaissRAG:
+    """Return the shared store for ``index_path`` (default: ``settings.faiss_path``).
+
+    The store is loaded on first request. A missing index is not fatal: the
+    store is still registered and will load lazily once ingest has run.
+    The resident-size cap is checked on every call, since stores also grow
+    after loading (hot-swapped generations, result caches).
+    """
+    key = Path(index_path or settings.faiss_path).resolve()
+    with _lock:
+        store = _stores.get(key)
+        if store is None:
+            store = FaissRAG(index_path=key)
+            _stores[key] = store
+        else:
+            _stores.move_to_end(key)
+    if store.state is None:
+        try:
+            store.ensure_loaded()
+        except FileNotFoundError as e:
+            logging_function(f"RAG store {key} not loaded yet: {e}", level="warning")
+        except EmbeddingModelMismatch as e:
+            logging_function(f"RAG store {key} refused: {e}", level="error")
+    _evict(keep=key)
+    return store
+
+
+def get_story_store(story: str | None = None) -> FaissRAG:
+    """Return the shared store of ``story``'s index.
+
+    Raises ValueError for invalid story names and FileNotFoundError for
+    stories without a data directory.
+    """
+    if story and not story_dir(story).is_dir():
+        raise FileNotFoundError(f"Unknown story: {story}")
+    return get_store(story_index_path(story))
+
+
+def _evict(keep: Path) -> None:
+    """Drop least recently used stores until the resident size fits the cap."""
+    pinned = {keep, Path(settings.faiss_path).resolve()}
+    with _lock:
+        total = sum(s.resident_bytes() for s in _stores.values())
+        for key in list(_stores):
+            if total <= settings.rag_max_resident_bytes:
+                break
+            if key in pinned:
+                continue
+            total -= _stores.pop(key).resident_bytes()
+            logging_function(f"Evicted RAG store {key} (resident total now {total} B)", level="info")
+
+
+def registered_stores() -> Dict[Path, FaissRAG]:
+    """Return a snapshot of all registered stores keyed by resolved index path."""
+    with _lock:
+        return dict(_stores)
+
+
+def clear_stores() -> None:
+    """Forget all registered stores (mainly for tests and reloads)."""
+    with _lock:
+        _stores.clear()
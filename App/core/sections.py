@@ -0,0 +1,191 @@
+"""Coarse section-level index for two-stage retrieval.
+
+Built at ingest time next to the FAISS index (``index.faiss.sections.npz``).
+A section is one markdown heading section of one source file; its vector is
+the normalized mean of its chunk vectors. ``FaissRAG`` first ranks the
+sections against the query, then searches only the chunks of the best ones,
+so the fine search is restricted to a small, topically coherent part of the
+corpus and each hit can be reported with its section title.
+
+Chunk membership is stored as ``chunk_section`` (section number per chunk
+position, like BM25 document numbers) and inverted into CSR form on load:
+the chunks of section ``s`` are ``members[starts[s]:starts[s + 1]]``.
+
+Chunk vectors are not stored here: the fine stage fetches the vectors of the
+chosen sections' chunks from the FAISS index (``reconstruct_batch``), so it
+scores only those chunks and the section file stays a few bytes per chunk.
+"""
+from __future__ import annotations
+
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+
+def sections_path(index_path: str | Path) -> Path:
+    """Return where the section index of ``index_path`` is stored."""
+    index_path = Path(index_path)
+    return index_path.with_suffix(index_path.suffix + ".sections.npz")
+
+
+def _join(strings: Sequence[str]) -> np.ndarray:
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype="uint8")
+
+
+def _split(raw: np.ndarray, n: int) -> List[str]:
+    return raw.tobytes().decode("utf-8").split("\n") if n else []
+
+
+class SectionIndex:
+    """Section vectors, titles and chunk membership of one index generation."""
+
+    def __init__(self, vectors: np.ndarray, headings: List[str], sources: List[str], chunk_section: np.ndarray):
+        self.vectors = np.ascontiguousarray(vectors, dtype="float32")
+        self.headings = headings
+        self.sources = sources
+        self.chunk_section = chunk_section
+        self.members = np.argsort(chunk_section, kind="stable").astype("int64")
+        self.starts = np.zeros(len(headings) + 1, dtype="int64")
+        np.cumsum(np.bincount(chunk_section, minlength=len(headings)), out=self.starts[1:])
+        self.index = faiss.IndexFlatIP(self.vectors.shape[1])
+        self.index.add(self.vectors)
+
+    def save(self, path: str | Path) -> None:
+        """Write the index as an uncompressed ``.npz``."""
+        with Path(path).open("wb") as f:
+            np.savez(
+                f,
+                vectors=self.vectors,
+                headings=_join(self.headings),
+                sources=_join(self.sources),
+                chunk_section=self.chunk_section,
+            )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "SectionIndex":
+        """Read an index written by ``save``."""
+        with np.load(str(path)) as z:
+            vectors = z["vectors"]
+            return cls(
+                vectors,
+                _split(z["headings"], len(vectors)),
+                _split(z["sources"], len(vectors)),
+                z["chunk_section"],
+            )
+
+    def __len__(self) -> int:
+        return len(self.headings)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the section vectors and membership arrays."""
+        return 2 * self.vectors.nbytes + sum(a.nbytes for a in (self.chunk_section, self.members, self.starts))
+
+    def title(self, section: int) -> str:
+        """Display title of ``section``: its heading, or the source file for text before any heading."""
+        return self.headings[section] or self.sources[section]
+
+    def top(self, queries: np.ndarray, n: int) -> np.ndarray:
+        """Return the ``n`` best section numbers per (normalized) query row."""
+        _, I = self.index.search(queries, min(n, len(self)))
+        return I
+
+    def positions(self, sections: np.ndarray) -> np.ndarray:
+        """Return the chunk positions belonging to ``sections``."""
+        parts = [self.members[self.starts[s]:self.starts[s + 1]] for s in sections if s >= 0]
+        return np.concatenate(parts) if parts else np.empty(0, dtype="int64")
+
+    def search(
+        self,
+        queries: np.ndarray,
+        sections: np.ndarray,
+        k: int,
+        vectors_of: Callable[[np.ndarray], np.ndarray],
+    ) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Exact inner-product search of each query row over the chunks of its row of ``sections``.
+
+        ``vectors_of`` returns the vectors of the given chunk positions. Each
+        chosen section is fetched once and scored for all queries that picked
+        it in one product. Returns FAISS-style ``(scores, positions)`` arrays
+        of shape ``(len(queries), k)`` padded with ``-1`` positions, and the
+        number of chunk vectors fetched.
+        """
+        by_section: Dict[int, List[int]] = {}
+        for qi, row in enumerate(sections):
+            for s in row:
+                if s >= 0:
+                    by_section.setdefault(int(s), []).append(qi)
+        found_scores: List[List[np.ndarray]] = [[] for _ in range(len(queries))]
+        found_positions: List[List[np.ndarray]] = [[] for _ in range(len(queries))]
+        fetched = 0
+        for s, rows in by_section.items():
+            members = self.members[self.starts[s]:self.starts[s + 1]]
+            if not len(members):
+                continue
+            scores = queries[rows] @ np.asarray(vectors_of(members), dtype="float32").T
+            fetched += len(members)
+            take = min(k, len(members))
+            best = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            for r, qi in enumerate(rows):
+                found_scores[qi].append(scores[r, best[r]])
+                found_positions[qi].append(members[best[r]])
+        D = np.full((len(queries), k), -np.inf, dtype="float32")
+        P = np.full((len(queries), k), -1, dtype="int64")
+        for qi, (scores, positions) in enumerate(zip(found_scores, found_positions)):
+            if not scores:
+                continue
+            scores, positions = np.concatenate(scores), np.concatenate(positions)
+            order = np.argsort(-scores, kind="stable")[:k]
+            D[qi, :len(order)] = scores[order]
+            P[qi, :len(order)] = positions[order]
+        return D, P, fetched
+
+
+class SectionBuilder:
+    """Accumulate section vectors while chunks are written in index order."""
+
+    def __init__(self):
+        self._ids: Dict[Tuple[str, str], int] = {}
+        self.headings: List[str] = []
+        self.sources: List[str] = []
+        self._sums: List[np.ndarray] = []
+        self.chunk_section = array("i")
+
+    def _section(self, source: str, heading: str, dim: int) -> int:
+        key = (source, heading)
+        if key not in self._ids:
+            self._ids[key] = len(self.headings)
+            self.headings.append(heading)
+            self.sources.append(source)
+            self._sums.append(np.zeros(dim, dtype="float32"))
+        return self._ids[key]
+
+    def add(self, record: dict, vec: np.ndarray) -> None:
+        """Append the next chunk with its embedding."""
+        s = self._section(record.get("source", ""), record.get("heading", ""), len(vec))
+        self._sums[s] += vec
+        self.chunk_section.append(s)
+
+    def keep(self, sections: SectionIndex, section: int) -> None:
+        """Append the next chunk as a member of an existing ``section`` of ``sections``.
+
+        Kept sections are copied whole (they gain no new chunks), so their
+        stored vector is reused without the chunk vectors.
+        """
+        key = (sections.sources[section], sections.headings[section])
+        new = key not in self._ids
+        s = self._section(key[0], key[1], sections.vectors.shape[1])
+        if new:
+            self._sums[s] = sections.vectors[section].copy()
+        self.chunk_section.append(s)
+
+    def build(self) -> SectionIndex:
+        """Return the finished index (section vectors normalized)."""
+        vectors = np.stack(self._sums).astype("float32")
+        faiss.normalize_L2(vectors)
+        return SectionIndex(
+            vectors, self.headings, self.sources, np.frombuffer(self.chunk_section, dtype="int32").copy(),
+        )
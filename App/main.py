@@ -3,7 +3,8 @@
 This module wires the API routers, templating, CORS, and top-level routes:
 
 - Home page rendering with environment values and NPC names.
-- Chat endpoint that forwards questions to the QA pipeline service.
+- Chat endpoint that answers through the general pipeline in-process (or a
+  remote QA service), optionally as a Server-Sent Events stream.
 - Reset endpoint to clear in-memory chat context.
 - Endpoint to list NPC names from MongoDB.
 - Endpoint to upload a markdown story used for RAG indexing.
@@ -11,15 +12,16 @@ This module wires the API routers, templating, CORS, and top-level routes:
 The application relies on configuration values provided via environment
 variables and initializes logging at import-time.
 """
-from fastapi import FastAPI, Request, Form,  UploadFile, File
+from fastapi import FastAPI, HTTPException, Request, Form,  UploadFile, File
 from fastapi.templating import Jinja2Templates
 
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import MongoClient
 from App.Core.context_cache import context_cache
-import os
-from App.Api.routes_general import router as qa_router
+import json
+from contextlib import asynccontextmanager
+from App.Api.routes_general import router as qa_router, story_qa
+from App.Models.queries import QARequest
 from App.Api.faiss_router import router as faiss_router
 import httpx
 import shutil
@@ -27,11 +29,39 @@ from App.Config.database import npc_collection
 from App.Config.config import settings
 from App.Services.utility import setup_logging, logging_function
 from pathlib import Path
-from App.Config.paths import get_data_dir
+from App.Config.paths import story_dir, STORY_FILE
+from App.Core.rag_registry import story_index_path
+from App.Core.index_generations import read_manifest, resolve_index
+from App.Services.ingest_jobs import jobs
 setup_logging()
 
 
-app = FastAPI(title="NPC Generation System", version="0.2.0-hybrid",root_path="/api/v1")
+_qa_client: httpx.AsyncClient | None = None
+
+
+def qa_client() -> httpx.AsyncClient:
+    """Return the pooled client for ``QA_SERVICE_URL``, creating it on first use."""
+    global _qa_client
+    if _qa_client is None:
+        # No read timeout: answers and event streams stay open while the model writes.
+        _qa_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.qa_service_timeout_sec, read=None),
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+        )
+    return _qa_client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Close the pooled QA client, if one was opened, on shutdown."""
+    global _qa_client
+    yield
+    if _qa_client is not None:
+        await _qa_client.aclose()
+        _qa_client = None
+
+
+app = FastAPI(title="NPC Generation System", version="0.2.0-hybrid",root_path="/api/v1", lifespan=lifespan)
 app.include_router(qa_router, prefix="/qa", tags=["qa"])
 app.include_router(faiss_router, prefix="/faiss", tags=["faiss"])
 BASE_DIR = Path(__file__).parent
@@ -81,14 +111,49 @@ def home(request: Request):
 
 
 @app.post("/chat")
-async def chat(prompt: str = Form(...)):
-    """Send a chat prompt to the QA service and return its JSON result."""
-    async with httpx.AsyncClient() as client:
+async def chat(prompt: str = Form(...), story: str | None = Form(None), stream: bool = Form(False)):
+    """Answer a chat prompt through the general pipeline and return its JSON result.
+
+    The pipeline is called in-process (the ``/qa/qa`` route handler), unless
+    ``QA_SERVICE_URL`` points to a separate QA service, which is then called
+    through a pooled client. With ``stream`` the answer is sent as
+    Server-Sent Events.
+    """
+    req = QARequest(question=prompt, story=story or None, stream=stream)
+    if settings.qa_service_url:
+        if stream:
+            return StreamingResponse(
+                _relay_stream(req.model_dump()),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
         try:
-            response = await client.post("http://localhost:8000/api/v1/qa/qa", json={"question": prompt}, timeout=15)
-            return JSONResponse(content=response.json())
+            response = await qa_client().post(settings.qa_service_url, json=req.model_dump())
+            return JSONResponse(content=response.json(), status_code=response.status_code)
         except Exception as e:
             return JSONResponse(content={"error": str(e)}, status_code=500)
+    try:
+        return await story_qa(req)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging_function(f"Chat request failed: {e}", level="error")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+async def _relay_stream(payload: dict):
+    """Yield the raw event stream of the remote QA service (an ``error`` event if it fails)."""
+    try:
+        async with qa_client().stream("POST", settings.qa_service_url, json=payload) as response:
+            if response.status_code != 200:
+                body = json.loads(await response.aread() or b"{}")
+                detail = body.get("detail", f"HTTP {response.status_code}")
+                yield f"event: error\ndata: {json.dumps({'detail': detail})}\n\n"
+                return
+            async for chunk in response.aiter_raw():
+                yield chunk
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
 
 @app.post("/reset_chat")
 async def reset_chat():
@@ -111,16 +176,35 @@ def get_npcs():
 
 
 @app.post("/upload_story")
-async def upload_story(file: UploadFile = File(...)):
-    """Persist an uploaded markdown file as ``App/Data/fantasy.md``."""
-    dest_dir = get_data_dir()
+async def upload_story(file: UploadFile = File(...), story: str | None = Form(None)):
+    """Persist an uploaded markdown file as ``App/Data/[<story>/]fantasy.md``.
+
+    If the story already has an id-mapped index, only this document is
+    re-indexed (as a background job whose id is returned).
+    """
+    try:
+        dest_dir = story_dir(story)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
     dest_dir.mkdir(parents=True, exist_ok=True)  # na wszelki wypadek
-    dest = dest_dir / "fantasy.md"
+    dest = dest_dir / STORY_FILE
 
     with dest.open("wb") as f:
         shutil.copyfileobj(file.file, f)
 
-    return {"status": f"File {file.filename} saved  as {dest.name}"}
+    response = {"status": f"File {file.filename} saved  as {dest.name}"}
+    index_path = story_index_path(story)
+    if read_manifest(resolve_index(index_path)[0]).get("id_map"):
+        # Re-index just this document in the live index (replacing its old chunks).
+        job = jobs.submit(
+            operation="update",
+            index_path=str(index_path),
+            add_path=str(dest),
+            source=dest.name,
+            keep=settings.faiss_keep_generations,
+        )
+        response["job_id"] = job.job_id
+    return response
 
 
 
@@ -6,17 +6,18 @@ then forwards the request to either the NPC generation pipeline or the QA
 pipeline. It is intentionally conservative and defaults to QA when the
 classification is ambiguous.
 """
-from App.Core.rag import FaissRAG
+from App.Core.rag_registry import get_store
 from App.Services.utility import generate_session_id, logging_function
 from App.Services.npc_pipeline import NPCPipeline
 from App.Services.qa_pipeline import QAPipeline
 from App.Config.config import settings
-from App.Core.llm import chat_json
+from App.Core.llm import chat_json, chat_json_async
 from groq import BadRequestError
 import logging
 from App.Core.prompts import CLASSIFICATION_SYSTEM
 from App.Services.utility import handle_bad_request_error
 import re
+from typing import Any, AsyncIterator
 
 
 class GeneralPipeline:
@@ -24,8 +25,9 @@ class GeneralPipeline:
 
     def __init__(self):
         """Initialize sub-pipelines, sharing a FAISS-backed RAG store."""
-        self.npc_pipeline = NPCPipeline(FaissRAG(index_path=settings.faiss_path))
-        self.qa_pipeline = QAPipeline(FaissRAG(index_path=settings.faiss_path))  
+        store = get_store(settings.faiss_path)
+        self.npc_pipeline = NPCPipeline(store)
+        self.qa_pipeline = QAPipeline(store)
     def sanitize_query(self, query: str) -> str:
         """Check prompt for forbitten content"""
         if not isinstance(query, str):
@@ -34,68 +36,131 @@ class GeneralPipeline:
         query = re.sub(r"(?:<\s*/?\s*system\s*>|\bSYSTEM:)", "", query, flags=re.IGNORECASE)
         return query
 
-    def process(self, query: str):
-        """Classify ``query`` and dispatch to the appropriate pipeline."""
+    def process(self, query: str, story: str | None = None):
+        """Classify ``query`` and dispatch to the appropriate pipeline.
+
+        ``story`` selects the namespaced index used for retrieval.
+        """
         logging_function(f"Processing query: {query} ", level="info")
 
         query = self.sanitize_query(query)
         if not query.strip():
-                logging_function("Empty query received, returning safe fallback", level="warning")
-                return {
-                "status": "error",
-                "message": "Your query was empty. Please provide a valid question or prompt."
-                }
-        classification_prompt = CLASSIFICATION_SYSTEM + f"\n:\n{query}\n\nRespond with JSON."
-
-        cls_result = "QA"  
+            return self._empty_query()
         try:
             logging_function("Sending classification prompt to LLM", level="info")
             cls_resp = chat_json(
                 system="You are a classifier",
-                user=classification_prompt,
+                user=self._classification_prompt(query),
                 session_id=generate_session_id()
             )
-            logging_function(f"Classifier response: {cls_resp}", level="info")
-            if isinstance(cls_resp, dict):
-                if "type" in cls_resp and isinstance(cls_resp["type"], str):
-                    cls_result = cls_resp["type"].strip().upper()
-                elif len(cls_resp) == 1:
-                    first_val = list(cls_resp.values())[0]
-                    if isinstance(first_val, str):
-                        cls_result = first_val.strip().upper()
-            elif isinstance(cls_resp, list) and len(cls_resp) > 0:
-                first_val = cls_resp[0]
-                if isinstance(first_val, str):
-                    cls_result = first_val.strip().upper()
-                elif isinstance(first_val, dict) and "type" in first_val:
-                    cls_result = str(first_val["type"]).strip().upper()
-            elif isinstance(cls_resp, str):
-                cls_result = cls_resp.strip().upper()
-            elif cls_resp is None:
-                logging_function("Classifier returned None, defaulting to QA", level="warning")
-            else:
-                logging_function("Unexpected classifier response format, defaulting to QA", level="warning")
-        except BadRequestError as e:
+        except Exception as e:
+            cls_resp = self._classification_failed(e)
+        cls_result, amount = self._route(cls_resp)
+        if cls_result == "NPC":
+            return self.npc_pipeline.generate(prompt=query, amount=amount, story=story)
+        return self.qa_pipeline.answer(question=query, story=story)
+
+    async def aprocess(self, query: str, story: str | None = None):
+        """Async variant of ``process`` using the async LLM and pipeline entry points."""
+        logging_function(f"Processing query: {query} ", level="info")
+
+        query = self.sanitize_query(query)
+        if not query.strip():
+            return self._empty_query()
+        cls_result, amount = await self._aclassify(query)
+        if cls_result == "NPC":
+            return await self.npc_pipeline.agenerate(prompt=query, amount=amount, story=story)
+        return await self.qa_pipeline.aanswer(question=query, story=story)
+
+    async def astream(self, query: str, story: str | None = None) -> AsyncIterator[tuple[str, Any]]:
+        """Streaming variant of ``aprocess`` yielding ``(event, data)`` pairs.
+
+        QA answers arrive as ``token`` events followed by ``sources`` (see
+        ``QAPipeline.astream``); NPC lists and the empty-query fallback are
+        not streamable and are sent whole as one ``result`` event.
+        """
+        logging_function(f"Processing query (stream): {query} ", level="info")
+
+        query = self.sanitize_query(query)
+        if not query.strip():
+            yield "result", self._empty_query()
+            return
+        cls_result, amount = await self._aclassify(query)
+        if cls_result == "NPC":
+            yield "result", await self.npc_pipeline.agenerate(prompt=query, amount=amount, story=story)
+            return
+        async for event in self.qa_pipeline.astream(question=query, story=story):
+            yield event
+
+    async def _aclassify(self, query: str) -> tuple[str, int | None]:
+        try:
+            logging_function("Sending classification prompt to LLM", level="info")
+            cls_resp = await chat_json_async(
+                system="You are a classifier",
+                user=self._classification_prompt(query),
+                session_id=generate_session_id()
+            )
+        except Exception as e:
+            cls_resp = self._classification_failed(e)
+        return self._route(cls_resp)
+
+    def _empty_query(self) -> dict:
+        logging_function("Empty query received, returning safe fallback", level="warning")
+        return {
+            "status": "error",
+            "message": "Your query was empty. Please provide a valid question or prompt."
+        }
+
+    def _classification_prompt(self, query: str) -> str:
+        return CLASSIFICATION_SYSTEM + f"\n:\n{query}\n\nRespond with JSON."
+
+    def _classification_failed(self, e: Exception) -> None:
+        """Log a failed classifier call; the query then defaults to QA."""
+        if isinstance(e, BadRequestError):
             handle_bad_request_error(e, logging_function=logging_function)
             logging_function("Defaulting to QA pipeline due to classification BadRequestError", level="info")
-        except Exception as e:
+        else:
             logging_function(f"Error during classification: {e}", level="error")
             logging_function("Defaulting to QA pipeline due to classification error", level="info")
+        return None
+
+    def _route(self, cls_resp) -> tuple[str, int | None]:
+        """Return the pipeline (``"NPC"`` or ``"QA"``) and NPC amount for a classifier reply."""
+        logging_function(f"Classifier response: {cls_resp}", level="info")
+        cls_result = "QA"
+        if isinstance(cls_resp, dict):
+            if "type" in cls_resp and isinstance(cls_resp["type"], str):
+                cls_result = cls_resp["type"].strip().upper()
+            elif len(cls_resp) == 1:
+                first_val = list(cls_resp.values())[0]
+                if isinstance(first_val, str):
+                    cls_result = first_val.strip().upper()
+        elif isinstance(cls_resp, list) and len(cls_resp) > 0:
+            first_val = cls_resp[0]
+            if isinstance(first_val, str):
+                cls_result = first_val.strip().upper()
+            elif isinstance(first_val, dict) and "type" in first_val:
+                cls_result = str(first_val["type"]).strip().upper()
+        elif isinstance(cls_resp, str):
+            cls_result = cls_resp.strip().upper()
+        elif cls_resp is None:
+            logging_function("Classifier returned None, defaulting to QA", level="warning")
+        else:
+            logging_function("Unexpected classifier response format, defaulting to QA", level="warning")
         logging_function(f"Classification result: {cls_result}", level="info")
         logging_function(f"Routing to pipeline based on classification: {cls_result}", level="info")
-        
+
         if cls_result == "NPC":
-                logging_function("Routing to NPC pipeline", level="info")
-                amount = 1  
-                if isinstance(cls_resp, dict) and cls_resp.get("amount") is not None:
-                    try:
-                        amount = int(cls_resp.get("amount"))
-                    except ValueError:
-                        logging.warning(f"Invalid amount value: {cls_resp.get('amount')}, using default 1")
-                return self.npc_pipeline.generate(prompt=query, amount=amount)
-        elif cls_result == "QA":
+            logging_function("Routing to NPC pipeline", level="info")
+            amount = 1
+            if isinstance(cls_resp, dict) and cls_resp.get("amount") is not None:
+                try:
+                    amount = int(cls_resp.get("amount"))
+                except ValueError:
+                    logging.warning(f"Invalid amount value: {cls_resp.get('amount')}, using default 1")
+            return "NPC", amount
+        if cls_result == "QA":
             logging_function("Routing to QA pipeline", level="info")
-            return self.qa_pipeline.answer(question=query)
         else:
             logging_function("Classification unclear, defaulting to QA pipeline", level="info")
-            return self.qa_pipeline.answer(question=query)
\ No newline at end of file
+        return "QA", None
@@ -5,6 +5,7 @@ and persists to MongoDB. No heuristics (no story/faction guessing).
 """
 from __future__ import annotations
 
+import asyncio
 import uuid
 import time
 from copy import deepcopy
@@ -14,59 +15,96 @@ from pydantic import ValidationError
 from groq import BadRequestError
 
 from App.Models.query_npc import NPC, NPCAmount
-from App.Core.llm import chat_json
+from App.Core.llm import chat_json, chat_json_async
 from App.Core.prompts import NPC_SYSTEM, NPC_USER_TEMPLATE
 from App.Core.rag import FaissRAG
+from App.Core.rag_registry import get_store, get_story_store
 from App.Config.config import settings
 from App.Services.utility import generate_session_id, logging_function, handle_bad_request_error
-from App.Config.database import db, save_npcs_to_mongo, existing_names
+from App.Config.database import db, save_npcs_to_mongo, existing_names, existing_names_async
 from App.Core.context_cache import context_cache
+from App.Core.context_packer import pack_context
 
 
 class NPCPipeline:
     """Create and clean up NPC proposals using an LLM with optional RAG context."""
 
     def __init__(self, store: FaissRAG | None = None):
-        self.store = store or FaissRAG(index_path=settings.faiss_path)
-        if not hasattr(self.store, "load"):
-            raise RuntimeError("FAISS store missing load() method. Check implementation.")
-        self.store.load()
+        self.store = store or get_store(settings.faiss_path)
+        if not hasattr(self.store, "search_many"):
+            raise RuntimeError("FAISS store missing search_many() method. Check implementation.")
 
         self.npc_collection = db.npc_collection
         self.MAX_ATTEMPTS = 3        
         self.retry_delay_sec = 4     
 
 
-    def generate(self, prompt: str | None, session_id: str | None = None, amount: int | None = None) -> list[dict]:
-        """Generate a list of NPCs based on the given prompt and desired amount."""
+    def generate(
+        self,
+        prompt: str | None,
+        session_id: str | None = None,
+        amount: int | None = None,
+        story: str | None = None,
+    ) -> list[dict]:
+        """Generate a list of NPCs based on the given prompt and desired amount.
+
+        The store of ``story`` is searched with the prompt as seed.
+        """
         session_id = session_id or generate_session_id()
         logging_function(
             f"Generating NPCs with prompt: '{prompt}' (session: {session_id}, amount: {amount})",
             level="info"
         )
-        seed = prompt or "setting"
+        store = self._store_for(story)
+        ctx = self._retrieve([prompt], store)[0]
+
+        full_context = self._npc_context(ctx, store)
+        user_prompt = self._npc_prompt(prompt, full_context, existing_names(), amount)
+
         try:
-            logging_function(f"Searching RAG store with seed: '{seed}'", level="info")
-            ctx = self.store.search(seed, k=getattr(settings, "rag_top_k", 4))
-        except Exception as e:
-            logging_function(f"Error searching RAG store: {e}", level="error")
-            ctx = []
+            raw = chat_json(system=NPC_SYSTEM, user=user_prompt, session_id=session_id, temperature=0.2)
+        except BadRequestError as e:
+            handle_bad_request_error(e, logging_function=logging_function)
+            raw = []
 
-        context_str = "\n---\n".join([f"{cid}: {txt}" for cid, txt in ctx])
-        cache_context = "\n".join([f"{q}: {a}" for q, a in context_cache.all().items()])
-        full_context = context_str + (("\n---\n" + cache_context) if cache_context else "")
+        npcs_initial = self._normalize_to_list(raw)
 
-        avoid_names = existing_names()
-        user_prompt = NPC_USER_TEMPLATE.format(
-            context=full_context,
+        amount_req = amount or (len(npcs_initial) or 6)
+        result = self._enforce_uniqueness(
             prompt=prompt or "",
-            avoid=avoid_names,
-            amount=amount
+            npcs=npcs_initial,
+            amount=amount_req,
+            full_context=full_context
         )
-        logging_function("NPC generation user prompt prepared.", level="debug")
+        return result
+
+
+    async def agenerate(
+        self,
+        prompt: str | None,
+        session_id: str | None = None,
+        amount: int | None = None,
+        story: str | None = None,
+    ) -> list[dict]:
+        """Async variant of ``generate``.
+
+        Retrieval runs in a worker thread and the generation call is awaited.
+        The uniqueness pass (renames, top-up, Mongo insert) also runs in a
+        worker thread: it is a rare multi-call follow-up, not the hot path.
+        """
+        session_id = session_id or generate_session_id()
+        logging_function(
+            f"Generating NPCs with prompt: '{prompt}' (session: {session_id}, amount: {amount})",
+            level="info"
+        )
+        store = await asyncio.to_thread(self._store_for, story)
+        ctx = (await asyncio.to_thread(self._retrieve, [prompt], store))[0]
+
+        full_context = self._npc_context(ctx, store)
+        user_prompt = self._npc_prompt(prompt, full_context, await existing_names_async(), amount)
 
         try:
-            raw = chat_json(system=NPC_SYSTEM, user=user_prompt, session_id=session_id, temperature=0.2)
+            raw = await chat_json_async(system=NPC_SYSTEM, user=user_prompt, session_id=session_id, temperature=0.2)
         except BadRequestError as e:
             handle_bad_request_error(e, logging_function=logging_function)
             raw = []
@@ -74,14 +112,50 @@ class NPCPipeline:
         npcs_initial = self._normalize_to_list(raw)
 
         amount_req = amount or (len(npcs_initial) or 6)
-        result = self._enforce_uniqueness(
+        return await asyncio.to_thread(
+            self._enforce_uniqueness,
             prompt=prompt or "",
             npcs=npcs_initial,
             amount=amount_req,
             full_context=full_context
         )
-        return result
 
+    def _npc_context(self, ctx: list[tuple], store: FaissRAG) -> str:
+        """Pack retrieved ``ctx`` (hits of ``store``) and the conversation memory into the prompt context."""
+        packed = pack_context(ctx, context_cache.all(), store.section_titles(ctx))
+        logging_function(
+            f"NPC context: {packed.tokens} tokens, {packed.tokens_saved} saved ({packed.merged} chunks merged)",
+            level="info",
+        )
+        return packed.text
+
+    def _npc_prompt(self, prompt: str | None, full_context: str, avoid_names: list[str], amount: int | None) -> str:
+        """Fill the NPC user prompt template."""
+        user_prompt = NPC_USER_TEMPLATE.format(
+            context=full_context,
+            prompt=prompt or "",
+            avoid=avoid_names,
+            amount=amount
+        )
+        logging_function("NPC generation user prompt prepared.", level="debug")
+        return user_prompt
+
+    def _store_for(self, story: str | None) -> FaissRAG:
+        """Return the index of ``story``, or the default store."""
+        return get_story_store(story) if story else self.store
+
+    def _retrieve(self, prompts: list[str | None], store: FaissRAG) -> list[list[tuple[str, str, float | None]]]:
+        """Search ``store`` for every prompt at once; empty prompts use a generic seed.
+
+        Hits carry their scores so ``pack_context`` can drop weak ones.
+        """
+        seeds = [p or "setting" for p in prompts]
+        try:
+            logging_function(f"Searching RAG store with seeds: {seeds}", level="info")
+            return store.search_many(seeds, k=settings.rag_top_k, with_scores=True)
+        except Exception as e:
+            logging_function(f"Error searching RAG store: {e}", level="error")
+            return [[] for _ in seeds]
 
     def _normalize_to_list(self, payload: Any) -> list[dict]:
         """Accept model response as either a plain array or an object with 'items'."""
@@ -1,10 +1,19 @@
 
 """Question-answering pipeline built on top of a FAISS-backed RAG store."""
+import asyncio
+from typing import AsyncIterator
+
+import numpy as np
+
 from App.Services.utility import logging_function
-from App.Core.prompts import QA_SYSTEM, QA_USER_TEMPLATE
+from App.Core.prompts import QA_STREAM_SYSTEM, QA_STREAM_USER_TEMPLATE, QA_SYSTEM, QA_USER_TEMPLATE
 from App.Core.rag import FaissRAG
-from App.Core.llm import chat_json
+from App.Core.rag_registry import get_store, get_story_store
+from App.Config.config import settings
+from App.Core.llm import chat_json, chat_json_async, chat_stream_async
 from App.Core.context_cache import context_cache
+from App.Core.context_packer import pack_context
+from App.Core.answer_cache import answer_cache_for, question_vector, question_vectors
 from App.Models.queries import QAResponse
 from App.Services.utility import generate_session_id
 from groq import BadRequestError
@@ -13,32 +22,187 @@ from App.Services.utility import handle_bad_request_error
 class QAPipeline:
     """Resolve questions using retrieved context and chat LLM calls."""
 
-    def __init__(self, rag: FaissRAG):
-        """Bind a ``FaissRAG`` instance used for retrieval."""
-        self.rag = rag
-
-    def answer(self, question: str) -> dict:
-        """Return an answer and sources for the provided ``question``."""
-        logging_function(f"Answering question: {question}", level="info")
-        ctx = self.rag.search(question, k=4)
-        context_str = "\n---\n".join([f"{cid}: {txt}" for cid, txt in ctx])
-        cache_context = "\n".join([f"{q}: {a}" for q, a in context_cache.all().items()])
-        full_context = context_str + "\n---\n" + cache_context
-        logging_function(f"Full context for QA: {full_context}", level="debug")
-        user = QA_USER_TEMPLATE.format(question=question, context=full_context)
+    def __init__(self, rag: FaissRAG | None = None):
+        """Bind a ``FaissRAG`` instance used for retrieval (default: the shared store)."""
+        self.rag = rag or get_store(settings.faiss_path)
+
+    def _store_for(self, story: str | None) -> FaissRAG:
+        """Return the bound store, or the namespaced store of ``story``."""
+        return get_story_store(story) if story else self.rag
+
+    def answer(self, question: str, story: str | None = None) -> dict:
+        """Return an answer and sources for the provided ``question``.
+
+        A paraphrase of a question answered before on the same index
+        generation is served from the semantic answer cache (``cached``).
+        """
+        logging_function(f"Answering question: {question} (story: {story or 'default'})", level="info")
+        store = self._store_for(story)
+        cached, pending = self._cached_answer(store, question)
+        if cached is not None:
+            context_cache.add(question, cached["answer"])
+            return cached
+        ctx = store.search(question, k=settings.rag_top_k, with_scores=True)
+        result = self._answer_with_context(question, ctx, store.section_titles(ctx))
+        self._remember(pending, result)
+        return result
+
+    async def aanswer(self, question: str, story: str | None = None) -> dict:
+        """Async variant of ``answer``.
+
+        Retrieval is CPU-bound and runs in a worker thread; the LLM call and
+        session I/O are awaited, so no thread is held while the model answers.
+        """
+        logging_function(f"Answering question: {question} (story: {story or 'default'})", level="info")
+        store = await asyncio.to_thread(self._store_for, story)
+        cached, pending = await asyncio.to_thread(self._cached_answer, store, question)
+        if cached is not None:
+            await context_cache.aadd(question, cached["answer"])
+            return cached
+        ctx, sections = await self._aretrieve(question, store)
+        user, packed = self._qa_prompt(question, ctx, sections)
+        try:
+            logging_function("Sending QA prompt to LLM", level="info")
+            raw = await chat_json_async(system=QA_SYSTEM, user=user, session_id=generate_session_id())
+        except BadRequestError as e:
+            handle_bad_request_error(e, logging_function=logging_function)
+            raise HTTPException(status_code=400, detail="Bad request to QA API") from e
+        result = self._qa_result(raw, packed)
+        await context_cache.aadd(question, result["answer"])
+        self._remember(pending, result)
+        return result
+
+    async def astream(self, question: str, story: str | None = None) -> AsyncIterator[tuple[str, dict]]:
+        """Stream the answer to ``question`` as ``(event, data)`` pairs.
+
+        The answer is requested as plain text and forwarded as ``token``
+        events while the model writes it; a trailing ``sources`` event carries
+        the ids of the packed context passages, their section titles and the
+        token accounting. A cached answer arrives as a single ``token`` event.
+        """
+        logging_function(f"Streaming answer: {question} (story: {story or 'default'})", level="info")
+        store = await asyncio.to_thread(self._store_for, story)
+        cached, pending = await asyncio.to_thread(self._cached_answer, store, question)
+        if cached is not None:
+            answer = cached.pop("answer")
+            yield "token", {"text": answer}
+            await context_cache.aadd(question, answer)
+            yield "sources", cached
+            return
+        ctx, sections = await self._aretrieve(question, store)
+        user, packed = self._qa_prompt(question, ctx, sections, template=QA_STREAM_USER_TEMPLATE)
+        parts: list[str] = []
+        async for text in chat_stream_async(system=QA_STREAM_SYSTEM, user=user, session_id=generate_session_id()):
+            parts.append(text)
+            yield "token", {"text": text}
+        answer = "".join(parts).strip()
+        logging_function(f"Final streamed answer: {answer}", level="info")
+        await context_cache.aadd(question, answer)
+        meta = {"sources": packed.sources, "sections": packed.sections, **packed.report()}
+        self._remember(pending, {"answer": answer, **meta})
+        yield "sources", meta
+
+    async def _aretrieve(self, question: str, store: FaissRAG) -> tuple[list[tuple], list[str]]:
+        """Search ``store`` in a worker thread; return hits and their section titles."""
+        ctx = await asyncio.to_thread(store.search, question, k=settings.rag_top_k, with_scores=True)
+        return ctx, store.section_titles(ctx)
+
+    def answer_many(self, questions: list[str], story: str | None = None) -> list[dict]:
+        """Answer several questions, retrieving context for all of them in one batch.
+
+        The questions are embedded once; the same vectors serve the semantic
+        answer cache lookups and the retrieval of the questions it misses.
+        """
+        logging_function(f"Answering {len(questions)} questions in batch", level="info")
+        store = self._store_for(story)
+        vectors = question_vectors(questions) if questions else None
+        lookups = [self._cached_answer(store, q, vectors[i:i + 1]) for i, q in enumerate(questions)]
+        results = [cached for cached, _ in lookups]
+        todo = [i for i, r in enumerate(results) if r is None]
+        for q, cached in zip(questions, results):
+            if cached is not None:
+                context_cache.add(q, cached["answer"])
+        if todo:
+            contexts = store.search_many(
+                [questions[i] for i in todo], k=settings.rag_top_k, with_scores=True, vectors=vectors[todo]
+            )
+            for i, ctx in zip(todo, contexts):
+                results[i] = self._answer_with_context(questions[i], ctx, store.section_titles(ctx))
+                self._remember(lookups[i][1], results[i])
+        return results
+
+    def _cached_answer(
+        self, store: FaissRAG, question: str, vector: np.ndarray | None = None
+    ) -> tuple[dict | None, tuple | None]:
+        """Look ``question`` up in the semantic answer cache of ``store``.
+
+        ``vector`` is the question's ``(1, dim)`` embedding when the caller
+        already has it. Returns the cached answer (or ``None``) and, on a miss, what
+        ``_remember`` needs to store the answer once it is known.
+        """
+        cache = answer_cache_for(store)
+        if cache is None:
+            return None, None
+        store.ensure_loaded()
+        if vector is None:
+            vector = question_vector(question)
+        generation = store.generation
+        hit = cache.lookup(vector, generation)
+        if hit is None:
+            return None, (cache, vector, generation)
+        answer, score = hit
+        logging_function(f"Semantic answer cache hit ({score:.3f}) for: {question}", level="info")
+        return {**answer, "cached": True}, None
+
+    @staticmethod
+    def _remember(pending: tuple | None, result: dict) -> None:
+        """Store ``result`` in the answer cache slot returned by ``_cached_answer``."""
+        if pending is not None:
+            cache, vector, generation = pending
+            cache.store(vector, generation, result)
+
+    def _answer_with_context(
+        self, question: str, ctx: list[tuple[str, str]], sections: list[str] | None = None
+    ) -> dict:
+        """Build the QA prompt from retrieved ``ctx`` and ask the LLM.
+
+        ``sections`` holds the section title of each hit; titles label the
+        context blocks and are returned in ``sections``. The context is packed
+        to the token budget (see ``App.Core.context_packer``) and the token
+        accounting is returned alongside the answer.
+        """
+        user, packed = self._qa_prompt(question, ctx, sections)
         try:
             logging_function("Sending QA prompt to LLM", level="info")
             raw = chat_json(system=QA_SYSTEM, user=user,session_id=generate_session_id())
         except BadRequestError as e:
             handle_bad_request_error(e, logging_function=logging_function)
             raise HTTPException(status_code=400, detail="Bad request to QA API") from e
+        result = self._qa_result(raw, packed)
+        context_cache.add(question, result["answer"])
+        return result
+
+    def _qa_prompt(
+        self, question: str, ctx: list[tuple], sections: list[str] | None, template: str = QA_USER_TEMPLATE
+    ):
+        """Pack ``ctx`` with the conversation memory and return ``(user prompt, packed)``."""
+        packed = pack_context(ctx, context_cache.all(), sections)
+        logging_function(
+            f"QA context: {packed.tokens} tokens, {packed.tokens_saved} saved "
+            f"({packed.merged} chunks merged, {packed.dropped} below score)",
+            level="info",
+        )
+        logging_function(f"Full context for QA: {packed.text}", level="debug")
+        return template.format(question=question, context=packed.text), packed
+
+    def _qa_result(self, raw, packed) -> dict:
+        """Turn the raw LLM reply into the QA response dict."""
         logging_function(f"Raw QA response: {raw}", level="debug")
         answer = raw.get("answer") if isinstance(raw, dict) else None
         sources = raw.get("sources") if isinstance(raw, dict) else None
         if not isinstance(sources, list):
-            sources = [cid for cid, _ in ctx]
+            sources = packed.sources
         if not isinstance(answer, str):
             answer = str(raw)
-        context_cache.add(question,answer)
         logging_function(f"Final answer: {answer} with sources: {sources}", level="info") 
-        return {"answer": answer, "sources": sources}
\ No newline at end of file
+        return {"answer": answer, "sources": sources, "sections": packed.sections, **packed.report()}
\ No newline at end of file